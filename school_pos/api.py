@@ -0,0 +1,274 @@
+import gzip
+
+from flask import Blueprint, jsonify, request, session
+
+import balances
+import catalog
+import checkout
+import kiosk
+import order_history
+import order_queue
+import pickup_slots
+import rollups
+from db import get_db
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# JSON API สำหรับ kiosk / แอปมือถือ (ใช้ session เดียวกับหน้าเว็บ)
+#  - ?fields=a,b เลือกเฉพาะ field ที่ต้องการ
+#  - รายการยาวแบ่งหน้าด้วย cursor (next) ไม่ใช้ offset
+#  - ทุก GET มี ETag ตอบ 304 ถ้าข้อมูลไม่เปลี่ยน
+#  - บีบอัดด้วย brotli (ถ้าติดตั้งไว้) หรือ gzip ตาม Accept-Encoding
+
+bp = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+MIN_COMPRESS_SIZE = 512
+
+SHOP_FIELDS = ('shop_id', 'shop_name', 'image_url', 'image_srcset_webp', 'image_srcset')
+ITEM_FIELDS = ('item_id', 'name', 'price', 'image_url', 'image_srcset_webp', 'image_srcset', 'category')
+ORDER_FIELDS = ('order_id', 'shop_id', 'shop_name', 'student_id', 'student_name', 'order_date', 'total',
+                'status', 'pickup_slot', 'archived', 'items')
+
+
+class BadRequest(Exception):
+    pass
+
+
+@bp.errorhandler(BadRequest)
+def handle_bad_request(e):
+    return jsonify({'error': str(e)}), 400
+
+
+def _require(user_type):
+    if 'user_type' not in session or session['user_type'] != user_type:
+        return jsonify({'error': 'forbidden'}), 403
+    return None
+
+
+def _fields(allowed):
+    requested = request.args.get('fields')
+    if not requested:
+        return allowed
+    fields = tuple(field.strip() for field in requested.split(',') if field.strip())
+    unknown = set(fields) - set(allowed)
+    if unknown:
+        raise BadRequest(f'unknown fields: {", ".join(sorted(unknown))}')
+    return fields
+
+
+def _select(rows, fields):
+    return [{field: row[field] for field in fields if field in row} for row in rows]
+
+
+def _int_arg(name, default=None):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f'{name} must be an integer')
+
+
+def _json(etag_parts, updated_at, build):
+    # etag_parts รวม field ที่เลือกและ query string แล้ว ให้แต่ละแบบมี ETag ของตัวเอง
+    return catalog.conditional_response(etag_parts + (request.query_string,), updated_at,
+                                        lambda: jsonify(build()), html=False)
+
+
+@bp.route('/shops')
+def shops():
+    denied = _require('student')
+    if denied:
+        return denied
+
+    fields = _fields(SHOP_FIELDS)
+    shop_rows, version, updated_at = catalog.get_shops(get_db())
+    return _json(('shops', version), updated_at, lambda: {
+        'shops': _select([dict(zip(SHOP_FIELDS, row)) for row in shop_rows], fields),
+        'version': version,
+    })
+
+
+@bp.route('/shops/<int:shop_id>/menu')
+def shop_menu(shop_id):
+    denied = _require('student')
+    if denied:
+        return denied
+
+    fields = _fields(ITEM_FIELDS)
+    menu, version, updated_at = catalog.get_shop_menu(get_db(), shop_id)
+    if menu is None:
+        return jsonify({'error': 'not found'}), 404
+    shop_name, items = menu
+    return _json(('menu', shop_id, version), updated_at, lambda: {
+        'shop_id': shop_id,
+        'shop_name': shop_name,
+        'items': _select([catalog.menu_item_json(item) for item in items], fields),
+        'version': version,
+    })
+
+
+@bp.route('/shops/<int:shop_id>/slots')
+def shop_slots(shop_id):
+    denied = _require('student')
+    if denied:
+        return denied
+
+    # อ่านจากตัวนับ pickup_slot_counts ไม่ใส่ ETag เพราะเปลี่ยนทุกครั้งที่มีคนจอง
+    slots = pickup_slots.availability(get_db(), shop_id)
+    if slots is None:
+        return jsonify({'error': 'not found'}), 404
+    return jsonify({'shop_id': shop_id, 'slot_minutes': pickup_slots.SLOT_MINUTES, 'slots': slots})
+
+
+@bp.route('/me/balance')
+def balance():
+    denied = _require('student')
+    if denied:
+        return denied
+
+    entry = balances.cache.get(get_db(), session['student_id'])
+    if entry is None:
+        return jsonify({'error': 'not found'}), 404
+    balance, version = entry
+    return _json(('balance', session['student_id'], version), None, lambda: {
+        'student_id': session['student_id'],
+        'balance': balance,
+        'version': version,
+    })
+
+
+@bp.route('/me/orders')
+def orders():
+    denied = _require('student')
+    if denied:
+        return denied
+
+    fields = _fields(ORDER_FIELDS)
+    before = _int_arg('before')
+    limit = _int_arg('limit', order_history.PAGE_SIZE)
+    try:
+        rows, next_before = order_history.list_orders(get_db(), session['student_id'], before, limit,
+                                                      request.args.get('from'), request.args.get('to'))
+    except ValueError:
+        raise BadRequest('from/to must be YYYY-MM-DD')
+    payload = {'orders': _select(rows, fields), 'next': next_before}
+    # สถานะของคำสั่งซื้อเปลี่ยนได้ภายหลัง ETag จึงคิดจากข้อมูลทั้งหน้า (ประหยัด bandwidth เมื่อไม่เปลี่ยน)
+    return _json(('orders', session['student_id'], repr(payload)), None, lambda: payload)
+
+
+@bp.route('/me/spending')
+def spending():
+    denied = _require('student')
+    if denied:
+        return denied
+
+    period = request.args.get('period', 'week')
+    if period not in rollups.SPENDING_PERIODS:
+        raise BadRequest('period must be week or month')
+    rows = rollups.student_spending(get_db(), session['student_id'], period, _int_arg('periods'))
+    payload = {
+        'period': period,
+        'spending': [{'period_start': start, 'orders': count, 'amount': amount} for start, count, amount in rows],
+    }
+    return _json(('spending', session['student_id'], repr(payload)), None, lambda: payload)
+
+
+@bp.route('/shop/orders')
+def shop_orders():
+    denied = _require('shop')
+    if denied:
+        return denied
+
+    # ?since=<event_id> คืนเฉพาะการเปลี่ยนแปลงหลัง event นั้น (ใช้ last_event_id จากครั้งก่อน)
+    fields = _fields(ORDER_FIELDS)
+    since = _int_arg('since')
+    conn = get_db()
+    shop_id = session['shop_id']
+    last_id = order_queue.last_event_id(conn, shop_id)
+
+    def build():
+        if since is None:
+            rows, _ = order_queue.open_orders(conn, shop_id)
+            return {'orders': _select(rows, fields), 'last_event_id': last_id}
+        events = order_queue.events_since(conn, shop_id, since)
+        return {
+            'events': [dict(_select([order], fields)[0], event_id=event_id) for event_id, order in events],
+            # ได้ไม่เกินครั้งละ 100 event ขอต่อจาก last_event_id จนกว่า events จะว่าง
+            'last_event_id': events[-1][0] if events else since,
+        }
+
+    return _json(('shop_orders', shop_id, last_id), None, build)
+
+
+@bp.route('/kiosk/checkout', methods=['POST'])
+def kiosk_checkout():
+    # kiosk ของร้าน (ล็อกอินเป็นร้าน): {"card": token, "items": [[item_id, quantity], ...]}
+    # ตรวจบัตร คิดราคา ตัดเงิน และสร้างคำสั่งซื้อในคำขอเดียว ส่ง Idempotency-Key ซ้ำได้ผลเดิม
+    denied = _require('shop')
+    if denied:
+        return denied
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        raise BadRequest('expected a JSON object')
+    try:
+        quantities = kiosk.parse_items(payload.get('items'))
+    except kiosk.KioskError as e:
+        raise BadRequest(str(e))
+    idempotency_key = request.headers.get('Idempotency-Key') or payload.get('idempotency_key') or None
+    if idempotency_key is not None and (not isinstance(idempotency_key, str) or len(idempotency_key) > 128):
+        raise BadRequest('idempotency key is too long')
+
+    conn = get_db()
+    student = kiosk.lookup(conn, payload.get('card'))
+    if student is None:
+        return jsonify({'error': 'unknown_card'}), 404
+    try:
+        result = checkout.place_order(conn, student[0], quantities, idempotency_key=idempotency_key,
+                                      shop_id=session['shop_id'])
+    except checkout.InvalidQuantity as e:
+        raise BadRequest(str(e))
+    except checkout.InsufficientBalance:
+        return jsonify({'error': 'insufficient_balance',
+                        'balance': balances.current(conn, student[0])[0]}), 409
+    except checkout.OutOfStock as e:
+        return jsonify({'error': 'out_of_stock', 'item_ids': sorted(e.item_ids)}), 409
+    except checkout.ItemUnavailable as e:
+        return jsonify({'error': 'unavailable', 'item_ids': sorted(e.item_ids)}), 409
+
+    return jsonify({
+        'order_id': result.order_ids[0] if result.order_ids else None,
+        'student_id': student[0],
+        'name': student[1],
+        'total': result.total,
+        'balance': result.balance,
+    })
+
+
+@bp.after_request
+def compress(response):
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.content_length is None or response.content_length < MIN_COMPRESS_SIZE):
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(response.get_data(), quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+
+    # body ต่างจากแบบไม่บีบอัด ETag จึงต้องเป็น weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
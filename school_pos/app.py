@@ -1,303 +1,184 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash 
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
-import json
-import sqlite3
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, session, jsonify, flash, Response, send_from_directory
+import uuid
 import os
 
-print("Template folder exists:", os.path.exists("templates/index.html"))
-
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-here'
-
-# สร้างฐานข้อมูล
-def init_db():
-    conn = sqlite3.connect('school_pos.db')
-    cursor = conn.cursor()
-    
-    # ตาราง students
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS students (
-            student_id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            password_hash TEXT NOT NULL,
-            balance REAL DEFAULT 0
-        )
-    ''')
-    
-    # ตาราง admins
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS admins (
-            admin_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            name TEXT NOT NULL
-        )
-    ''')
-        
-    # ตาราง shops
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS shops (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            shop_name TEXT UNIQUE,
-            owner_name TEXT,
-            password_hash TEXT,
-            image_url TEXT
-        )
-    ''')
-    
-    # ตาราง menu_items
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS menu_items (
-    item_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    shop_id INTEGER,
-    name TEXT,
-    price REAL,
-    cost REAL,
-    available BOOLEAN,
-    image_url TEXT,
-    category TEXT,
-    UNIQUE(shop_id, name),
-    FOREIGN KEY (shop_id) REFERENCES shops(shop_id)
-)
-''')
-
-    
-    # ตาราง orders
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            shop_id INTEGER,
-            total_price REAL,
-            order_status TEXT CHECK(order_status IN ('pending', 'completed', 'cancelled')),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(user_id) REFERENCES users(id),
-            FOREIGN KEY(shop_id) REFERENCES shops(id)
-        )
-    ''')
-    
-    # ตาราง order_items
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS order_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            order_id INTEGER,
-            menu_id INTEGER,
-            quantity INTEGER,
-            FOREIGN KEY(order_id) REFERENCES orders(id),
-            FOREIGN KEY(menu_id) REFERENCES menus(id)
-        )
-    ''')
-    
-    # เพิ่มข้อมูลตัวอย่าง
-    insert_sample_data(cursor)
-    
-    conn.commit()
-    conn.close()
-
-def insert_sample_data(cursor):
-    # ตัวอย่างนักเรียน
-    cursor.execute('''
-        INSERT OR IGNORE INTO students (student_id, name, password_hash, balance)
-        VALUES (?, ?, ?, ?)
-    ''', ('01514', 'สมชาย ใจดี', generate_password_hash('password123'), 500.0))
-    
-    cursor.execute('''
-        INSERT OR IGNORE INTO students (student_id, name, password_hash, balance)
-        VALUES (?, ?, ?, ?)
-    ''', ('12346', 'สมหญิง สวยงาม', generate_password_hash('password456'), 300.0))
-    
-    # ตัวอย่างครู / แอดมิน
-    admins = [
-        ('teacher1', 'pass1234', 'ครูสมศรี')  # username, password, ชื่อ
-    ]
-
-    for username, password, name in admins:
-        cursor.execute('''
-            INSERT OR IGNORE INTO admins (username, password_hash, name)
-            VALUES (?, ?, ?)
-        ''', (username, generate_password_hash(password), name))
-        
-    # ตัวอย่างร้านค้า
-    shops_data = [
-        ('ร้านข้าวแม่สมปอง', 'แม่สมปอง', generate_password_hash('shop123'), '/static/images/rice_shop.jpg'),
-        ('ร้านก๋วยเตี๋ยวลุงสมชาย', 'ลุงสมชาย', generate_password_hash('shop456'), '/static/images/noodle_shop.jpg'),
-        ('ร้านน้ำผลไม้ป้าแก้ว', 'ป้าแก้ว', generate_password_hash('shop789'), '/static/images/drink_shop.jpg'),
-        ('ร้านขนมอรุณี', 'อรุณี', generate_password_hash('shop000'), '/static/images/snack_shop.jpg')
-    ]
-
-    for shop_name, owner_name, password_hash, image_url in shops_data:
-        cursor.execute('''
-            INSERT OR IGNORE INTO shops (shop_name, owner_name, password_hash, image_url)
-            VALUES (?, ?, ?, ?)
-        ''', (shop_name, owner_name, password_hash, image_url))
-    
-    # ตัวอย่างเมนู
-    menu_items = [
-        # ร้านข้าว (shop_id = 1)
-        (1, 'ข้าวผัดหมู', 45.0, 25.0, True, '/static/images/fried_rice.jpg', 'ข้าว'),
-        (1, 'ข้าวราดแกง', 40.0, 20.0, True, '/static/images/curry_rice.jpg', 'ข้าว'),
-        (1, 'ข้าวมันไก่', 50.0, 30.0, True, '/static/images/chicken_rice.jpg', 'ข้าว'),
-        
-        # ร้านก๋วยเตี๋ยว (shop_id = 2)
-        (2, 'ก๋วยเตี๋ยวหมูน้ำใส', 35.0, 18.0, True, '/static/images/clear_soup.jpg', 'ก๋วยเตี๋ยว'),
-        (2, 'ก๋วยเตี๋ยวต้มยำ', 40.0, 20.0, True, '/static/images/tomyum_noodle.jpg', 'ก๋วยเตี๋ยว'),
-        (2, 'บะหมี่แห้ง', 38.0, 19.0, True, '/static/images/dry_noodle.jpg', 'ก๋วยเตี๋ยว'),
-        
-        # ร้านน้ำ (shop_id = 3)
-        (3, 'น้ำส้มคั้น', 25.0, 10.0, True, '/static/images/orange_juice.jpg', 'เครื่องดื่ม'),
-        (3, 'น้ำแตงโม', 20.0, 8.0, True, '/static/images/watermelon_juice.jpg', 'เครื่องดื่ม'),
-        (3, 'ชาเย็น', 15.0, 5.0, True, '/static/images/iced_tea.jpg', 'เครื่องดื่ม'),
-        
-        # ร้านขนม (shop_id = 4)
-        (4, 'ขนมปังปิ้ง', 25.0, 12.0, True, '/static/images/toast.jpg', 'ขนม'),
-        (4, 'โรตี', 30.0, 15.0, True, '/static/images/roti.jpg', 'ขนม'),
-        (4, 'ลูกชิ้นทอด', 20.0, 10.0, True, '/static/images/fried_meatball.jpg', 'ขนม')
-    ]
-    
-    for shop_id, name, price, cost, available, image_url, category in menu_items:
-        cursor.execute('''
-            INSERT OR IGNORE INTO menu_items (shop_id, name, price, cost, available, image_url, category)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (shop_id, name, price, cost, available, image_url, category))
-
+import click
+
+import archive
+import assets
+import balances
+import bulk_import
+import cart_store
+import catalog
+import db
+import exports
+import idempotency
+import instrumentation
+import inventory
+import kiosk
+import maintenance
+import media
+import migrations
+import offline
+import order_history
+import order_queue
+import passwords
+import pickup_slots
+import rollups
+import student_directory
+from db import get_db, PoolTimeout
+from passwords import LoginBusy
+import db_init
+from checkout import place_order, EmptyCart, InsufficientBalance, InvalidQuantity, ItemUnavailable, OutOfStock, SlotFull
+
+# หน้าเว็บทั้งหมดอยู่ใน blueprint นี้ ลงทะเบียนกับแอปใน create_app()
+# การ import โมดูลนี้ไม่แตะฐานข้อมูล สร้าง schema / ข้อมูลตัวอย่างด้วย flask db upgrade / flask db seed
+bp = Blueprint('pos', __name__, cli_group=None)
 
 # Routes
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/student_login', methods=['GET', 'POST'])
+@bp.route('/student_login', methods=['GET', 'POST'])
 def student_login():
     if request.method == 'POST':
         student_id = request.form['student_id']
         password = request.form['password']
         
-        conn = sqlite3.connect('school_pos.db')
+        conn = get_db()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT name, password_hash, balance FROM students WHERE student_id = ?', (student_id,))
+        cursor.execute('SELECT name, password_hash FROM students WHERE student_id = ?', (student_id,))
         student = cursor.fetchone()
-        conn.close()
         
-        if student and check_password_hash(student[1], password):
+        valid, new_hash = passwords.check_login('student', student[1], password) if student else (False, None)
+        if valid:
+            if new_hash:
+                # อัปเกรด hash ให้ตรงกับนโยบายปัจจุบัน
+                cursor.execute('UPDATE students SET password_hash = ? WHERE student_id = ?', (new_hash, student_id))
+                conn.commit()
             session['user_type'] = 'student'
             session['student_id'] = student_id
             session['student_name'] = student[0]
-            session['balance'] = student[2]
-            return redirect(url_for('student_dashboard'))
+            # ยอดเงินไม่เก็บใน session อ่านผ่าน balances ทุกครั้งที่แสดงผล
+            session['cart_id'] = cart_store.cart_id_for(conn, student_id)
+            return redirect(url_for('.student_dashboard'))
         else:
             flash('รหัสนักเรียนหรือรหัสผ่านไม่ถูกต้อง')
     
     return render_template('student_login.html')
 
-@app.route('/shop_login', methods=['GET', 'POST'])
+@bp.route('/shop_login', methods=['GET', 'POST'])
 def shop_login():
     if request.method == 'POST':
         shop_name = request.form['shop_name']
         password = request.form['password']
         
-        conn = sqlite3.connect('school_pos.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('SELECT shop_id, owner_name, password_hash FROM shops WHERE shop_name = ?', (shop_name,))
         shop = cursor.fetchone()
-        conn.close()
         
-        if shop and check_password_hash(shop[2], password):
+        valid, new_hash = passwords.check_login('shop', shop[2], password) if shop else (False, None)
+        if valid:
+            if new_hash:
+                cursor.execute('UPDATE shops SET password_hash = ? WHERE shop_id = ?', (new_hash, shop[0]))
+                conn.commit()
             session['user_type'] = 'shop'
             session['shop_id'] = shop[0]
             session['shop_name'] = shop_name
             session['owner_name'] = shop[1]
-            return redirect(url_for('shop_dashboard'))
+            return redirect(url_for('.shop_dashboard'))
         else:
             flash('ชื่อร้านหรือรหัสผ่านไม่ถูกต้อง')
     
     return render_template('shop_login.html')
 
-@app.route('/student_dashboard')
+@bp.route('/student_dashboard')
 def student_dashboard():
     if 'user_type' not in session or session['user_type'] != 'student':
-        return redirect(url_for('student_login'))
+        return redirect(url_for('.student_login'))
     
-    conn = sqlite3.connect('school_pos.db')
-    cursor = conn.cursor()
-    
-    # ดึงข้อมูลร้านค้า
-    cursor.execute('SELECT shop_id, shop_name, image_url FROM shops')
-    all_shops = cursor.fetchall()
+    # ดึงข้อมูลร้านค้า (ผ่าน catalog cache)
+    conn = get_db()
+    shops, version, updated_at = catalog.get_shops(conn)
+    balance, balance_version = balances.current(conn, session['student_id'])
     
-    # กรองชื่อร้านซ้ำ
-    seen = set()
-    shops = []
-    for shop_id, shop_name, image_url in all_shops:
-        if shop_name not in seen:
-            shops.append((shop_id, shop_name, image_url))
-            seen.add(shop_name)
-    
-    conn.close()
-    
-    return render_template('student_dashboard.html', 
-                           student_name=session['student_name'], 
-                           balance=session['balance'], 
-                           shops=shops)
+    return catalog.render_conditional(
+        ('student_dashboard', version, session['student_id'], balance_version), updated_at,
+        'student_dashboard.html',
+        student_name=session['student_name'],
+        balance=balance,
+        shops=shops)
 
 
-@app.route('/shop/<int:shop_id>')
+@bp.route('/shop/<int:shop_id>')
 def shop_menu(shop_id):
     if 'user_type' not in session or session['user_type'] != 'student':
-        return redirect(url_for('student_login'))
-    
-    conn = sqlite3.connect('school_pos.db')
-    cursor = conn.cursor()
-    
-    # ดึงชื่อร้าน
-    cursor.execute('SELECT shop_name FROM shops WHERE shop_id = ?', (shop_id,))
-    shop = cursor.fetchone()
-    
-    # ดึงเมนูพร้อมกรองชื่อซ้ำ
-    cursor.execute('''
-    SELECT item_id, name, price, available, image_url, category
-    FROM menu_items
-    WHERE shop_id = ? AND available = 1
-    GROUP BY name
-''', (shop_id,))
-    menu_items = cursor.fetchall()
-
-    conn.close()
-    
-    return render_template('shop_menu.html', 
-                           shop_name=shop[0], 
-                           shop_id=shop_id,
-                           menu_items=menu_items,
-                           balance=session['balance'])
-
-@app.route('/shop_dashboard')
+        return redirect(url_for('.student_login'))
+    
+    conn = get_db()
+    menu, version, updated_at = catalog.get_shop_menu(conn, shop_id)
+    if menu is None:
+        flash('ไม่พบร้านค้า')
+        return redirect(url_for('.student_dashboard'))
+    shop_name, menu_items = menu
+    balance, balance_version = balances.current(conn, session['student_id'])
+    
+    return catalog.render_conditional(
+        ('shop_menu', shop_id, version, session['student_id'], balance_version), updated_at,
+        'shop_menu.html',
+        shop_name=shop_name,
+        shop_id=shop_id,
+        menu_items=menu_items,
+        balance=balance)
+
+@bp.route('/menu.json')
+def full_menu():
+    if 'user_type' not in session or session['user_type'] != 'student':
+        return jsonify({'error': 'forbidden'}), 403
+    
+    # เมนูทุกร้านในไฟล์เดียว ให้ service worker เก็บไว้ใช้ตอน offline
+    conn = get_db()
+    versions, updated_at = catalog.menu_versions(conn)
+    return catalog.conditional_response(
+        ('menu.json', versions), updated_at,
+        lambda: jsonify({'shops': catalog.get_full_menu(conn)}), html=False)
+
+@bp.route('/sw.js')
+def service_worker():
+    return offline.service_worker_response()
+
+@bp.route('/media/manifest.json')
+def media_manifest():
+    # รายการรูปขนาดย่อที่ service worker precache (ชื่อไฟล์เป็น hash จึงข้ามไฟล์ที่มีอยู่แล้วได้)
+    response = jsonify({'images': media.precache_urls(get_db())})
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@bp.route('/media/<path:filename>')
+def media_file(filename):
+    # ชื่อไฟล์มาจาก hash ของเนื้อหา ไม่มีวันเปลี่ยน cache ได้ตลอด
+    response = send_from_directory(media.media_dir(current_app.config['DATABASE']), filename,
+                                   max_age=media.CACHE_SECONDS)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@bp.route('/shop_dashboard')
 def shop_dashboard():
     if 'user_type' not in session or session['user_type'] != 'shop':
-        return redirect(url_for('shop_login'))
+        return redirect(url_for('.shop_login'))
     
-    conn = sqlite3.connect('school_pos.db')
-    cursor = conn.cursor()
+    conn = get_db()
     
     # ดึงข้อมูลเมนู
-    cursor.execute('''
-        SELECT item_id, name, price, cost, available, category
-        FROM menu_items 
-        WHERE shop_id = ? AND available = 1
-        GROUP BY name
-    ''', (session['shop_id'],))
-    menu_items = cursor.fetchall()
-    
-    # สถิติการขายวันนี้
-    cursor.execute('''
-        SELECT COUNT(*) as order_count, IFNULL(SUM(total_amount), 0) as daily_sales
-        FROM orders 
-        WHERE shop_id = ? AND date(order_date) = date('now')
-    ''', (session['shop_id'],))
-    daily_stats = cursor.fetchone()
+    menu_items = catalog.get_shop_items(conn, session['shop_id'])
     
-    conn.close()
+    # สถิติการขายวันนี้ (จากตารางสรุปรายวัน)
+    daily_stats = rollups.today_stats(conn, session['shop_id'])
     
     return render_template('shop_dashboard.html', 
                          shop_name=session['shop_name'],
@@ -306,122 +187,192 @@ def shop_dashboard():
                          daily_orders=daily_stats[0],
                          daily_sales=daily_stats[1])
 
-@app.route('/add_to_cart', methods=['POST'])
+def current_cart_id():
+    # ตะกร้าของนักเรียนที่ล็อกอินอยู่ (session เก็บแค่ cart_id)
+    if 'cart_id' not in session:
+        session['cart_id'] = cart_store.cart_id_for(get_db(), session['student_id'])
+    return session['cart_id']
+
+def json_int(name):
+    # ค่าจำนวนเต็มจาก JSON body หรือ None ถ้าไม่มี/ไม่ใช่ตัวเลข
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return None
+    value = payload.get(name)
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+@bp.route('/add_to_cart', methods=['POST'])
+@idempotency.idempotent
 def add_to_cart():
-    if 'cart' not in session:
-        session['cart'] = []
-    
-    item_data = {
-        'item_id': request.json['item_id'],
-        'name': request.json['name'],
-        'price': request.json['price'],
-        'quantity': request.json['quantity'],
-        'shop_id': request.json['shop_id']
-    }
-    
-    # ตรวจสอบว่าสินค้าอยู่ในตะกร้าแล้วหรือไม่
-    found = False
-    for item in session['cart']:
-        if item['item_id'] == item_data['item_id']:
-            item['quantity'] += item_data['quantity']
-            found = True
-            break
-    
-    if not found:
-        session['cart'].append(item_data)
-    
-    session.modified = True
-    return jsonify({'success': True, 'cart_count': len(session['cart'])})
-
-@app.route('/cart')
+    if 'user_type' not in session or session['user_type'] != 'student':
+        return jsonify({'success': False}), 401
+    if offline.queued_for_other_student():
+        return jsonify({'success': False, 'error': 'queued by another student'}), 409
+    
+    # ใช้แค่ item_id กับจำนวน ชื่อและราคาอ่านจาก menu_items
+    item_id = json_int('item_id')
+    quantity = json_int('quantity')
+    if item_id is None or quantity is None or not 1 <= quantity <= cart_store.MAX_QUANTITY:
+        return jsonify({'success': False,
+                        'error': f'item_id and quantity (1-{cart_store.MAX_QUANTITY}) are required'}), 400
+    conn = get_db()
+    cart_id = current_cart_id()
+    if not cart_store.add_item(conn, cart_id, item_id, quantity):
+        return jsonify({'success': False, 'error': 'item unavailable'}), 400
+    
+    return jsonify({'success': True, 'cart_count': cart_store.count(conn, cart_id)})
+
+@bp.route('/api/cart')
+def api_cart():
+    if 'user_type' not in session or session['user_type'] != 'student':
+        return jsonify({'error': 'unauthorized'}), 401
+    
+    return jsonify(cart_store.to_json(cart_store.load(get_db(), current_cart_id())))
+
+@bp.route('/api/cart/items/<int:item_id>', methods=['PUT', 'DELETE'])
+def api_cart_item(item_id):
+    if 'user_type' not in session or session['user_type'] != 'student':
+        return jsonify({'error': 'unauthorized'}), 401
+    
+    conn = get_db()
+    cart_id = current_cart_id()
+    if request.method == 'DELETE':
+        cart_store.remove_item(conn, cart_id, item_id)
+    else:
+        # 0 = เอาออกจากตะกร้า
+        quantity = json_int('quantity')
+        if quantity is None or not 0 <= quantity <= cart_store.MAX_QUANTITY:
+            return jsonify({'error': f'quantity must be 0-{cart_store.MAX_QUANTITY}'}), 400
+        cart_store.set_quantity(conn, cart_id, item_id, quantity)
+    
+    return jsonify(cart_store.to_json(cart_store.load(conn, cart_id)))
+
+@bp.route('/cart')
 def view_cart():
     if 'user_type' not in session or session['user_type'] != 'student':
-        return redirect(url_for('student_login'))
+        return redirect(url_for('.student_login'))
     
-    cart = session.get('cart', [])
+    conn = get_db()
+    cart = list(cart_store.load(conn, current_cart_id()).values())
     total = sum(item['price'] * item['quantity'] for item in cart)
-    
-    return render_template('cart.html', cart=cart, total=total, balance=session['balance'])
-
-@app.route('/checkout', methods=['POST'])
+    balance, _ = balances.current(conn, session['student_id'])
+    
+    # เวลารับที่ว่าง: ที่เหลือของ slot คือค่าน้อยสุดของทุกร้านในตะกร้า (None = ไม่จำกัด)
+    pickup_options = {}
+    for shop_id in {item['shop_id'] for item in cart}:
+        for slot in pickup_slots.availability(conn, shop_id) or []:
+            remaining = pickup_options.get(slot['slot'], slot['remaining'])
+            if remaining is None or (slot['remaining'] is not None and slot['remaining'] < remaining):
+                remaining = slot['remaining']
+            pickup_options[slot['slot']] = remaining
+    
+    # key ใหม่ทุกครั้งที่เปิดตะกร้า กดชำระเงินซ้ำจากหน้าเดิมจะได้ไม่ถูกหักเงินสองครั้ง
+    return render_template('cart.html', cart=cart, total=total, balance=balance,
+                         pickup_options=sorted(pickup_options.items()),
+                         checkout_key=uuid.uuid4().hex)
+
+@bp.route('/checkout', methods=['POST'])
+@idempotency.idempotent
 def checkout():
     if 'user_type' not in session or session['user_type'] != 'student':
-        return redirect(url_for('student_login'))
-    
-    cart = session.get('cart', [])
-    if not cart:
+        return redirect(url_for('.student_login'))
+    if offline.queued_for_other_student():
+        # คำขอจากคิวของ service worker ไม่ใช่การกดจากหน้าเว็บ ตอบแค่สถานะ
+        return jsonify({'success': False, 'error': 'queued by another student'}), 409
+    
+    conn = get_db()
+    cart_id = current_cart_id()
+    idempotency_key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key') or None
+    if idempotency_key is not None and len(idempotency_key) > 128:
+        flash('คำขอไม่ถูกต้อง')
+        return redirect(url_for('.view_cart'))
+    
+    # ไม่เลือกเวลารับ = รับทันทีแบบเดิม
+    pickup_slot = request.form.get('pickup_slot') or None
+    if pickup_slot is not None:
+        try:
+            pickup_slot = pickup_slots.validate(pickup_slot)
+        except pickup_slots.InvalidSlot:
+            flash('เวลารับนี้จองไม่ได้แล้ว กรุณาเลือกใหม่')
+            return redirect(url_for('.view_cart'))
+    
+    try:
+        result = place_order(conn, session['student_id'], cart_store.quantities(conn, cart_id),
+                             cart_id=cart_id, idempotency_key=idempotency_key, pickup_slot=pickup_slot)
+    except EmptyCart:
         flash('ตะกร้าว่าง')
-        return redirect(url_for('student_dashboard'))
-    
-    total = sum(item['price'] * item['quantity'] for item in cart)
-    
-    if session['balance'] < total:
+        return redirect(url_for('.student_dashboard'))
+    except InvalidQuantity:
+        flash('จำนวนสินค้าในตะกร้าไม่ถูกต้อง กรุณาตรวจสอบตะกร้า')
+        return redirect(url_for('.view_cart'))
+    except InsufficientBalance:
         flash('ยอดเงินไม่เพียงพอ')
-        return redirect(url_for('view_cart'))
+        return redirect(url_for('.view_cart'))
+    except SlotFull:
+        flash('เวลารับนี้เต็มแล้ว กรุณาเลือกเวลาอื่น')
+        return redirect(url_for('.view_cart'))
+    except OutOfStock:
+        flash('บางรายการเหลือไม่พอกับจำนวนที่สั่ง กรุณาตรวจสอบตะกร้า')
+        return redirect(url_for('.view_cart'))
+    except ItemUnavailable:
+        flash('บางรายการหมดแล้ว กรุณาตรวจสอบตะกร้า')
+        return redirect(url_for('.view_cart'))
+    
+    flash(f'สั่งซื้อสำเร็จ! รับได้เวลา {pickup_slot}' if pickup_slot else 'สั่งซื้อสำเร็จ!')
+    return redirect(url_for('.student_dashboard'))
+
+@bp.route('/orders')
+def order_history_page():
+    if 'user_type' not in session or session['user_type'] != 'student':
+        return redirect(url_for('.student_login'))
     
-    conn = sqlite3.connect('school_pos.db')
-    cursor = conn.cursor()
+    # หน้าแรกเรนเดอร์จากเซิร์ฟเวอร์ หน้าถัดไปโหลดผ่าน /api/v1/me/orders?before=
+    conn = get_db()
+    orders, next_before = order_history.list_orders(conn, session['student_id'])
     
-    # สร้างคำสั่งซื้อ
-    for shop_id in set(item['shop_id'] for item in cart):
-        shop_items = [item for item in cart if item['shop_id'] == shop_id]
-        shop_total = sum(item['price'] * item['quantity'] for item in shop_items)
-        
-        cursor.execute('''
-            INSERT INTO orders (student_id, shop_id, total_amount)
-            VALUES (?, ?, ?)
-        ''', (session['student_id'], shop_id, shop_total))
-        
-        order_id = cursor.lastrowid
-        
-        # เพิ่มรายการสินค้า
-        for item in shop_items:
-            cursor.execute('''
-                INSERT INTO order_items (order_id, item_id, quantity, price)
-                VALUES (?, ?, ?, ?)
-            ''', (order_id, item['item_id'], item['quantity'], item['price']))
-    
-    # หักเงินจากบัญชี
-    new_balance = session['balance'] - total
-    cursor.execute('UPDATE students SET balance = ? WHERE student_id = ?', 
-                  (new_balance, session['student_id']))
-    
-    conn.commit()
-    conn.close()
+    return render_template('order_history.html',
+                         orders=orders,
+                         next_before=next_before,
+                         weekly=rollups.student_spending(conn, session['student_id'], 'week'),
+                         monthly=rollups.student_spending(conn, session['student_id'], 'month'))
+
+@bp.route('/orders/<int:order_id>/reorder', methods=['POST'])
+@idempotency.idempotent
+def reorder(order_id):
+    if 'user_type' not in session or session['user_type'] != 'student':
+        return redirect(url_for('.student_login'))
     
-    session['balance'] = new_balance
-    session['cart'] = []
-    session.modified = True
+    conn = get_db()
+    cart_id = current_cart_id()
+    added = cart_store.add_order(conn, cart_id, session['student_id'], order_id)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'success': added > 0, 'added': added, 'cart_count': cart_store.count(conn, cart_id)})
     
-    flash('สั่งซื้อสำเร็จ!')
-    return redirect(url_for('student_dashboard'))
+    flash(f'เพิ่ม {added} รายการลงตะกร้าแล้ว' if added else 'ไม่มีรายการที่ยังขายอยู่ในคำสั่งซื้อนี้')
+    return redirect(url_for('.view_cart'))
 
-@app.route('/manage_menu')
+@bp.route('/manage_menu')
 def manage_menu():
     if 'user_type' not in session or session['user_type'] != 'shop':
-        return redirect(url_for('shop_login'))
-    
-    conn = sqlite3.connect('school_pos.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT item_id, name, price, cost, available, category
-        FROM menu_items 
-        WHERE shop_id = ? AND available = 1
-        GROUP BY name
-    ''', (session['shop_id'],))
-    menu_items = cursor.fetchall()
+        return redirect(url_for('.shop_login'))
     
-    conn.close()
+    conn = get_db()
+    menu_items = catalog.get_shop_items(conn, session['shop_id'])
     
-    return render_template('manage_menu.html', menu_items=menu_items)
+    return render_template('manage_menu.html', menu_items=menu_items,
+                         stock_levels=inventory.stock_levels(conn, session['shop_id']))
 
-@app.route('/add_menu_item', methods=['POST'])
+@bp.route('/add_menu_item', methods=['POST'])
 def add_menu_item():
     if 'user_type' not in session or session['user_type'] != 'shop':
-        return redirect(url_for('shop_login'))
+        return redirect(url_for('.shop_login'))
     
-    conn = sqlite3.connect('school_pos.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -433,90 +384,164 @@ def add_menu_item():
           float(request.form['cost']),
           True,
           request.form['category']))
+    catalog.bump_version(conn, session['shop_id'])
+    
+    # รูปเมนู (ไม่บังคับ) worker จะย่อขนาดให้ภายหลัง
+    upload = request.files.get('image')
+    if upload and upload.filename:
+        try:
+            image_id, src = media.save_upload(conn, media.media_dir(current_app.config['DATABASE']), upload)
+        except media.MediaError as e:
+            conn.rollback()
+            flash(f'อัปโหลดรูปไม่สำเร็จ: {e}')
+            return redirect(url_for('.manage_menu'))
+        media.attach(conn, 'menu_items', cursor.lastrowid, image_id, src)
     
     conn.commit()
-    conn.close()
     
     flash('เพิ่มเมนูสำเร็จ!')
-    return redirect(url_for('manage_menu'))
+    return redirect(url_for('.manage_menu'))
 
-@app.route('/toggle_availability', methods=['POST'])
+@bp.route('/toggle_availability', methods=['POST'])
 def toggle_availability():
+    if 'user_type' not in session or session['user_type'] != 'shop':
+        return jsonify({'success': False}), 403
+    
     item_id = request.json['item_id']
     available = request.json['available']
     
-    conn = sqlite3.connect('school_pos.db')
+    conn = get_db()
     cursor = conn.cursor()
     
-    cursor.execute('UPDATE menu_items SET available = ? WHERE item_id = ?', (available, item_id))
+    # แก้ได้เฉพาะเมนูของร้านตัวเอง ร้านเลือกเองแล้วจึงไม่นับเป็นปิดเพราะสต็อกหมด (sold_out)
+    cursor.execute('UPDATE menu_items SET available = ?, sold_out = 0 WHERE item_id = ? AND shop_id = ?',
+                   (available, item_id, session['shop_id']))
+    if cursor.rowcount:
+        catalog.bump_version(conn, session['shop_id'])
     conn.commit()
-    conn.close()
     
     return jsonify({'success': True})
 
-@app.route('/sales_report')
+def optional_count(value):
+    # ช่องว่างคือไม่นับสต็อก / ไม่ได้ตั้งจำนวนเตรียม
+    if value is None or str(value).strip() == '':
+        return None
+    count = int(value)
+    if count < 0:
+        raise ValueError('negative count')
+    return count
+
+@bp.route('/set_stock', methods=['POST'])
+def set_stock():
+    if 'user_type' not in session or session['user_type'] != 'shop':
+        return jsonify({'success': False}), 403
+    
+    data = request.get_json(silent=True) or request.form
+    try:
+        item_id = int(data['item_id'])
+        stock = optional_count(data.get('stock'))
+        prep_quantity = optional_count(data.get('prep_quantity'))
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'message': 'จำนวนไม่ถูกต้อง'}), 400
+    
+    # แก้ได้เฉพาะเมนูของร้านตัวเอง
+    if not inventory.set_stock(get_db(), session['shop_id'], item_id, stock, prep_quantity):
+        return jsonify({'success': False}), 404
+    if not request.is_json:
+        flash('บันทึกสต็อกแล้ว')
+        return redirect(url_for('.manage_menu'))
+    return jsonify({'success': True, 'stock': stock, 'prep_quantity': prep_quantity})
+
+@bp.route('/reset_stock', methods=['POST'])
+def reset_stock():
+    if 'user_type' not in session or session['user_type'] != 'shop':
+        return redirect(url_for('.shop_login'))
+    
+    # เริ่มวันใหม่: ตั้งสต็อกตามจำนวนที่เตรียมไว้
+    items = inventory.reset_daily(get_db(), session['shop_id'])
+    flash(f'ตั้งสต็อกใหม่ {items} รายการ')
+    return redirect(url_for('.manage_menu'))
+
+@bp.route('/sales_report')
 def sales_report():
     if 'user_type' not in session or session['user_type'] != 'shop':
-        return redirect(url_for('shop_login'))
+        return redirect(url_for('.shop_login'))
     
-    conn = sqlite3.connect('school_pos.db')
-    cursor = conn.cursor()
+    conn = get_db()
     
     # รายงานการขายรายเมนู
-    cursor.execute('''
-        SELECT m.name, SUM(oi.quantity) as total_sold, 
-               SUM(oi.quantity * oi.price) as revenue,
-               SUM(oi.quantity * m.cost) as total_cost,
-               SUM(oi.quantity * (oi.price - m.cost)) as profit
-        FROM order_items oi
-        JOIN menu_items m ON oi.item_id = m.item_id
-        JOIN orders o ON oi.order_id = o.order_id
-        WHERE m.shop_id = ?
-        GROUP BY m.item_id, m.name
-        ORDER BY total_sold DESC
-    ''', (session['shop_id'],))
-    
-    menu_sales = cursor.fetchall()
+    menu_sales = rollups.menu_sales(conn, session['shop_id'])
     
     # รายงานการขายรายวัน (7 วันล่าสุด)
-    cursor.execute('''
-        SELECT date(order_date) as order_date, 
-               COUNT(*) as orders_count,
-               SUM(total_amount) as daily_revenue
-        FROM orders 
-        WHERE shop_id = ? 
-        AND order_date >= date('now', '-7 days')
-        GROUP BY date(order_date)
-        ORDER BY order_date DESC
-    ''', (session['shop_id'],))
-    
-    daily_sales = cursor.fetchall()
-    
-    conn.close()
+    daily_sales = rollups.daily_sales(conn, session['shop_id'], days=7)
     
     return render_template('sales_report.html', 
                          menu_sales=menu_sales, 
-                         daily_sales=daily_sales)
+                         daily_sales=daily_sales,
+                         export_formats=exports.available_formats())
+
+@bp.route('/shop/orders')
+def shop_orders():
+    if 'user_type' not in session or session['user_type'] != 'shop':
+        return redirect(url_for('.shop_login'))
+    
+    orders, last_event_id = order_queue.open_orders(get_db(), session['shop_id'])
+    
+    return render_template('shop_orders.html',
+                         shop_name=session['shop_name'],
+                         orders=orders,
+                         last_event_id=last_event_id)
+
+@bp.route('/shop/orders/stream')
+def shop_orders_stream():
+    if 'user_type' not in session or session['user_type'] != 'shop':
+        return jsonify({'error': 'forbidden'}), 403
+    
+    # browser ส่ง Last-Event-ID มาเองเมื่อต่อใหม่ ครั้งแรกใช้ค่าจากหน้า shop_orders
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id', 0))
+    except ValueError:
+        last_id = 0
+    
+    stream = order_queue.stream(db.get_pool(), session['shop_id'], last_id)
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/shop/orders/<int:order_id>/status', methods=['POST'])
+def update_order_status(order_id):
+    if 'user_type' not in session or session['user_type'] != 'shop':
+        return jsonify({'success': False}), 403
+    
+    status = (request.get_json(silent=True) or {}).get('status')
+    try:
+        order_queue.advance(get_db(), session['shop_id'], order_id, status)
+    except order_queue.InvalidTransition:
+        return jsonify({'success': False, 'message': 'เปลี่ยนสถานะไม่ได้'}), 409
+    
+    return jsonify({'success': True, 'status': status})
     
 # -------------------- Admin Portal --------------------
-@app.route('/admin_login', methods=['GET', 'POST'])
+@bp.route('/admin_login', methods=['GET', 'POST'])
 def admin_login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
 
-        conn = sqlite3.connect('school_pos.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT admin_id, username, password_hash, name FROM admins WHERE username = ?', (username,))
         admin = cursor.fetchone()
-        conn.close()
 
-        if admin and check_password_hash(admin[2], password):
+        valid, new_hash = passwords.check_login('admin', admin[2], password) if admin else (False, None)
+        if valid:
+            if new_hash:
+                cursor.execute('UPDATE admins SET password_hash = ? WHERE admin_id = ?', (new_hash, admin[0]))
+                conn.commit()
             session['user_type'] = 'admin'
             session['admin_id'] = admin[0]
             session['admin_name'] = admin[3]
             flash(f'ยินดีต้อนรับ {admin[3]}!')
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('.admin_dashboard'))
         else:
             flash('ชื่อผู้ใช้หรือรหัสผ่านไม่ถูกต้อง')
 
@@ -524,41 +549,58 @@ def admin_login():
 
 
 
-@app.route('/admin_dashboard')
+@bp.route('/admin_dashboard')
 def admin_dashboard():
     if 'user_type' not in session or session['user_type'] != 'admin':
-        return redirect(url_for('admin_login'))
+        return redirect(url_for('.admin_login'))
     
-    conn = sqlite3.connect('school_pos.db')
+    conn = get_db()
     cursor = conn.cursor()
     
-    # ดึงข้อมูลนักเรียน
-    cursor.execute('SELECT student_id, name, balance FROM students')
-    students = cursor.fetchall()
+    # ดึงข้อมูลนักเรียนเฉพาะหน้าแรก หน้าถัดไปโหลดผ่าน /admin/students.json
+    students, next_cursor = student_directory.list_students(conn)
     
     # ดึงข้อมูลร้านค้า
     cursor.execute('SELECT shop_id, shop_name, owner_name FROM shops')
     shops = cursor.fetchall()
     
-    conn.close()
-    
-    return render_template('admin_dashboard.html', students=students, shops=shops)
+    return render_template('admin_dashboard.html', students=students, next_cursor=next_cursor, shops=shops,
+                         export_formats=exports.available_formats())
 
-@app.route('/edit_student/<student_id>', methods=['GET', 'POST'])
+@bp.route('/admin/students.json')
+def admin_students_json():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({'error': 'forbidden'}), 403
+    
+    try:
+        students, next_cursor = student_directory.list_students(
+            get_db(),
+            q=request.args.get('q', ''),
+            sort=request.args.get('sort', 'id'),
+            after=request.args.get('after'),
+            limit=request.args.get('limit', student_directory.PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'invalid parameters'}), 400
+    
+    return jsonify({
+        'students': [{'student_id': sid, 'name': name, 'balance': balance} for sid, name, balance in students],
+        'next': next_cursor,
+    })
+
+@bp.route('/edit_student/<student_id>', methods=['GET', 'POST'])
 def edit_student(student_id):
     if 'user_type' not in session or session['user_type'] != 'admin':
-        return redirect(url_for('admin_login'))
+        return redirect(url_for('.admin_login'))
 
-    conn = sqlite3.connect('school_pos.db')
+    conn = get_db()
     cursor = conn.cursor()
 
     # ดึงข้อมูลนักเรียนก่อน
     cursor.execute('SELECT name, password_hash, balance FROM students WHERE student_id = ?', (student_id,))
     student = cursor.fetchone()
     if not student:
-        conn.close()
         flash('ไม่พบข้อมูลนักเรียน')
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('.admin_dashboard'))
 
     if request.method == 'POST':
         name = request.form['name']
@@ -567,43 +609,373 @@ def edit_student(student_id):
 
         # ถ้า password ไม่ว่างก็ update hash ใหม่ ถ้าว่างให้เก็บค่าเดิม
         if password:
-            password_hash = generate_password_hash(password)
+            password_hash = passwords.hash_password('student', password)
         else:
             password_hash = student[1]
 
         cursor.execute('''
             UPDATE students
-            SET name = ?, password_hash = ?, balance = ?
+            SET name = ?, password_hash = ?, balance = ?, balance_version = balance_version + 1
             WHERE student_id = ?
         ''', (name, password_hash, balance, student_id))
 
         conn.commit()
-        conn.close()
+        balances.cache.invalidate(student_id)
         flash('อัปเดตข้อมูลนักเรียนเรียบร้อย')
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('.admin_dashboard'))
 
-    conn.close()
-    return render_template('edit_student.html', student_id=student_id, student=student)
+    has_card = cursor.execute('SELECT 1 FROM student_cards WHERE student_id = ?', (student_id,)).fetchone() is not None
+    return render_template('edit_student.html', student_id=student_id, student=student, has_card=has_card)
+
+@bp.route('/issue_card/<student_id>', methods=['POST'])
+def issue_card(student_id):
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return redirect(url_for('.admin_login'))
+
+    # token แสดงครั้งเดียว นำไปพิมพ์เป็นบัตร/QR บัตรเดิมของนักเรียนใช้ไม่ได้อีก
+    token = kiosk.issue_card(get_db(), student_id)
+    if token is None:
+        flash('ไม่พบข้อมูลนักเรียน')
+        return redirect(url_for('.admin_dashboard'))
+    flash(f'ออกบัตรใหม่ให้ {student_id}: {token}')
+    return redirect(url_for('.edit_student', student_id=student_id))
+
+@bp.route('/revoke_card/<student_id>', methods=['POST'])
+def revoke_card(student_id):
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return redirect(url_for('.admin_login'))
+
+    # บัตรหาย: ยกเลิกบัตรทันทีโดยไม่ออกใบใหม่
+    if kiosk.revoke_card(get_db(), student_id):
+        flash(f'ยกเลิกบัตรของ {student_id} แล้ว')
+    else:
+        flash('นักเรียนคนนี้ไม่มีบัตรที่ใช้งานอยู่')
+    return redirect(url_for('.edit_student', student_id=student_id))
 
-@app.route('/delete_student/<student_id>')
+@bp.route('/delete_student/<student_id>')
 def delete_student(student_id):
     if 'user_type' not in session or session['user_type'] != 'admin':
-        return redirect(url_for('admin_login'))
+        return redirect(url_for('.admin_login'))
     
-    conn = sqlite3.connect('school_pos.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM students WHERE student_id = ?', (student_id,))
+    cursor.execute('DELETE FROM student_cards WHERE student_id = ?', (student_id,))
     conn.commit()
-    conn.close()
     
     flash('ลบนักเรียนเรียบร้อย')
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('.admin_dashboard'))
+
+@bp.route('/edit_shop/<int:shop_id>', methods=['GET', 'POST'])
+def edit_shop(shop_id):
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return redirect(url_for('.admin_login'))
+
+    conn = get_db()
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT shop_name, owner_name, password_hash, slot_capacity FROM shops WHERE shop_id = ?', (shop_id,))
+    shop = cursor.fetchone()
+    if not shop:
+        flash('ไม่พบข้อมูลร้านค้า')
+        return redirect(url_for('.admin_dashboard'))
+
+    if request.method == 'POST':
+        password = request.form.get('password', '').strip()
+        password_hash = passwords.hash_password('shop', password) if password else shop[2]
+        # ว่าง = ไม่จำกัดจำนวนคำสั่งซื้อต่อเวลารับ
+        capacity = request.form.get('slot_capacity', '').strip()
+        slot_capacity = max(int(capacity), 0) if capacity else None
+
+        cursor.execute('''
+            UPDATE shops
+            SET shop_name = ?, owner_name = ?, password_hash = ?, slot_capacity = ?
+            WHERE shop_id = ?
+        ''', (request.form['shop_name'], request.form['owner_name'], password_hash, slot_capacity, shop_id))
+        # ชื่อร้านแสดงทั้งในรายชื่อร้านและหน้าเมนู
+        catalog.bump_version(conn, catalog.SHOP_LIST)
+        catalog.bump_version(conn, shop_id)
+
+        upload = request.files.get('image')
+        if upload and upload.filename:
+            try:
+                image_id, src = media.save_upload(conn, media.media_dir(current_app.config['DATABASE']), upload)
+            except media.MediaError as e:
+                conn.rollback()
+                flash(f'อัปโหลดรูปไม่สำเร็จ: {e}')
+                return redirect(url_for('.edit_shop', shop_id=shop_id))
+            media.attach(conn, 'shops', shop_id, image_id, src)
+
+        conn.commit()
+        flash('อัปเดตข้อมูลร้านค้าเรียบร้อย')
+        return redirect(url_for('.admin_dashboard'))
+
+    return render_template('edit_shop.html', shop_id=shop_id, shop=shop)
+
+@bp.route('/delete_shop/<int:shop_id>')
+def delete_shop(shop_id):
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return redirect(url_for('.admin_login'))
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM shops WHERE shop_id = ?', (shop_id,))
+    catalog.bump_version(conn, catalog.SHOP_LIST)
+    catalog.bump_version(conn, shop_id)
+    conn.commit()
+    
+    flash('ลบร้านค้าเรียบร้อย')
+    return redirect(url_for('.admin_dashboard'))
+
+@bp.route('/admin/students/import', methods=['POST'])
+def import_students():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({'error': 'forbidden'}), 403
+    
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'missing file'}), 400
+    
+    # hash รหัสผ่านทีละมากใช้เวลานาน ให้ worker.py รันแทน request แล้ว poll สถานะ
+    job_id = bulk_import.submit(get_db(), bulk_import.import_dir(current_app.config['DATABASE']),
+                                f"admin:{session['admin_id']}", upload.stream, passwords.policy('student'))
+    return jsonify({'job_id': job_id, 'status_url': url_for('.import_status', job_id=job_id)}), 202
 
-@app.route('/logout')
+@bp.route('/admin/students/import/<int:job_id>')
+def import_status(job_id):
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({'error': 'forbidden'}), 403
+    
+    job = bulk_import.get_job(get_db(), job_id)
+    if job is None:
+        return jsonify({'error': 'not found'}), 404
+    return jsonify(bulk_import.job_json(job))
+
+@bp.route('/admin/stats')
+def admin_stats():
+    if 'user_type' not in session or session['user_type'] != 'admin':
+        return jsonify({'error': 'forbidden'}), 403
+
+    # สถิติของ connection pool ใน worker นี้ (ใช้ปรับขนาด pool เทียบกับ Procfile)
+    return jsonify({'db_pool': db.get_pool().stats(),
+                    'catalog': catalog.cache.stats(),
+                    'balances': balances.cache.stats(),
+                    'password_verifier': passwords.verifier().stats(),
+                    'idempotency': current_app.extensions['idempotency'].stats()})
+
+# -------------------- Report exports --------------------
+def export_owner():
+    # ร้านค้า export ได้เฉพาะยอดขายของร้านตัวเอง แอดมิน export ได้ทุกแบบ
+    if session.get('user_type') == 'shop':
+        return f"shop:{session['shop_id']}"
+    if session.get('user_type') == 'admin':
+        return f"admin:{session['admin_id']}"
+    return None
+
+@bp.route('/exports', methods=['POST'])
+def create_export():
+    requested_by = export_owner()
+    if requested_by is None:
+        return jsonify({'error': 'forbidden'}), 403
+    
+    data = request.get_json(silent=True) or request.form
+    kind = data.get('kind', 'sales')
+    shop_id = data.get('shop_id') or None
+    if session['user_type'] == 'shop':
+        if kind != 'sales':
+            return jsonify({'error': 'forbidden'}), 403
+        shop_id = session['shop_id']
+    elif shop_id is not None:
+        try:
+            shop_id = int(shop_id)
+        except ValueError:
+            return jsonify({'error': 'shop_id must be an integer'}), 400
+    
+    try:
+        job_id = exports.submit(get_db(), requested_by, kind, data.get('format', 'csv'),
+                                data.get('date_from'), data.get('date_to'), shop_id)
+    except exports.ExportError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'job_id': job_id, 'status_url': url_for('.export_status', job_id=job_id)}), 202
+
+def owned_export(job_id):
+    job = exports.get_job(get_db(), job_id)
+    if job is None or job['requested_by'] != export_owner():
+        return None
+    return job
+
+@bp.route('/exports/<int:job_id>')
+def export_status(job_id):
+    job = owned_export(job_id)
+    if job is None:
+        return jsonify({'error': 'not found'}), 404
+    
+    status = exports.job_json(job)
+    if job['status'] == 'done':
+        status['download_url'] = url_for('.export_download', job_id=job_id)
+    return jsonify(status)
+
+@bp.route('/exports/<int:job_id>/download')
+def export_download(job_id):
+    job = owned_export(job_id)
+    if job is None:
+        return jsonify({'error': 'not found'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': 'export is not ready', 'status': job['status']}), 409
+    
+    paths = exports.part_paths(exports.export_dir(current_app.config['DATABASE']), job)
+    if not all(os.path.exists(path) for path in paths):
+        return jsonify({'error': 'export has expired'}), 410
+    
+    # ส่งไฟล์ทีละ chunk ต่อกันทุก part ไม่อ่านทั้งไฟล์เข้าหน่วยความจำ
+    mimetype = ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                if job['format'] == 'xlsx' else 'text/csv')
+    return Response(exports.stream_parts(paths), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{exports.download_name(job)}"',
+                             'Content-Length': str(sum(os.path.getsize(path) for path in paths))})
+
+@bp.app_errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    return 'ระบบกำลังยุ่ง กรุณาลองใหม่อีกครั้ง', 503, {'Retry-After': '1'}
+
+@bp.app_errorhandler(LoginBusy)
+def handle_login_busy(e):
+    return 'มีผู้เข้าสู่ระบบพร้อมกันจำนวนมาก กรุณาลองใหม่อีกครั้ง', 503, {'Retry-After': '2'}
+
+@bp.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    # flask rebuild-rollups : คำนวณตารางสรุปยอดขายใหม่จาก orders ทั้งหมด
+    conn = db.connect(current_app.config['DATABASE'])
+    rows = rollups.rebuild(conn)
+    conn.close()
+    print(f'rebuilt daily_item_sales: {rows} rows')
+
+@bp.cli.command('prune-order-events')
+@click.option('--days', default=1, show_default=True, help='keep events newer than this')
+def prune_order_events_command(days):
+    # flask prune-order-events : ลบ event ของคิวคำสั่งซื้อที่เก่าแล้ว
+    conn = db.connect(current_app.config['DATABASE'])
+    removed = order_queue.prune(conn, days)
+    conn.close()
+    print(f'removed {removed} order events')
+
+@bp.cli.command('reset-stock')
+def reset_stock_command():
+    # flask reset-stock : ตั้งสต็อกของทุกร้านตาม prep_quantity (รันทุกเช้าก่อนเปิดขาย)
+    conn = db.connect(current_app.config['DATABASE'])
+    items = inventory.reset_daily(conn)
+    conn.close()
+    print(f'reset stock for {items} menu items')
+
+@bp.cli.command('issue-cards')
+@click.argument('student_ids', nargs=-1)
+@click.option('--all', 'all_students', is_flag=True, help='issue cards for every student without one')
+def issue_cards_command(student_ids, all_students):
+    # flask issue-cards S001 S002 / --all : พิมพ์ CSV student_id,token สำหรับพิมพ์บัตร kiosk
+    conn = db.connect(current_app.config['DATABASE'])
+    if all_students:
+        student_ids = [row[0] for row in conn.execute('''
+            SELECT student_id FROM students
+            WHERE student_id NOT IN (SELECT student_id FROM student_cards)
+            ORDER BY student_id
+        ''')]
+    print('student_id,token')
+    for student_id in student_ids:
+        token = kiosk.issue_card(conn, student_id)
+        if token is None:
+            click.echo(f'unknown student {student_id}', err=True)
+        else:
+            print(f'{student_id},{token}')
+    conn.close()
+
+@bp.cli.command('prune-pickup-slots')
+@click.option('--days', default=7, show_default=True, help='keep counters for slots newer than this')
+def prune_pickup_slots_command(days):
+    # flask prune-pickup-slots : ลบตัวนับของเวลารับที่ผ่านไปแล้ว
+    conn = db.connect(current_app.config['DATABASE'])
+    removed = pickup_slots.prune(conn, days)
+    conn.close()
+    print(f'removed {removed} pickup slot counters')
+
+@bp.cli.command('import-students')
+@click.argument('csv_file', type=click.Path(exists=True, dir_okay=False))
+def import_students_command(csv_file):
+    # flask import-students students.csv : นำเข้านักเรียน/เติมเงินทีละมาก
+    conn = db.connect(current_app.config['DATABASE'])
+    with open(csv_file, encoding='utf-8-sig', newline='') as lines:
+        report = bulk_import.import_students(conn, lines, passwords.policy('student'))
+    conn.close()
+    for error in report['errors']:
+        print(f"line {error['line']} ({error['student_id']}): {error['error']}")
+    print(f"rows={report['rows']} inserted={report['inserted']} updated={report['updated']} "
+          f"errors={len(report['errors'])} {report['rows_per_second']} rows/s")
+
+# route หลักที่ flask check-query-plans และ tests/test_query_plans.py รันกับข้อมูลตัวอย่าง (flask db seed)
+_PLAN_STUDENT = {'user_type': 'student', 'student_id': '01514', 'student_name': 'สมชาย ใจดี'}
+_PLAN_SHOP = {'user_type': 'shop', 'shop_id': 1, 'shop_name': 'ร้านข้าวแม่สมปอง', 'owner_name': 'แม่สมปอง'}
+_PLAN_ADMIN = {'user_type': 'admin', 'admin_id': 1, 'admin_name': 'ครูสมศรี'}
+PLAN_REQUESTS = [
+    (_PLAN_STUDENT, 'GET', '/student_dashboard', {}),
+    (_PLAN_STUDENT, 'GET', '/shop/1', {}),
+    (_PLAN_STUDENT, 'POST', '/add_to_cart', {'json': {'item_id': 1, 'quantity': 1}}),
+    (_PLAN_STUDENT, 'GET', '/cart', {}),
+    (_PLAN_STUDENT, 'POST', '/checkout', {}),
+    (_PLAN_SHOP, 'GET', '/shop_dashboard', {}),
+    (_PLAN_SHOP, 'GET', '/manage_menu', {}),
+    (_PLAN_SHOP, 'GET', '/sales_report', {}),
+    (_PLAN_SHOP, 'GET', '/shop/orders', {}),
+    (_PLAN_SHOP, 'GET', '/api/v1/shop/orders?since=0', {}),
+    (_PLAN_STUDENT, 'GET', '/api/v1/me/orders', {}),
+    (_PLAN_STUDENT, 'GET', '/api/v1/me/orders?before=10', {}),
+    (_PLAN_STUDENT, 'GET', '/api/v1/me/balance', {}),
+    (_PLAN_STUDENT, 'GET', '/api/v1/shops/1/slots', {}),
+    (_PLAN_STUDENT, 'GET', '/api/v1/me/orders?from=2024-01-01&to=2024-01-31', {}),
+    (_PLAN_STUDENT, 'GET', '/api/v1/me/spending?period=month', {}),
+    (_PLAN_STUDENT, 'GET', '/orders', {}),
+    (_PLAN_STUDENT, 'POST', '/orders/1/reorder', {}),
+    (_PLAN_ADMIN, 'GET', '/admin_dashboard', {}),
+    (_PLAN_ADMIN, 'GET', '/admin/students.json?sort=-balance', {}),
+    (_PLAN_ADMIN, 'GET', '/admin/students.json?q=สมชาย', {}),
+]
+
+@bp.cli.command('check-query-plans')
+def check_query_plans_command():
+    # flask check-query-plans : ล้มเหลวถ้า route หลักตัวใด scan ทั้งตาราง orders/order_items
+    problems = migrations.check_query_plans(current_app._get_current_object(), PLAN_REQUESTS)
+    for sql, detail in problems:
+        print(f'{detail}: {sql}')
+    if problems:
+        raise SystemExit(1)
+    print('no full table scans on orders/order_items')
+
+@bp.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
+
+def create_app(config=None):
+    # gunicorn 'app:create_app()' และ flask CLI เรียกฟังก์ชันนี้ครั้งเดียวต่อโปรเซส
+    app = Flask(__name__)
+    app.secret_key = 'your-secret-key-here'
+    if config:
+        app.config.update(config)
+    db.init_app(app)
+    instrumentation.init_app(app)
+    passwords.init_app(app)
+    idempotency.init_app(app)
+    assets.init_app(app)
+    app.register_blueprint(bp)
+
+    # JSON API โหลดตอนสร้างแอป ไม่ใช่ตอน import โมดูลนี้
+    import api
+    app.register_blueprint(api.bp)
+
+    app.cli.add_command(db_init.db_cli)
+    app.cli.add_command(archive.archive_cli)
+    app.cli.add_command(maintenance.maintenance_cli)
+    return app
 
 if __name__ == '__main__':
-    init_db()
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # ครั้งแรก: flask db upgrade && flask db seed
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,418 @@
+import logging
+import os
+import re
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+import db
+
+log = logging.getLogger('school_pos.archive')
+
+# ย้ายคำสั่งซื้อของภาคเรียนที่ปิดแล้วออกจากฐานข้อมูลหลัก
+#  - ภาคเรียนกำหนดในตาราง terms (start_date..end_date รวมทั้งวัน เทียบกับ date(order_date) แบบเดียวกับ rollups)
+#  - archive_term: ตรวจว่า rollups ตรงกับ orders ก่อน -> คัดลอก orders/order_items ลงไฟล์ SQLite ของภาคเรียน
+#    (ATTACH) -> ตรวจจำนวนในไฟล์ -> ลบออกจากฐานข้อมูลหลักและบันทึก archived_at ใน transaction เดียว
+#    ถ้าล้มกลางทาง terms ยังไม่ถูกทำเครื่องหมาย ผู้อ่านจึงไม่เห็นไฟล์ archive และรันซ้ำได้ (INSERT OR IGNORE)
+#  - ตารางสรุป (daily_*_sales, student_daily_spending) อยู่ในฐานข้อมูลหลักตลอด รายงานที่อ่าน rollups ไม่เปลี่ยน
+#  - query ที่อ่าน orders ตามช่วงวันที่ใช้ sources() ได้ชื่อ schema ที่ต้องอ่าน ('main' และ archive ที่ช่วงวันที่ทับ)
+#    ATTACH เฉพาะตอนที่ช่วงวันที่ต้องใช้ แล้วค้างไว้กับ connection นั้น ฝั่งอ่านไม่แก้ schema ของไฟล์ archive
+#  - คอลัมน์ที่ migration เพิ่มให้ orders/order_items ภายหลัง เพิ่มในไฟล์ archive ตอนย้าย
+#    และตอน flask db upgrade (upgrade_archives) ครั้งเดียวต่อ deploy
+
+TABLES = ('orders', 'order_items')
+# index ในไฟล์ archive (ไฟล์อ่านอย่างเดียวหลังย้ายเสร็จ สร้าง index หลังใส่ข้อมูล)
+ARCHIVE_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_orders_student ON orders(student_id, order_id)',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_orders_student_date ON orders(student_id, order_date)',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_orders_date ON orders(order_date)',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_order_items_order ON order_items(order_id)',
+)
+# SQLite ATTACH ได้ไม่เกิน 10 ไฟล์ต่อ connection
+MAX_ATTACHED = 8
+# worker ย้ายภาคเรียนที่จบไปแล้วเกินกี่วัน (เผื่อแก้ไข/คืนเงินหลังปิดภาค)
+ARCHIVE_AFTER = timedelta(days=14)
+
+archive_cli = AppGroup('archive', help='Move closed terms into per-term archive databases.')
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ArchiveError('dates must be YYYY-MM-DD')
+
+
+def archive_dir(db_path):
+    return os.environ.get('SCHOOL_POS_ARCHIVE_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(db_path)), 'archive')
+
+
+def _main_path(conn):
+    for _, name, path in conn.execute('PRAGMA database_list'):
+        if name == 'main':
+            return path
+    return ''
+
+
+def _schema(term_id):
+    return f'term_{term_id}'
+
+
+def _range(alias='o'):
+    # order_date ในช่วง [start_date, end_date] ใช้ index idx_orders_date
+    return f"{alias}.order_date >= ? AND {alias}.order_date < date(?, '+1 day')"
+
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f'PRAGMA {schema}.table_info({table})')]
+
+
+# ---------- ภาคเรียน ----------
+
+def add_term(conn, name, start_date, end_date):
+    start_date, end_date = _day(start_date), _day(end_date)
+    if end_date < start_date:
+        raise ArchiveError('end_date is before start_date')
+    overlap = conn.execute('SELECT name FROM terms WHERE start_date <= ? AND end_date >= ?',
+                           (end_date, start_date)).fetchone()
+    if overlap:
+        raise ArchiveError(f'overlaps term {overlap[0]!r}')
+    try:
+        cursor = conn.execute('INSERT INTO terms (name, start_date, end_date) VALUES (?, ?, ?)',
+                              (name, start_date, end_date))
+    except sqlite3.IntegrityError:
+        raise ArchiveError(f'term {name!r} already exists')
+    conn.commit()
+    return cursor.lastrowid
+
+
+def get_term(conn, name):
+    cursor = conn.execute('SELECT * FROM terms WHERE name = ?', (name,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([column[0] for column in cursor.description], row))
+
+
+def list_terms(conn):
+    cursor = conn.execute('SELECT * FROM terms ORDER BY start_date')
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def due_terms(conn, today=None):
+    # ภาคเรียนที่จบเกิน ARCHIVE_AFTER แล้วแต่ยังไม่ได้ย้าย
+    cutoff = ((today or datetime.now(timezone.utc).date()) - ARCHIVE_AFTER).strftime('%Y-%m-%d')
+    return [term for term in list_terms(conn) if term['archived_at'] is None and term['end_date'] < cutoff]
+
+
+# ---------- ฝั่งอ่าน ----------
+
+def attach(conn, term):
+    # ATTACH ไฟล์ archive ของภาคเรียน (ถ้ายังไม่ได้ attach) คืนชื่อ schema
+    schema = _schema(term['term_id'])
+    attached = [row[1] for row in conn.execute('PRAGMA database_list')]
+    if schema in attached:
+        return schema
+    if conn.in_transaction:
+        raise ArchiveError('cannot attach an archive inside a transaction')
+    terms = [name for name in attached if name.startswith('term_')]
+    if len(terms) >= MAX_ATTACHED:
+        for name in terms:
+            conn.execute(f'DETACH DATABASE {name}')
+    path = os.path.join(archive_dir(_main_path(conn)), term['archive_file'])
+    if not os.path.exists(path):
+        raise ArchiveError(f'archive file for term {term["name"]!r} is missing: {path}')
+    try:
+        conn.execute('ATTACH DATABASE ? AS ' + schema, (path,))
+    except sqlite3.DatabaseError as e:
+        raise ArchiveError(f'cannot open archive for term {term["name"]!r}: {e}')
+    return schema
+
+
+def _add_missing_columns(conn, schema):
+    # คอลัมน์ที่ migration เพิ่มให้ตารางหลักหลังย้ายไปแล้ว เพิ่มใน archive ด้วย (ค่าเป็น NULL) คืนจำนวนที่เพิ่ม
+    added = 0
+    for table in TABLES:
+        existing = set(_columns(conn, schema, table))
+        for column, column_type in [row[1:3] for row in conn.execute(f'PRAGMA main.table_info({table})').fetchall()]:
+            if column not in existing:
+                conn.execute(f'ALTER TABLE {schema}.{table} ADD COLUMN {column} {column_type}')
+                added += 1
+    return added
+
+
+def upgrade_archives(conn):
+    # เรียกจาก flask db upgrade หลัง migration คืน [(ภาคเรียน, จำนวนคอลัมน์ที่เพิ่ม หรือข้อความ error)]
+    results = []
+    for term in archived_terms(conn):
+        try:
+            schema = attach(conn, term)
+        except ArchiveError as e:
+            results.append((term['name'], str(e)))
+            continue
+        results.append((term['name'], _add_missing_columns(conn, schema)))
+        conn.execute(f'DETACH DATABASE {schema}')
+    return results
+
+
+def archived_terms(conn, date_from=None, date_to=None):
+    # ภาคเรียนที่ย้ายแล้วและทับช่วงวันที่ เรียงใหม่ -> เก่า
+    clauses = ['archived_at IS NOT NULL']
+    params = []
+    if date_from is not None:
+        clauses.append('end_date >= ?')
+        params.append(date_from)
+    if date_to is not None:
+        clauses.append('start_date <= ?')
+        params.append(date_to)
+    cursor = conn.execute(f'SELECT * FROM terms WHERE {" AND ".join(clauses)} ORDER BY start_date DESC', params)
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def sources(conn, date_from=None, date_to=None, skip_missing=False):
+    # generator: schema ที่ต้องอ่านสำหรับช่วงวันที่นี้ เรียงใหม่ -> เก่า ('main' ก่อนเสมอ)
+    # order_id ของ archive น้อยกว่าของ main และของภาคเรียนถัดไปเสมอ
+    # ผู้เรียกที่ได้ข้อมูลพอแล้วหยุดวนได้เลย จะไม่แตะตาราง terms หรือ ATTACH ไฟล์ archive
+    # skip_missing: ไฟล์ archive ที่หาย/เสียถือว่าไม่มีข้อมูล (หน้าประวัติของนักเรียน) แทนการโยน ArchiveError
+    yield 'main'
+    for term in archived_terms(conn, date_from, date_to):
+        try:
+            schema = attach(conn, term)
+        except ArchiveError as e:
+            if not skip_missing:
+                raise
+            log.warning('skipping archive: %s', e)
+            continue
+        yield schema
+
+
+# ---------- ย้ายภาคเรียน ----------
+
+def verify_rollups(conn, term, schema='main'):
+    # เทียบ orders/order_items ในช่วงภาคเรียนกับตารางสรุป คืนรายการที่ไม่ตรง (ว่าง = ตรงทั้งหมด)
+    params = (term['start_date'], term['end_date'])
+    checks = (
+        ('daily_shop_sales', f'''
+            SELECT shop_id, date(order_date), COUNT(*), ROUND(SUM(total_amount), 2)
+            FROM {schema}.orders o WHERE {_range()}
+            GROUP BY shop_id, date(order_date)
+        ''', '''
+            SELECT shop_id, sale_date, order_count, ROUND(revenue, 2)
+            FROM daily_shop_sales WHERE sale_date >= ? AND sale_date <= ?
+        '''),
+        ('daily_item_sales', f'''
+            SELECT o.shop_id, date(o.order_date), oi.item_id, SUM(oi.quantity), ROUND(SUM(oi.quantity * oi.price), 2)
+            FROM {schema}.orders o JOIN {schema}.order_items oi ON oi.order_id = o.order_id
+            WHERE {_range()}
+            GROUP BY o.shop_id, date(o.order_date), oi.item_id
+        ''', '''
+            SELECT shop_id, sale_date, item_id, quantity, ROUND(revenue, 2)
+            FROM daily_item_sales WHERE sale_date >= ? AND sale_date <= ?
+        '''),
+        ('student_daily_spending', f'''
+            SELECT student_id, date(order_date), COUNT(*), ROUND(SUM(total_amount), 2)
+            FROM {schema}.orders o WHERE {_range()}
+            GROUP BY student_id, date(order_date)
+        ''', '''
+            SELECT student_id, spend_date, order_count, ROUND(amount, 2)
+            FROM student_daily_spending WHERE spend_date >= ? AND spend_date <= ?
+        '''),
+    )
+    mismatches = []
+    for table, from_orders, from_rollup in checks:
+        for label, first, second in (('orders', from_orders, from_rollup), (table, from_rollup, from_orders)):
+            for row in conn.execute(f'{first} EXCEPT {second}', params + params):
+                mismatches.append((table, f'only in {label}', row))
+    return mismatches
+
+
+def _totals(conn, schema, term):
+    return conn.execute(f'''
+        SELECT COUNT(*), IFNULL(SUM(o.total_amount), 0),
+               (SELECT COUNT(*) FROM {schema}.order_items oi
+                WHERE oi.order_id IN (SELECT order_id FROM {schema}.orders o WHERE {_range()}))
+        FROM {schema}.orders o WHERE {_range()}
+    ''', (term['start_date'], term['end_date']) * 2).fetchone()
+
+
+def _create_tables(conn, schema):
+    # ใช้ CREATE TABLE เดียวกับตารางหลัก คอลัมน์จึงเรียงตรงกัน
+    for table in TABLES:
+        if _columns(conn, schema, table):
+            continue
+        sql = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?",
+                           (table,)).fetchone()[0]
+        conn.execute(re.sub(r'^CREATE TABLE\s+"?\w+"?', f'CREATE TABLE {schema}.{table}', sql))
+
+
+def archive_term(conn, name, force=False, today=None):
+    # คืน dict สรุปผล ต้องไม่อยู่ใน transaction (ATTACH/DETACH ทำใน transaction ไม่ได้)
+    term = get_term(conn, name)
+    if term is None:
+        raise ArchiveError(f'unknown term {name!r}')
+    if term['archived_at'] is not None:
+        raise ArchiveError(f'term {name!r} is already archived')
+    today = (today or datetime.now(timezone.utc).date()).strftime('%Y-%m-%d')
+    if term['end_date'] >= today:
+        raise ArchiveError(f'term {name!r} has not ended yet')
+
+    mismatches = verify_rollups(conn, term)
+    if mismatches and not force:
+        raise ArchiveError(f'rollups do not match orders for term {name!r} '
+                           f'({len(mismatches)} differences, first: {mismatches[0]})')
+
+    directory = archive_dir(_main_path(conn))
+    os.makedirs(directory, exist_ok=True)
+    filename = f'{_schema(term["term_id"])}.db'
+    schema = _schema(term['term_id'])
+    params = (term['start_date'], term['end_date'])
+    conn.execute('ATTACH DATABASE ? AS ' + schema, (os.path.join(directory, filename),))
+    try:
+        # 1. คัดลอก (รันซ้ำได้ แถวที่คัดลอกแล้วถูกข้าม)
+        _create_tables(conn, schema)
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            _add_missing_columns(conn, schema)
+            columns = ', '.join(_columns(conn, 'main', 'orders'))
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO {schema}.orders ({columns})
+                SELECT {columns} FROM main.orders o WHERE {_range()}
+            ''', params)
+            item_columns = _columns(conn, 'main', 'order_items')
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO {schema}.order_items ({', '.join(item_columns)})
+                SELECT {', '.join('oi.' + column for column in item_columns)}
+                FROM main.orders o JOIN main.order_items oi ON oi.order_id = o.order_id
+                WHERE {_range()}
+            ''', params)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        for sql in ARCHIVE_INDEXES:
+            conn.execute(sql.format(schema=schema))
+        conn.execute(f'ANALYZE {schema}')
+
+        # 2. ตรวจว่าไฟล์ archive มีครบก่อนลบ
+        live = _totals(conn, 'main', term)
+        archived = _totals(conn, schema, term)
+        if (live[0], round(live[1], 2), live[2]) != (archived[0], round(archived[1], 2), archived[2]):
+            raise ArchiveError(f'archive copy does not match: live {live}, archive {archived}')
+
+        # 3. ลบจากฐานข้อมูลหลัก + ทำเครื่องหมายว่าย้ายแล้ว (transaction เดียวในไฟล์หลัก)
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute(f'''
+                DELETE FROM main.order_items
+                WHERE order_id IN (SELECT order_id FROM main.orders o WHERE {_range()})
+            ''', params)
+            cursor.execute(f'''
+                DELETE FROM main.order_events
+                WHERE order_id IN (SELECT order_id FROM main.orders o WHERE {_range()})
+            ''', params)
+            cursor.execute(f'DELETE FROM main.orders AS o WHERE {_range()}', params)
+            cursor.execute('''
+                UPDATE terms
+                SET archive_file = ?, archived_at = ?, order_count = ?, revenue = ?, item_count = ?
+                WHERE term_id = ?
+            ''', (filename, _now(), archived[0], archived[1], archived[2], term['term_id']))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute(f'DETACH DATABASE {schema}')
+
+    return {'term': name, 'file': filename, 'orders': archived[0], 'items': archived[2],
+            'revenue': archived[1], 'rollup_mismatches': len(mismatches)}
+
+
+def archive_due(conn, today=None):
+    return [archive_term(conn, term['name'], today=today) for term in due_terms(conn, today)]
+
+
+# ---------- CLI ----------
+
+def _connect():
+    return db.connect(current_app.config['DATABASE'])
+
+
+@archive_cli.command('add-term')
+@click.argument('name')
+@click.argument('start_date')
+@click.argument('end_date')
+def add_term_command(name, start_date, end_date):
+    conn = _connect()
+    try:
+        add_term(conn, name, start_date, end_date)
+    except ArchiveError as e:
+        raise click.ClickException(str(e))
+    finally:
+        conn.close()
+    print(f'added term {name} ({start_date} .. {end_date})')
+
+
+@archive_cli.command('list')
+def list_command():
+    conn = _connect()
+    for term in list_terms(conn):
+        state = (f'archived {term["archived_at"]}: {term["order_count"]} orders in {term["archive_file"]}'
+                 if term['archived_at'] else 'live')
+        print(f'{term["name"]:<16} {term["start_date"]} .. {term["end_date"]}  {state}')
+    conn.close()
+
+
+@archive_cli.command('verify')
+@click.argument('name')
+def verify_command(name):
+    conn = _connect()
+    term = get_term(conn, name)
+    if term is None:
+        conn.close()
+        raise click.ClickException(f'unknown term {name!r}')
+    try:
+        schema = attach(conn, term) if term['archived_at'] else 'main'
+        mismatches = verify_rollups(conn, term, schema)
+    except ArchiveError as e:
+        raise click.ClickException(str(e))
+    finally:
+        conn.close()
+    for table, where, row in mismatches[:20]:
+        print(f'{table}: {where}: {row}')
+    if mismatches:
+        raise click.ClickException(f'{len(mismatches)} differences between orders and rollups')
+    print(f'rollups match orders for term {name} ({schema})')
+
+
+@archive_cli.command('run')
+@click.argument('name', required=False)
+@click.option('--force', is_flag=True, help='archive even if rollups do not match orders')
+def run_command(name, force):
+    # ไม่ระบุชื่อ = ย้ายทุกภาคเรียนที่ถึงกำหนด (แบบเดียวกับที่ worker ทำ)
+    conn = _connect()
+    try:
+        results = [archive_term(conn, name, force)] if name else archive_due(conn)
+    except ArchiveError as e:
+        raise click.ClickException(str(e))
+    finally:
+        conn.close()
+    for result in results:
+        print(f'archived term {result["term"]}: {result["orders"]} orders, {result["items"]} items '
+              f'-> {result["file"]}')
+    if not results:
+        print('no terms due for archiving')
@@ -0,0 +1,151 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ไฟล์ CSS/JS แบบ build ล่วงหน้า (flask assets build ตอน deploy)
+#  - ย่อขนาด ตั้งชื่อตาม hash ของเนื้อหา แล้วเขียนไว้ที่ static/dist/ พร้อม .gz (และ .br ถ้ามี brotli)
+#  - static/dist/manifest.json จับคู่ชื่อไฟล์ต้นฉบับ -> ชื่อที่มี hash
+#  - asset_url('static', filename='style.css') ใช้แทน url_for ได้ คืน URL ที่มี hash ถ้า build แล้ว
+#    ไม่งั้น (หรือโหมด debug) คืน /static/ ปกติ
+#  - /static/dist/ เสิร์ฟแบบ immutable เลือกไฟล์บีบอัดตาม Accept-Encoding
+# service worker (offline.py) precache ตามรายการเดียวกันนี้
+
+ASSETS = ('style.css', 'js/script.js')
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+CACHE_SECONDS = 365 * 24 * 3600
+# (encoding, นามสกุล) เรียงตามลำดับที่อยากเสิร์ฟ
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+assets_cli = AppGroup('assets', help='Build hashed, minified and precompressed static assets.')
+
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    # ไม่ตัดช่องว่างก่อน ':' (selector อย่าง "a :hover" ความหมายต่างจาก "a:hover")
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip() + '\n'
+
+
+def minify_js(text):
+    # แบบปลอดภัย: ตัดย่อหน้า บรรทัดว่าง และบรรทัดที่เป็น comment ล้วน
+    # ไม่แตะบรรทัดที่อยู่ใน template literal (`...`) และไม่แก้โค้ดในบรรทัด
+    lines = []
+    in_template = False
+    for line in text.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith('//'):
+                lines.append(stripped)
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _write(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build(static_folder):
+    # คืน manifest {ชื่อต้นฉบับ: ชื่อใน dist/} และรายละเอียดขนาดไฟล์ของแต่ละตัว
+    out_dir = os.path.join(static_folder, DIST)
+    manifest = {}
+    sizes = {}
+    for name in ASSETS:
+        base, ext = os.path.splitext(name)
+        with open(os.path.join(static_folder, name), encoding='utf-8') as f:
+            source = f.read()
+        data = MINIFIERS.get(ext, str)(source).encode('utf-8')
+        hashed = f'{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        path = os.path.join(out_dir, hashed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write(path, data)
+        # mtime=0 ให้ไฟล์ .gz เหมือนกันทุกครั้งที่ build
+        gz = gzip.compress(data, compresslevel=9, mtime=0)
+        _write(path + '.gz', gz)
+        sizes[name] = {'source': len(source.encode('utf-8')), 'minified': len(data), 'gzip': len(gz)}
+        if brotli is not None:
+            br = brotli.compress(data, quality=11)
+            _write(path + '.br', br)
+            sizes[name]['br'] = len(br)
+        manifest[name] = hashed
+
+    _write(os.path.join(out_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest, sizes
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def asset_url(endpoint, **values):
+    manifest = current_app.extensions['assets']
+    if endpoint == 'static' and not current_app.debug and values.get('filename') in manifest:
+        values['filename'] = manifest[values['filename']]
+        return url_for('assets', **values)
+    return url_for(endpoint, **values)
+
+
+def precache_urls():
+    return [asset_url('static', filename=name) for name in ASSETS]
+
+
+def serve(filename):
+    directory = os.path.join(current_app.static_folder, DIST)
+    mimetype = 'text/css' if filename.endswith('.css') else 'application/javascript'
+    accepted = request.headers.get('Accept-Encoding', '')
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(os.path.join(directory, filename + suffix)):
+            response = send_from_directory(directory, filename + suffix, mimetype=mimetype,
+                                           max_age=CACHE_SECONDS)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype, max_age=CACHE_SECONDS)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    # manifest อ่านครั้งเดียวตอนสร้างแอป (build ต้องรันก่อน gunicorn เริ่ม)
+    app.extensions['assets'] = load_manifest(app.static_folder)
+    app.add_url_rule(f'{app.static_url_path}/{DIST}/<path:filename>', 'assets', serve)
+    app.add_template_global(asset_url)
+    app.cli.add_command(assets_cli)
+
+
+@assets_cli.command('build')
+def build_command():
+    manifest, sizes = build(current_app.static_folder)
+    for name, hashed in manifest.items():
+        size = sizes[name]
+        compressed = ', '.join(f'{key} {size[key]}' for key in ('gzip', 'br') if key in size)
+        print(f'{name} -> {DIST}/{hashed}: {size["source"]} -> {size["minified"]} bytes ({compressed})')
+    if brotli is None:
+        print('brotli is not installed, skipped .br files')
@@ -0,0 +1,72 @@
+import threading
+import time
+
+# ยอดเงินนักเรียนสำหรับแสดงผล (ไม่เก็บใน session อีกต่อไป)
+#  - cache ในโปรเซส: student_id -> (balance, balance_version, เวลาที่อ่าน) อายุ BALANCE_TTL วินาที
+#  - ทุกที่ที่แก้ยอดเงินต้องเพิ่ม students.balance_version ใน transaction เดียวกัน
+#    worker ที่แก้จะอัปเดต cache ของตัวเองทันที worker อื่นเห็นค่าใหม่เมื่อ cache หมดอายุ
+#  - การตัดสินใจเรื่องเงิน (checkout) อ่านจากตารางเสมอ ไม่ผ่าน cache นี้
+
+BALANCE_TTL = 2.0
+
+
+class BalanceCache:
+    def __init__(self, ttl=BALANCE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conn, student_id):
+        # คืน (balance, version) หรือ None ถ้าไม่มีนักเรียนคนนี้
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is not None and now - entry[2] < self.ttl:
+                self.hits += 1
+                return entry[0], entry[1]
+            self.misses += 1
+        row = conn.execute('SELECT balance, balance_version FROM students WHERE student_id = ?',
+                           (student_id,)).fetchone()
+        if row is None:
+            self.invalidate(student_id)
+            return None
+        self.put(student_id, row[0], row[1], now)
+        return row[0], row[1]
+
+    def put(self, student_id, balance, version, fetched_at=None):
+        # ไม่ให้ค่าที่อ่านมาก่อนทับค่าที่ใหม่กว่า (version สูงกว่า)
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is not None and entry[1] > version:
+                return
+            self._entries[student_id] = (balance, version,
+                                         time.monotonic() if fetched_at is None else fetched_at)
+
+    def invalidate(self, student_id):
+        with self._lock:
+            self._entries.pop(student_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+cache = BalanceCache()
+
+
+def current(conn, student_id):
+    # (balance, version) สำหรับแสดงผลและทำ ETag
+    return cache.get(conn, student_id) or (0.0, 0)
@@ -0,0 +1,90 @@
+# วัด throughput ของ checkout เมื่อนักเรียนหลายคนสั่งพร้อมกัน
+#   python bench/checkout_throughput.py --students 200 --threads 16 --orders 5
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkout import place_order, InsufficientBalance  # noqa: E402
+from db import ConnectionPool  # noqa: E402
+import migrations  # noqa: E402
+
+
+def seed(pool, students, shops, items_per_shop, balance):
+    with pool.connection() as conn:
+        migrations.upgrade(conn)
+        conn.executemany('INSERT INTO students (student_id, name, password_hash, balance) VALUES (?, ?, ?, ?)',
+                         [(f'S{i:05d}', f'student {i}', '-', balance) for i in range(students)])
+        conn.executemany('''
+            INSERT INTO menu_items (shop_id, name, price, cost, available, category)
+            VALUES (?, ?, ?, ?, 1, 'bench')
+        ''', [(shop, f'item {shop}-{n}', 20 + n * 5, 10) for shop in range(1, shops + 1)
+              for n in range(items_per_shop)])
+        conn.commit()
+        return [row[0] for row in conn.execute('SELECT item_id FROM menu_items')]
+
+
+def run(args):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    pool = ConnectionPool(path, size=args.threads, timeout=30)
+    item_ids = seed(pool, args.students, args.shops, args.items, args.balance)
+
+    student_ids = [f'S{i:05d}' for i in range(args.students)]
+    work = [sid for sid in student_ids for _ in range(args.orders)]
+    random.shuffle(work)
+    lock = threading.Lock()
+    counts = {'ok': 0, 'rejected': 0}
+
+    def worker():
+        rng = random.Random()
+        with pool.connection() as conn:
+            while True:
+                with lock:
+                    if not work:
+                        return
+                    student_id = work.pop()
+                cart = {item_id: rng.randint(1, 3) for item_id in rng.sample(item_ids, 3)}
+                try:
+                    place_order(conn, student_id, cart, retries=20)
+                    key = 'ok'
+                except InsufficientBalance:
+                    key = 'rejected'
+                with lock:
+                    counts[key] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    # ยอดเงินที่หายไปต้องเท่ากับยอดคำสั่งซื้อพอดี (ไม่มี lost update)
+    with pool.connection() as conn:
+        spent = args.students * args.balance - conn.execute('SELECT SUM(balance) FROM students').fetchone()[0]
+        ordered = conn.execute('SELECT IFNULL(SUM(total_amount), 0) FROM orders').fetchone()[0]
+        negative = conn.execute('SELECT COUNT(*) FROM students WHERE balance < 0').fetchone()[0]
+
+    print(f'threads={args.threads} students={args.students} checkouts={counts["ok"]} '
+          f'rejected={counts["rejected"]} elapsed={elapsed:.2f}s '
+          f'throughput={counts["ok"] / elapsed:.1f} checkouts/s')
+    print(f'balance check: spent={spent:.2f} ordered={ordered:.2f} negative_balances={negative}')
+    if abs(spent - ordered) > 0.001 or negative:
+        sys.exit('ledger mismatch')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='checkout throughput benchmark')
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--shops', type=int, default=4)
+    parser.add_argument('--items', type=int, default=5)
+    parser.add_argument('--orders', type=int, default=5, help='checkouts per student')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--balance', type=float, default=1000.0)
+    run(parser.parse_args())
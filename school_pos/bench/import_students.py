@@ -0,0 +1,55 @@
+# วัดความเร็วนำเข้านักเรียนจาก CSV แล้วเติมเงินนักเรียนเดิมอีกรอบ (หลาย chunk)
+# ตรวจว่ายอดเงินหลังเติมถูกต้องทุกคน และ cache ยอดเงินของนักเรียนที่ถูกเติมถูกล้าง
+#   python bench/import_students.py --students 2000 --chunk 500
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import balances  # noqa: E402
+import bulk_import  # noqa: E402
+import db  # noqa: E402
+import migrations  # noqa: E402
+
+
+def main(args):
+    path = os.path.join(tempfile.mkdtemp(), 'import.db')
+    conn = db.connect(path)
+    migrations.upgrade(conn)
+    student_ids = [f'S{i:05d}' for i in range(args.students)]
+
+    # รอบแรก: นักเรียนใหม่ (hash รหัสผ่านแบบเร็ว ไม่ได้วัด scrypt)
+    report = bulk_import.import_students(
+        conn, (f'{sid},student {sid},pw,{args.balance}\n' for sid in student_ids), 'pbkdf2:sha256:1000',
+        chunk_size=args.chunk)
+    print(f'insert: {report["inserted"]} rows in {report["seconds"]}s ({report["rows_per_second"]} rows/s), '
+          f'{len(report["errors"])} errors')
+
+    # ให้ cache มีค่าเดิมค้างอยู่ก่อนเติมเงิน
+    for sid in student_ids:
+        balances.cache.get(conn, sid)
+
+    # รอบสอง: เติมเงินนักเรียนเดิม (ไม่มีชื่อ/รหัสผ่าน) ทุก chunk ต้องถูกนำเข้า
+    report = bulk_import.import_students(
+        conn, (f'{sid},,,{args.top_up}\n' for sid in student_ids), 'pbkdf2:sha256:1000', chunk_size=args.chunk)
+    print(f'top-up: {report["updated"]} rows in {report["seconds"]}s ({report["rows_per_second"]} rows/s), '
+          f'{len(report["errors"])} errors')
+
+    expected = args.balance + args.top_up
+    wrong = conn.execute('SELECT COUNT(*) FROM students WHERE balance != ?', (expected,)).fetchone()[0]
+    stale = sum(1 for sid in student_ids if balances.cache.get(conn, sid)[0] != expected)
+    conn.close()
+    print(f'balance check: wrong_balances={wrong} stale_cache={stale}')
+    if report['updated'] != args.students or report['errors'] or wrong or stale:
+        sys.exit('top-up import mismatch')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='bulk student import benchmark')
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--chunk', type=int, default=bulk_import.CHUNK_SIZE)
+    parser.add_argument('--balance', type=float, default=100.0)
+    parser.add_argument('--top-up', type=float, default=50.0)
+    main(parser.parse_args())
@@ -0,0 +1,159 @@
+# วัด latency ของ kiosk checkout (POST /api/v1/kiosk/checkout) ผ่าน Flask ทั้ง stack
+# เทียบกับ flow ของนักเรียนหน้าเว็บ (หน้าร้าน -> add_to_cart ทีละเมนู -> ตะกร้า -> checkout)
+#   python bench/kiosk_latency.py --orders 2000
+#   python bench/kiosk_latency.py --orders 500 --threads 4 --compare
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import db  # noqa: E402
+import kiosk  # noqa: E402
+import migrations  # noqa: E402
+
+TARGET_P95_MS = 20.0
+
+
+def seed(path, students, items, balance):
+    conn = db.connect(path)
+    migrations.upgrade(conn)
+    conn.executemany('INSERT INTO students (student_id, name, password_hash, balance) VALUES (?, ?, ?, ?)',
+                     [(f'S{i:05d}', f'student {i}', '-', balance) for i in range(students)])
+    conn.execute("INSERT INTO shops (shop_name, owner_name, password_hash) VALUES ('kiosk', 'bench', '-')")
+    shop_id = conn.execute('SELECT shop_id FROM shops').fetchone()[0]
+    conn.executemany('''
+        INSERT INTO menu_items (shop_id, name, price, cost, available, category)
+        VALUES (?, ?, ?, ?, 1, 'bench')
+    ''', [(shop_id, f'item {n}', 20 + n * 5, 10) for n in range(items)])
+    conn.commit()
+    cards = [kiosk.issue_card(conn, f'S{i:05d}') for i in range(students)]
+    item_ids = [row[0] for row in conn.execute('SELECT item_id FROM menu_items')]
+    conn.close()
+    return shop_id, cards, item_ids
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def report(name, values):
+    print(f'{name:>14}: n={len(values)} p50 {percentile(values, 0.5) * 1000:6.2f} ms   '
+          f'p95 {percentile(values, 0.95) * 1000:6.2f} ms   p99 {percentile(values, 0.99) * 1000:6.2f} ms   '
+          f'max {max(values) * 1000:6.2f} ms   mean {statistics.mean(values) * 1000:6.2f} ms')
+
+
+def run_threads(threads, orders, task):
+    # task(client, rng) -> วินาทีที่ใช้ หนึ่ง client ต่อ thread (เหมือนหลาย kiosk)
+    latencies = []
+    lock = threading.Lock()
+    remaining = [orders]
+
+    def worker():
+        client, rng = task.client(), random.Random()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            elapsed = task(client, rng)
+            with lock:
+                latencies.append(elapsed)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return latencies, time.perf_counter() - start
+
+
+def main(args):
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, 'kiosk.db')
+    shop_id, cards, item_ids = seed(path, args.students, args.items, args.balance)
+    os.environ['SCHOOL_POS_DB'] = path
+
+    import app  # noqa: E402
+    application = app.create_app({'DATABASE': path, 'DB_POOL_SIZE': max(args.threads, 2)})
+
+    def kiosk_client():
+        client = application.test_client()
+        with client.session_transaction() as sess:
+            sess['user_type'] = 'shop'
+            sess['shop_id'] = shop_id
+        return client
+
+    def kiosk_order(client, rng):
+        body = {'card': rng.choice(cards),
+                'items': [[item_id, rng.randint(1, 2)] for item_id in rng.sample(item_ids, args.lines)]}
+        start = time.perf_counter()
+        response = client.post('/api/v1/kiosk/checkout', json=body)
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            sys.exit(f'kiosk checkout failed: {response.status_code} {response.get_data(as_text=True)}')
+        return elapsed
+
+    kiosk_order.client = kiosk_client
+
+    # warm-up (โหลด template/route, เปิด connection ใน pool)
+    warm = kiosk_client()
+    for _ in range(20):
+        kiosk_order(warm, random.Random())
+
+    latencies, elapsed = run_threads(args.threads, args.orders, kiosk_order)
+    print(f'kiosk checkout: {args.orders} orders, {args.lines} lines each, {args.threads} threads, '
+          f'{args.orders / elapsed:.0f} orders/s')
+    report('kiosk', latencies)
+
+    if args.compare:
+        def web_client():
+            client = application.test_client()
+            with client.session_transaction() as sess:
+                sess['user_type'] = 'student'
+                sess['student_id'] = f'S{random.randrange(args.students):05d}'
+            return client
+
+        def web_order(client, rng):
+            # นับเฉพาะหลังล็อกอิน (ไม่รวมเวลา hash รหัสผ่าน)
+            start = time.perf_counter()
+            client.get(f'/shop/{shop_id}')
+            for item_id in rng.sample(item_ids, args.lines):
+                client.post('/add_to_cart', json={'item_id': item_id, 'quantity': rng.randint(1, 2)})
+            client.get('/cart')
+            response = client.post('/checkout')
+            elapsed = time.perf_counter() - start
+            if response.status_code != 302:
+                sys.exit(f'web checkout failed: {response.status_code}')
+            return elapsed
+
+        web_order.client = web_client
+        web_latencies, elapsed = run_threads(args.threads, args.orders, web_order)
+        print(f'\nweb flow: {3 + args.lines} requests per order, {args.orders / elapsed:.0f} orders/s')
+        report('web flow', web_latencies)
+
+    p95 = percentile(latencies, 0.95) * 1000
+    if p95 > args.target_ms:
+        sys.exit(f'kiosk p95 {p95:.2f} ms is above the {args.target_ms:.0f} ms target')
+    print(f'\nkiosk p95 {p95:.2f} ms (target < {args.target_ms:.0f} ms)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='kiosk checkout latency benchmark')
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--items', type=int, default=20)
+    parser.add_argument('--lines', type=int, default=3, help='menu items per order')
+    parser.add_argument('--threads', type=int, default=1, help='concurrent kiosks')
+    parser.add_argument('--balance', type=float, default=1_000_000.0)
+    parser.add_argument('--compare', action='store_true', help='also time the student web flow')
+    parser.add_argument('--target-ms', type=float, default=TARGET_P95_MS)
+    main(parser.parse_args())
@@ -0,0 +1,66 @@
+# วัดจำนวนการล็อกอินต่อวินาที (ต่อ core) ของแต่ละนโยบาย hash รหัสผ่าน
+#   python bench/login_throughput.py --logins 40 --policy scrypt:16384:8:1 --policy pbkdf2:sha256:600000
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from passwords import DEFAULT_POLICIES, LoginBusy, PasswordVerifier  # noqa: E402
+
+
+def measure(method, logins, clients, workers, queue_depth):
+    stored = generate_password_hash('password123', method)
+    verifier = PasswordVerifier(workers, queue_depth, timeout=60)
+    lock = threading.Lock()
+    counts = {'ok': 0, 'busy': 0}
+    remaining = [logins]
+
+    def client():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            try:
+                verifier.verify(stored, 'password123')
+                key = 'ok'
+            except LoginBusy:
+                key = 'busy'
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return counts, elapsed
+
+
+def run(args):
+    cores = os.cpu_count() or 1
+    workers = args.workers or cores
+    policies = args.policy or sorted(set(DEFAULT_POLICIES.values()))
+    print(f'cores={cores} verify_workers={workers} clients={args.clients} queue={args.queue}')
+    for method in policies:
+        counts, elapsed = measure(method, args.logins, args.clients, workers, args.queue)
+        rate = counts['ok'] / elapsed
+        print(f'{method:24} ok={counts["ok"]:5} busy={counts["busy"]:5} '
+              f'{rate:8.1f} logins/s {rate / min(workers, cores):8.1f} logins/s/core')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='login (password verify) throughput benchmark')
+    parser.add_argument('--policy', action='append', help='werkzeug hash method (repeatable)')
+    parser.add_argument('--logins', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=16, help='concurrent request threads')
+    parser.add_argument('--workers', type=int, default=0, help='verify pool size (default: cores)')
+    parser.add_argument('--queue', type=int, default=64, help='max pending verifications')
+    run(parser.parse_args())
@@ -0,0 +1,352 @@
+# จำลองช่วงพักกลางวัน: นักเรียนจำนวนมาก login -> ดูเมนู -> ใส่ตะกร้า -> checkout พร้อมกัน
+# ขณะที่ร้านค้าเปิดรายงานการขายและครูเปิดหน้าแอดมิน
+# วัด p50/p95/p99 และ requests/s แยกตาม route แล้วบันทึกเป็น JSON ไว้เทียบกับรอบก่อน
+#   python bench/lunch_rush.py --mode client --clients 16 --duration 30 --output rush.json
+#   python bench/lunch_rush.py --mode gunicorn --workers 2 --threads 8 --compare rush.json
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import db  # noqa: E402
+import migrations  # noqa: E402
+import rollups  # noqa: E402
+from db_init import insert_sample_data  # noqa: E402
+from passwords import hash_password  # noqa: E402
+
+STUDENT_PASSWORD = 'password123'
+SHOP_PASSWORD = 'shop123'
+ADMIN = ('teacher1', 'pass1234')
+PERCENTILES = (50, 95, 99)
+
+
+# ---------- สร้างโรงเรียนจำลอง ----------
+
+def seed(path, students, shops, items, days, orders_per_day, rng):
+    conn = db.connect(path)
+    migrations.upgrade(conn)
+    cursor = conn.cursor()
+    # ข้อมูลตัวอย่างเดิม (ร้าน 1-4, teacher1) แล้วเติมให้ได้ขนาดที่ต้องการ
+    insert_sample_data(cursor)
+
+    # hash ครั้งเดียวแล้วใช้ร่วมกัน (การ hash ทีละคนใช้เวลานานเกินไปสำหรับการเตรียมข้อมูล)
+    student_hash = hash_password('student', STUDENT_PASSWORD)
+    shop_hash = hash_password('shop', SHOP_PASSWORD)
+    cursor.executemany('INSERT INTO students (student_id, name, password_hash, balance) VALUES (?, ?, ?, ?)',
+                       [(f'B{i:05d}', f'นักเรียนทดสอบ {i}', student_hash, 100000.0) for i in range(students)])
+
+    existing = cursor.execute('SELECT COUNT(*) FROM shops').fetchone()[0]
+    cursor.executemany('INSERT INTO shops (shop_name, owner_name, password_hash) VALUES (?, ?, ?)',
+                       [(f'ร้านทดสอบ {n}', f'เจ้าของ {n}', shop_hash) for n in range(existing, shops)])
+    # ให้ร้านตัวอย่างใช้รหัสผ่านเดียวกับร้านจำลอง
+    cursor.execute('UPDATE shops SET password_hash = ?', (shop_hash,))
+    shop_ids = [row[0] for row in cursor.execute('SELECT shop_id FROM shops ORDER BY shop_id')]
+    for shop_id in shop_ids:
+        have = cursor.execute('SELECT COUNT(*) FROM menu_items WHERE shop_id = ?', (shop_id,)).fetchone()[0]
+        cursor.executemany('''
+            INSERT INTO menu_items (shop_id, name, price, cost, available, category)
+            VALUES (?, ?, ?, ?, 1, 'ทดสอบ')
+        ''', [(shop_id, f'เมนู {shop_id}-{n}', 20 + 5 * (n % 8), 10) for n in range(have, items)])
+
+    menu = {}
+    for item_id, shop_id, price in cursor.execute('SELECT item_id, shop_id, price FROM menu_items'):
+        menu.setdefault(shop_id, []).append((item_id, price))
+
+    # ประวัติคำสั่งซื้อย้อนหลัง (เขียนตรงลงตาราง แล้วคำนวณตารางสรุปใหม่ทีเดียว)
+    student_ids = [f'B{i:05d}' for i in range(students)]
+    order_id = cursor.execute('SELECT IFNULL(MAX(order_id), 0) FROM orders').fetchone()[0]
+    today = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0, microsecond=0)
+    for day in range(days, 0, -1):
+        orders = []
+        order_items = []
+        for _ in range(orders_per_day):
+            order_id += 1
+            shop_id = rng.choice(shop_ids)
+            lines = [(item_id, rng.randint(1, 2), price) for item_id, price in rng.sample(menu[shop_id], 2)]
+            when = today - timedelta(days=day, seconds=rng.randint(0, 3600))
+            orders.append((order_id, rng.choice(student_ids), shop_id, when.strftime('%Y-%m-%d %H:%M:%S'),
+                           sum(quantity * price for _, quantity, price in lines)))
+            order_items += [(order_id, item_id, quantity, price) for item_id, quantity, price in lines]
+        cursor.executemany('''
+            INSERT INTO orders (order_id, student_id, shop_id, order_date, total_amount, status)
+            VALUES (?, ?, ?, ?, ?, 'completed')
+        ''', orders)
+        cursor.executemany('INSERT INTO order_items (order_id, item_id, quantity, price) VALUES (?, ?, ?, ?)',
+                           order_items)
+    conn.commit()
+    rollups.rebuild(conn)
+
+    shop_names = dict(conn.execute('SELECT shop_id, shop_name FROM shops'))
+    conn.close()
+    return student_ids, shop_names, menu
+
+
+# ---------- client ----------
+
+class TestClient:
+    # เรียก route ผ่าน Flask test client ใน process เดียวกัน
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, url, form=None, json_body=None):
+        response = self.client.open(url, method=method, data=form, json=json_body)
+        response.close()
+        return response.status_code, response.headers.get('Location', '')
+
+
+class HttpClient:
+    # HTTP keep-alive ไปยัง gunicorn พร้อมเก็บ cookie session เอง (ไม่ตาม redirect)
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port, timeout=60)
+        self.cookies = {}
+
+    def request(self, method, url, form=None, json_body=None):
+        headers = {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            body = json.dumps(json_body)
+            headers['Content-Type'] = 'application/json'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        self.conn.request(method, url, body=body, headers=headers)
+        response = self.conn.getresponse()
+        response.read()
+        for header, value in response.getheaders():
+            if header.lower() == 'set-cookie':
+                name, _, rest = value.partition('=')
+                self.cookies[name] = rest.split(';', 1)[0]
+        return response.status, response.getheader('Location', '')
+
+
+# ---------- สถานการณ์ ----------
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def call(self, client, route, method, url, form=None, json_body=None, ok=None):
+        start = time.perf_counter()
+        status, location = client.request(method, url, form, json_body)
+        elapsed = time.perf_counter() - start
+        failed = status >= 400 or (ok is not None and not ok(status, location))
+        with self.lock:
+            self.latencies.setdefault(route, []).append(elapsed)
+            if failed:
+                self.errors[route] = self.errors.get(route, 0) + 1
+        return status, location
+
+
+def _redirects_to(path):
+    return lambda status, location: status == 302 and location.endswith(path)
+
+
+def student_session(client, recorder, rng, student_ids, menu):
+    student_id = rng.choice(student_ids)
+    recorder.call(client, 'student_login', 'POST', '/student_login',
+                  form={'student_id': student_id, 'password': STUDENT_PASSWORD},
+                  ok=_redirects_to('/student_dashboard'))
+    recorder.call(client, 'student_dashboard', 'GET', '/student_dashboard')
+    shop_id = rng.choice(list(menu))
+    recorder.call(client, 'shop_menu', 'GET', f'/shop/{shop_id}')
+    for item_id, _ in rng.sample(menu[shop_id], 2):
+        recorder.call(client, 'add_to_cart', 'POST', '/add_to_cart',
+                      json_body={'item_id': item_id, 'quantity': rng.randint(1, 2)})
+    recorder.call(client, 'checkout', 'POST', '/checkout', ok=_redirects_to('/student_dashboard'))
+    recorder.call(client, 'logout', 'GET', '/logout')
+
+
+def shop_session(client, recorder, shop_name):
+    recorder.call(client, 'shop_login', 'POST', '/shop_login',
+                  form={'shop_name': shop_name, 'password': SHOP_PASSWORD},
+                  ok=_redirects_to('/shop_dashboard'))
+    recorder.call(client, 'shop_dashboard', 'GET', '/shop_dashboard')
+    recorder.call(client, 'sales_report', 'GET', '/sales_report')
+
+
+def admin_session(client, recorder):
+    recorder.call(client, 'admin_login', 'POST', '/admin_login',
+                  form={'username': ADMIN[0], 'password': ADMIN[1]},
+                  ok=_redirects_to('/admin_dashboard'))
+    recorder.call(client, 'admin_dashboard', 'GET', '/admin_dashboard')
+
+
+def drive(make_client, args, student_ids, shop_names, menu):
+    recorder = Recorder()
+    deadline = time.perf_counter() + args.duration
+
+    def student_worker(n):
+        rng = random.Random(args.seed + n)
+        while time.perf_counter() < deadline:
+            student_session(make_client(), recorder, rng, student_ids, menu)
+
+    def staff_worker(n):
+        rng = random.Random(args.seed - n - 1)
+        while time.perf_counter() < deadline:
+            if n % 2:
+                admin_session(make_client(), recorder)
+            else:
+                shop_id = rng.choice(list(shop_names))
+                shop_session(make_client(), recorder, shop_names[shop_id])
+            time.sleep(args.staff_think)
+
+    threads = [threading.Thread(target=student_worker, args=(n,)) for n in range(args.clients)]
+    threads += [threading.Thread(target=staff_worker, args=(n,)) for n in range(args.staff)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder, time.perf_counter() - start
+
+
+# ---------- รายงาน ----------
+
+def percentile(sorted_values, p):
+    # nearest-rank
+    index = max(0, -(-p * len(sorted_values) // 100) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def summarize(recorder, elapsed):
+    routes = {}
+    for route, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        routes[route] = {
+            'count': len(values),
+            'errors': recorder.errors.get(route, 0),
+            'rps': round(len(values) / elapsed, 2),
+        }
+        for p in PERCENTILES:
+            routes[route][f'p{p}_ms'] = round(percentile(values, p) * 1000, 2)
+    return routes
+
+
+def print_report(routes, baseline=None):
+    header = f'{"route":18} {"count":>7} {"errors":>6} {"req/s":>8}' + ''.join(f' {f"p{p} ms":>9}' for p in PERCENTILES)
+    if baseline:
+        header += f' {"p95 vs base":>12}'
+    print(header)
+    for route, r in routes.items():
+        line = f'{route:18} {r["count"]:7} {r["errors"]:6} {r["rps"]:8.1f}'
+        line += ''.join(f' {r[f"p{p}_ms"]:9.1f}' for p in PERCENTILES)
+        if baseline:
+            base = baseline.get(route)
+            if base and base['p95_ms']:
+                line += f' {(r["p95_ms"] / base["p95_ms"] - 1) * 100:+11.1f}%'
+            else:
+                line += f' {"-":>12}'
+        print(line)
+
+
+# ---------- โหมดการรัน ----------
+
+def run_client(args, path, student_ids, shop_names, menu):
+    os.environ['SCHOOL_POS_DB'] = path
+    from app import create_app
+    app = create_app({'DB_POOL_SIZE': args.clients + args.staff})
+    return drive(lambda: TestClient(app), args, student_ids, shop_names, menu)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_gunicorn(args, path, student_ids, shop_names, menu):
+    port = _free_port()
+    env = dict(os.environ, SCHOOL_POS_DB=path, DB_POOL_SIZE=str(args.threads))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:create_app()', '--bind', f'127.0.0.1:{port}',
+         '--worker-class', 'gthread', '--workers', str(args.workers), '--threads', str(args.threads),
+         '--log-level', 'warning'],
+        cwd=APP_DIR, env=env)
+    try:
+        # รอจน gunicorn พร้อมรับ connection
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+                break
+            except OSError:
+                if server.poll() is not None:
+                    sys.exit('gunicorn exited during startup')
+                time.sleep(0.1)
+        return drive(lambda: HttpClient('127.0.0.1', port), args, student_ids, shop_names, menu)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    path = os.path.join(tempfile.mkdtemp(), 'lunch_rush.db')
+    start = time.perf_counter()
+    student_ids, shop_names, menu = seed(path, args.students, args.shops, args.items,
+                                         args.days, args.orders_per_day, rng)
+    print(f'seeded {len(student_ids)} students, {len(shop_names)} shops, '
+          f'{args.days * args.orders_per_day} historical orders in {time.perf_counter() - start:.1f}s')
+
+    runner = run_gunicorn if args.mode == 'gunicorn' else run_client
+    recorder, elapsed = runner(args, path, student_ids, shop_names, menu)
+    routes = summarize(recorder, elapsed)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['routes']
+    print(f'mode={args.mode} clients={args.clients} staff={args.staff} elapsed={elapsed:.1f}s')
+    print_report(routes, baseline)
+
+    if args.output:
+        result = {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'cpu_count': os.cpu_count(),
+            'args': vars(args),
+            'elapsed': round(elapsed, 3),
+            'routes': routes,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f'wrote {args.output}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='school lunch rush load test')
+    parser.add_argument('--mode', choices=('client', 'gunicorn'), default='client',
+                        help='Flask test client in-process, or HTTP against a local gunicorn')
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--shops', type=int, default=8)
+    parser.add_argument('--items', type=int, default=12, help='menu items per shop')
+    parser.add_argument('--days', type=int, default=365, help='days of order history')
+    parser.add_argument('--orders-per-day', type=int, default=300)
+    parser.add_argument('--clients', type=int, default=16, help='concurrent student sessions')
+    parser.add_argument('--staff', type=int, default=2, help='concurrent shop/admin sessions')
+    parser.add_argument('--staff-think', type=float, default=1.0, help='seconds between staff page loads')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of load')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--compare', help='baseline JSON from an earlier --output')
+    main(parser.parse_args())
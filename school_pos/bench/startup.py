@@ -0,0 +1,128 @@
+# วัดเวลา cold start ของ worker: import app, create_app() และเวลาจนได้ response แรก
+# รันแต่ละรอบในโปรเซสใหม่ (เหมือน gunicorn เริ่ม/รีไซเคิล worker) แล้วรายงาน median/max
+#   python bench/startup.py --runs 10
+#   python bench/startup.py --runs 5 --gunicorn
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import db  # noqa: E402
+import db_init  # noqa: E402
+import migrations  # noqa: E402
+
+FIRST_URL = '/student_login'
+
+# โค้ดที่รันในโปรเซสลูก พิมพ์ผลเป็น JSON บรรทัดเดียว
+PROBE = f'''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+status = application.test_client().get({FIRST_URL!r}).status_code
+responded = time.perf_counter()
+print(json.dumps({{'import': imported - start, 'create_app': created - imported,
+                   'first_response': responded - created, 'total': responded - start, 'status': status}}))
+'''
+
+
+def prepare(path):
+    # schema + ข้อมูลตัวอย่างทำครั้งเดียวก่อนวัด (แบบเดียวกับ flask db upgrade / flask db seed ตอน deploy)
+    conn = db.connect(path)
+    start = time.perf_counter()
+    migrations.upgrade(conn)
+    upgraded = time.perf_counter()
+    db_init.seed(conn)
+    seeded = time.perf_counter()
+    # รอบที่สองควรข้ามทั้งคู่
+    migrations.upgrade(conn)
+    db_init.seed(conn)
+    noop = time.perf_counter()
+    conn.close()
+    return {'upgrade': upgraded - start, 'seed': seeded - upgraded, 'noop': noop - seeded}
+
+
+def probe(env):
+    # เวลารวมนับตั้งแต่สั่ง spawn ถึงได้ response แรก (รวมเวลาเริ่ม interpreter)
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=APP_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process'] = time.perf_counter() - start
+    return result
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def probe_gunicorn(env):
+    # เวลาจาก spawn gunicorn (ตาม Procfile) จนตอบ HTTP 200 ครั้งแรก
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:create_app()', '--bind', f'127.0.0.1:{port}',
+         '--worker-class', 'gthread', '--workers', '1', '--threads', '2', '--log-level', 'warning'],
+        cwd=APP_DIR, env=env)
+    try:
+        while True:
+            if server.poll() is not None:
+                sys.exit('gunicorn exited during startup')
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+                conn.request('GET', FIRST_URL)
+                status = conn.getresponse().status
+                conn.close()
+                if status == 200:
+                    return {'first_response': time.perf_counter() - start}
+            except OSError:
+                pass
+            time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def report(name, values):
+    print(f'{name:>16}: median {statistics.median(values) * 1000:8.1f} ms   max {max(values) * 1000:8.1f} ms')
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'startup.db')
+        setup = prepare(path)
+        print(f'one-shot setup: upgrade {setup["upgrade"] * 1000:.1f} ms, seed {setup["seed"] * 1000:.1f} ms, '
+              f'second run (skipped) {setup["noop"] * 1000:.1f} ms')
+
+        env = dict(os.environ, SCHOOL_POS_DB=path)
+        runs = [probe(env) for _ in range(args.runs)]
+        if any(run['status'] != 200 for run in runs):
+            sys.exit(f'unexpected status: {[run["status"] for run in runs]}')
+        print(f'\nin-process, {args.runs} fresh interpreters ({FIRST_URL}):')
+        for key in ('import', 'create_app', 'first_response', 'total', 'process'):
+            report(key, [run[key] for run in runs])
+
+        if args.gunicorn:
+            runs = [probe_gunicorn(env) for _ in range(args.runs)]
+            print(f'\ngunicorn spawn -> first HTTP 200, {args.runs} runs:')
+            report('first_response', [run['first_response'] for run in runs])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='worker cold-start benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--gunicorn', action='store_true', help='also time gunicorn from spawn to first response')
+    main(parser.parse_args())
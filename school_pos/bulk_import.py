@@ -0,0 +1,282 @@
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from werkzeug.security import generate_password_hash
+
+import balances
+
+# นำเข้านักเรียน/เติมเงินทีละมากจาก CSV: student_id, name, password, balance_delta
+#  - นักเรียนใหม่ต้องมี name และ password, balance_delta คือยอดเงินเริ่มต้น
+#  - นักเรียนเดิม ช่องที่เว้นว่างจะไม่ถูกแก้, balance_delta บวกเพิ่มจากยอดเดิม
+# hash รหัสผ่านใน process pool แล้วเขียนทีละ chunk ด้วย executemany
+#  - เปิด pool เฉพาะเมื่อมีแถวที่ต้อง hash ไฟล์เติมเงินอย่างเดียวไม่ต้องสร้าง process
+# ไฟล์ที่อัปโหลดจากหน้าแอดมินเป็นงานใน import_jobs ให้ worker.py รัน (แบบเดียวกับ exports) ไม่ทำใน request
+#  - ไฟล์มีรหัสผ่าน จึงลบทันทีที่งานจบ
+#  - งานที่ค้าง (worker ตาย) ไม่ถูกรันซ้ำ เพราะ chunk ที่ commit แล้วจะเติมเงินซ้ำ ตั้งเป็น failed ให้แอดมินตรวจ
+
+CHUNK_SIZE = 500
+FIELDS = ('student_id', 'name', 'password', 'balance_delta')
+STALE_AFTER = timedelta(minutes=5)
+RETENTION = timedelta(days=7)
+# เก็บรายการ error ไว้ในงานอย่างมากเท่านี้ (ไฟล์ที่ผิดทั้งไฟล์ไม่ทำให้แถวในตารางใหญ่เกิน)
+MAX_STORED_ERRORS = 1000
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def import_dir(db_path):
+    return os.environ.get('SCHOOL_POS_IMPORT_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(db_path)), 'imports')
+
+
+def _hash_password(password, method):
+    return generate_password_hash(password, method) if password else None
+
+
+def _parse(line_no, row):
+    values = [value.strip() for value in row] + [''] * (len(FIELDS) - len(row))
+    student_id, name, password, delta = values[:len(FIELDS)]
+    if not student_id:
+        raise ValueError('missing student_id')
+    try:
+        delta = float(delta) if delta else 0.0
+    except ValueError:
+        raise ValueError(f'invalid balance_delta {delta!r}')
+    return line_no, student_id, name or None, password or None, delta
+
+
+def _rows(lines):
+    reader = csv.reader(lines)
+    for row in reader:
+        if not row or not any(row):
+            continue
+        # ข้ามบรรทัดหัวตาราง
+        if reader.line_num == 1 and row[0].strip().lower() == 'student_id':
+            continue
+        yield reader.line_num, row
+
+
+def _apply_chunk(conn, rows, hashes, errors):
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        ids = list({row[1] for row in rows})
+        placeholders = ','.join('?' * len(ids))
+        current_balances = dict(cursor.execute(
+            f'SELECT student_id, balance FROM students WHERE student_id IN ({placeholders})', ids))
+
+        inserts = []
+        updates = []
+        for (line_no, student_id, name, password, delta), password_hash in zip(rows, hashes):
+            if student_id not in current_balances:
+                if not name or not password_hash:
+                    errors.append({'line': line_no, 'student_id': student_id,
+                                   'error': 'new student needs name and password'})
+                    continue
+                if delta < 0:
+                    errors.append({'line': line_no, 'student_id': student_id, 'error': 'negative balance'})
+                    continue
+                inserts.append((student_id, name, password_hash, delta))
+                current_balances[student_id] = delta
+            else:
+                if current_balances[student_id] + delta < 0:
+                    errors.append({'line': line_no, 'student_id': student_id, 'error': 'negative balance'})
+                    continue
+                updates.append((name, password_hash, delta, student_id))
+                current_balances[student_id] += delta
+
+        cursor.executemany('''
+            INSERT INTO students (student_id, name, password_hash, balance)
+            VALUES (?, ?, ?, ?)
+        ''', inserts)
+        cursor.executemany('''
+            UPDATE students
+            SET name = COALESCE(?, name),
+                password_hash = COALESCE(?, password_hash),
+                balance = balance + ?,
+                balance_version = balance_version + 1
+            WHERE student_id = ?
+        ''', updates)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    for update in updates:
+        balances.cache.invalidate(update[3])
+    return len(inserts), len(updates)
+
+
+def import_students(conn, lines, method, chunk_size=CHUNK_SIZE, workers=None, progress=None):
+    # lines: iterable ของบรรทัด CSV (อ่านแบบ stream ไม่โหลดทั้งไฟล์)
+    # method: วิธี hash รหัสผ่านตามนโยบายของนักเรียน
+    # progress(report) ถูกเรียกหลังเขียนแต่ละ chunk
+    start = time.perf_counter()
+    report = {'rows': 0, 'inserted': 0, 'updated': 0, 'errors': []}
+    rows = _rows(lines)
+
+    pool = None
+    try:
+        while True:
+            chunk = []
+            taken = 0
+            for line_no, row in islice(rows, chunk_size):
+                taken += 1
+                try:
+                    chunk.append(_parse(line_no, row))
+                except ValueError as e:
+                    report['errors'].append({'line': line_no, 'student_id': row[0].strip(), 'error': str(e)})
+            if not taken:
+                break
+            report['rows'] += taken
+            if not chunk:
+                continue
+
+            passwords = [row[3] for row in chunk]
+            if any(passwords):
+                if pool is None:
+                    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+                hashes = list(pool.map(_hash_password, passwords, [method] * len(passwords), chunksize=16))
+            else:
+                hashes = [None] * len(chunk)
+            inserted, updated = _apply_chunk(conn, chunk, hashes, report['errors'])
+            report['inserted'] += inserted
+            report['updated'] += updated
+            if progress is not None:
+                progress(report)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    report['errors'].sort(key=lambda error: error['line'])
+    elapsed = time.perf_counter() - start
+    report['seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['rows'] / elapsed, 1) if elapsed else 0.0
+    return report
+
+
+# ---------- ฝั่ง web ----------
+
+def submit(conn, directory, requested_by, stream, method):
+    # เก็บไฟล์ที่อัปโหลด (อ่านได้เฉพาะเจ้าของโปรเซส) แล้วเข้าคิวให้ worker
+    os.makedirs(directory, exist_ok=True)
+    filename = f'import_{uuid.uuid4().hex}.csv'
+    fd = os.open(os.path.join(directory, filename), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with open(fd, 'wb') as out:
+        shutil.copyfileobj(stream, out)
+    cursor = conn.execute('''
+        INSERT INTO import_jobs (requested_by, filename, method, status, created_at)
+        VALUES (?, ?, ?, 'queued', ?)
+    ''', (requested_by, filename, method, _now()))
+    conn.commit()
+    return cursor.lastrowid
+
+
+def get_job(conn, job_id):
+    cursor = conn.execute('SELECT * FROM import_jobs WHERE job_id = ?', (job_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([column[0] for column in cursor.description], row))
+
+
+def job_json(job):
+    return {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'rows': job['rows'],
+        'inserted': job['inserted'],
+        'updated': job['updated'],
+        'errors': json.loads(job['errors']) if job['errors'] else [],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at'],
+    }
+
+
+# ---------- ฝั่ง worker ----------
+
+def _remove(directory, filename):
+    path = os.path.join(directory, filename)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def claim_next(conn, directory, pid):
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        stale = (datetime.now(timezone.utc) - STALE_AFTER).strftime('%Y-%m-%d %H:%M:%S')
+        abandoned = cursor.execute('''
+            SELECT filename FROM import_jobs WHERE status = 'running' AND updated_at < ?
+        ''', (stale,)).fetchall()
+        cursor.execute('''
+            UPDATE import_jobs
+            SET status = 'failed', error = 'worker stopped during import, check balances before re-importing',
+                finished_at = ?
+            WHERE status = 'running' AND updated_at < ?
+        ''', (_now(), stale))
+        row = cursor.execute('''
+            SELECT job_id FROM import_jobs WHERE status = 'queued' ORDER BY job_id LIMIT 1
+        ''').fetchone()
+        if row is not None:
+            now = _now()
+            cursor.execute('''
+                UPDATE import_jobs SET status = 'running', worker_pid = ?, started_at = ?, updated_at = ?
+                WHERE job_id = ?
+            ''', (pid, now, now, row[0]))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    for (filename,) in abandoned:
+        _remove(directory, filename)
+    return None if row is None else get_job(conn, row[0])
+
+
+def _progress(conn, job_id, report):
+    conn.execute('''
+        UPDATE import_jobs SET rows = ?, inserted = ?, updated = ?, updated_at = ? WHERE job_id = ?
+    ''', (report['rows'], report['inserted'], report['updated'], _now(), job_id))
+    conn.commit()
+
+
+def run_job(conn, job, directory):
+    try:
+        with open(os.path.join(directory, job['filename']), encoding='utf-8-sig', newline='') as lines:
+            report = import_students(conn, lines, job['method'],
+                                     progress=lambda report: _progress(conn, job['job_id'], report))
+    except Exception as e:
+        conn.rollback()
+        conn.execute('''
+            UPDATE import_jobs SET status = 'failed', error = ?, finished_at = ?, updated_at = ?
+            WHERE job_id = ?
+        ''', (str(e)[:500], _now(), _now(), job['job_id']))
+        conn.commit()
+        raise
+    finally:
+        _remove(directory, job['filename'])
+    conn.execute('''
+        UPDATE import_jobs
+        SET status = 'done', rows = ?, inserted = ?, updated = ?, errors = ?, finished_at = ?, updated_at = ?
+        WHERE job_id = ?
+    ''', (report['rows'], report['inserted'], report['updated'],
+          json.dumps(report['errors'][:MAX_STORED_ERRORS], ensure_ascii=False), _now(), _now(), job['job_id']))
+    conn.commit()
+    return report
+
+
+def purge_old(conn):
+    cutoff = (datetime.now(timezone.utc) - RETENTION).strftime('%Y-%m-%d %H:%M:%S')
+    cursor = conn.execute("DELETE FROM import_jobs WHERE status IN ('done', 'failed') AND created_at < ?", (cutoff,))
+    conn.commit()
+    return cursor.rowcount
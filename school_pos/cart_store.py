@@ -0,0 +1,109 @@
+import secrets
+from datetime import datetime, timezone
+
+# ตะกร้าสินค้าเก็บฝั่งเซิร์ฟเวอร์ (ตาราง carts / cart_items)
+# session เก็บแค่ cart_id ชื่อ/ราคาอ่านจาก menu_items ตอนแสดงผลเสมอ
+
+# จำนวนสูงสุดต่อเมนูในตะกร้า (เท่ากับ kiosk.MAX_QUANTITY)
+MAX_QUANTITY = 99
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def cart_id_for(conn, student_id):
+    # นักเรียนหนึ่งคนมีตะกร้าเดียว สร้างใหม่ถ้ายังไม่มี
+    conn.execute('INSERT OR IGNORE INTO carts (cart_id, student_id, updated_at) VALUES (?, ?, ?)',
+                 (secrets.token_urlsafe(16), student_id, _now()))
+    conn.commit()
+    return conn.execute('SELECT cart_id FROM carts WHERE student_id = ?', (student_id,)).fetchone()[0]
+
+
+def load(conn, cart_id):
+    # คืน dict item_id -> รายการในตะกร้า
+    rows = conn.execute('''
+        SELECT ci.item_id, m.name, m.price, ci.quantity, m.shop_id
+        FROM cart_items ci
+        JOIN menu_items m ON ci.item_id = m.item_id
+        WHERE ci.cart_id = ?
+    ''', (cart_id,))
+    return {item_id: {'item_id': item_id, 'name': name, 'price': price,
+                      'quantity': quantity, 'shop_id': shop_id}
+            for item_id, name, price, quantity, shop_id in rows}
+
+
+def quantities(conn, cart_id):
+    return dict(conn.execute('SELECT item_id, quantity FROM cart_items WHERE cart_id = ?', (cart_id,)))
+
+
+def count(conn, cart_id):
+    return conn.execute('SELECT COUNT(*) FROM cart_items WHERE cart_id = ?', (cart_id,)).fetchone()[0]
+
+
+def add_item(conn, cart_id, item_id, quantity):
+    # เพิ่มจำนวนถ้ามีอยู่แล้ว (รวมแล้วไม่เกิน MAX_QUANTITY) ใส่ได้เฉพาะเมนูที่ยังขายอยู่ คืน False ถ้าไม่มีเมนูนี้
+    # quantity ต้องตรวจแล้วว่าอยู่ในช่วง 1..MAX_QUANTITY
+    cursor = conn.execute('''
+        INSERT INTO cart_items (cart_id, item_id, quantity)
+        SELECT ?, item_id, ? FROM menu_items WHERE item_id = ? AND available = 1
+        ON CONFLICT(cart_id, item_id) DO UPDATE SET quantity = MIN(quantity + excluded.quantity, ?)
+    ''', (cart_id, quantity, item_id, MAX_QUANTITY))
+    added = cursor.rowcount > 0
+    _touch(conn, cart_id)
+    conn.commit()
+    return added
+
+
+def add_order(conn, cart_id, student_id, order_id):
+    # สั่งซ้ำ: คัดลอกรายการของคำสั่งซื้อเก่าลงตะกร้าใน query เดียว
+    # ข้ามเมนูที่ไม่ขายแล้ว คืนจำนวนรายการที่ใส่ได้ (0 ถ้าไม่ใช่คำสั่งซื้อของนักเรียนคนนี้)
+    cursor = conn.execute('''
+        INSERT INTO cart_items (cart_id, item_id, quantity)
+        SELECT ?, oi.item_id, MIN(SUM(oi.quantity), ?)
+        FROM orders o
+        JOIN order_items oi ON oi.order_id = o.order_id
+        JOIN menu_items m ON m.item_id = oi.item_id
+        WHERE o.order_id = ? AND o.student_id = ? AND m.available = 1
+        GROUP BY oi.item_id
+        ON CONFLICT(cart_id, item_id) DO UPDATE SET quantity = MIN(quantity + excluded.quantity, ?)
+    ''', (cart_id, MAX_QUANTITY, order_id, student_id, MAX_QUANTITY))
+    added = cursor.rowcount
+    _touch(conn, cart_id)
+    conn.commit()
+    return added
+
+
+def set_quantity(conn, cart_id, item_id, quantity):
+    if quantity <= 0:
+        return remove_item(conn, cart_id, item_id)
+    cursor = conn.execute('UPDATE cart_items SET quantity = ? WHERE cart_id = ? AND item_id = ?',
+                          (quantity, cart_id, item_id))
+    _touch(conn, cart_id)
+    conn.commit()
+    return cursor.rowcount > 0
+
+
+def remove_item(conn, cart_id, item_id):
+    cursor = conn.execute('DELETE FROM cart_items WHERE cart_id = ? AND item_id = ?', (cart_id, item_id))
+    _touch(conn, cart_id)
+    conn.commit()
+    return cursor.rowcount > 0
+
+
+def clear(cursor, cart_id):
+    # ไม่ commit เอง ใช้ภายใน transaction ของ checkout
+    cursor.execute('DELETE FROM cart_items WHERE cart_id = ?', (cart_id,))
+
+
+def _touch(conn, cart_id):
+    conn.execute('UPDATE carts SET updated_at = ? WHERE cart_id = ?', (_now(), cart_id))
+
+
+def to_json(cart):
+    items = list(cart.values())
+    return {
+        'items': items,
+        'cart_count': len(items),
+        'total': sum(item['price'] * item['quantity'] for item in items),
+    }
@@ -0,0 +1,193 @@
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from flask import make_response, render_template, request, session
+
+# version ของรายชื่อร้านเก็บไว้ที่ shop_id = 0 ในตาราง catalog_versions
+SHOP_LIST = 0
+
+
+class CatalogCache:
+    # cache ในโปรเซส: key -> (version, data)
+    # ทุกครั้งที่อ่านจะเช็ก version ใน SQLite ก่อน ทำให้ทุก gunicorn worker
+    # ทิ้ง cache พร้อมกันเมื่อมีการแก้เมนู
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        data = loader()
+        with self._lock:
+            self._entries[key] = (version, data)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+cache = CatalogCache()
+
+
+def current_version(conn, shop_id):
+    row = conn.execute('SELECT version, updated_at FROM catalog_versions WHERE shop_id = ?',
+                       (shop_id,)).fetchone()
+    return row or (0, None)
+
+
+def bump_version(conn, shop_id):
+    # เรียกใน transaction เดียวกับการแก้เมนู แล้วให้ผู้เรียก commit เอง
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    conn.execute('''
+        INSERT INTO catalog_versions (shop_id, version, updated_at) VALUES (?, 1, ?)
+        ON CONFLICT(shop_id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+    ''', (shop_id, now))
+
+
+def get_shops(conn):
+    version, updated_at = current_version(conn, SHOP_LIST)
+
+    def load():
+        # กรองชื่อร้านซ้ำ
+        seen = set()
+        shops = []
+        # srcset ของรูปที่ย่อแล้ว (NULL ถ้ายังไม่ได้อัปโหลดหรือยังไม่ได้ย่อ ดู media.py)
+        for row in conn.execute('''
+            SELECT s.shop_id, s.shop_name, s.image_url, i.srcset_webp, i.srcset_jpeg
+            FROM shops s
+            LEFT JOIN images i ON i.image_id = s.image_id
+        '''):
+            if row[1] not in seen:
+                shops.append(tuple(row))
+                seen.add(row[1])
+        return shops
+
+    return cache.get(('shops',), version, load), version, updated_at
+
+
+def get_shop_menu(conn, shop_id):
+    # เมนูสำหรับนักเรียน: (shop_name, items) หรือ None ถ้าไม่มีร้านนี้
+    version, updated_at = current_version(conn, shop_id)
+
+    def load():
+        shop = conn.execute('SELECT shop_name FROM shops WHERE shop_id = ?', (shop_id,)).fetchone()
+        if shop is None:
+            return None
+        # ดึงเมนูพร้อมกรองชื่อซ้ำ
+        items = conn.execute('''
+            SELECT m.item_id, m.name, m.price, m.available, m.image_url, m.category, i.srcset_webp, i.srcset_jpeg
+            FROM menu_items m
+            LEFT JOIN images i ON i.image_id = m.image_id
+            WHERE m.shop_id = ? AND m.available = 1
+            GROUP BY m.name
+        ''', (shop_id,)).fetchall()
+        return shop[0], items
+
+    return cache.get(('menu', shop_id), version, load), version, updated_at
+
+
+def menu_versions(conn):
+    # version ของรายชื่อร้านและทุกร้าน ใช้ทำ ETag ของ /menu.json
+    rows = conn.execute('SELECT shop_id, version, updated_at FROM catalog_versions ORDER BY shop_id').fetchall()
+    versions = tuple((shop_id, version) for shop_id, version, _ in rows)
+    updated_at = max((row[2] for row in rows if row[2]), default=None)
+    return versions, updated_at
+
+
+def menu_item_json(item):
+    # แถวจาก get_shop_menu -> dict สำหรับ JSON
+    item_id, name, price, _, image_url, category, srcset_webp, srcset_jpeg = item
+    return {'item_id': item_id, 'name': name, 'price': price, 'image_url': image_url,
+            'image_srcset_webp': srcset_webp, 'image_srcset': srcset_jpeg, 'category': category}
+
+
+def get_full_menu(conn):
+    # ทุกร้านพร้อมเมนูที่ขายอยู่ (แต่ละส่วนผ่าน cache ของตัวเอง)
+    shops, _, _ = get_shops(conn)
+    full_menu = []
+    for shop_id, shop_name, image_url, srcset_webp, srcset_jpeg in shops:
+        menu, version, _ = get_shop_menu(conn, shop_id)
+        items = menu[1] if menu else []
+        full_menu.append({
+            'shop_id': shop_id,
+            'shop_name': shop_name,
+            'image_url': image_url,
+            'image_srcset_webp': srcset_webp,
+            'image_srcset': srcset_jpeg,
+            'version': version,
+            'items': [menu_item_json(item) for item in items],
+        })
+    return full_menu
+
+
+def get_shop_items(conn, shop_id):
+    # เมนูสำหรับหน้าร้าน (มีต้นทุนด้วย)
+    version, updated_at = current_version(conn, shop_id)
+
+    def load():
+        return conn.execute('''
+            SELECT item_id, name, price, cost, available, category
+            FROM menu_items
+            WHERE shop_id = ? AND available = 1
+            GROUP BY name
+        ''', (shop_id,)).fetchall()
+
+    return cache.get(('shop_items', shop_id), version, load)
+
+
+def _parse_timestamp(value):
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+
+
+def render_conditional(etag_parts, updated_at, template, **context):
+    # render หน้าเมนูพร้อม ETag/Last-Modified และตอบ 304 ถ้าผู้ใช้มีหน้าเดิมอยู่แล้ว
+    # etag_parts ต้องรวมทุกอย่างที่แสดงบนหน้า (version เมนู, ผู้ใช้, ยอดเงิน)
+    return conditional_response(etag_parts, updated_at, lambda: render_template(template, **context))
+
+
+def conditional_response(etag_parts, updated_at, build, html=True):
+    # build() สร้าง body/response เฉพาะเมื่อไม่ตอบ 304
+    # html=False สำหรับ JSON ที่ไม่แสดงข้อความ flash
+    etag = hashlib.sha1(repr(etag_parts).encode('utf-8')).hexdigest()[:20]
+    last_modified = _parse_timestamp(updated_at)
+
+    # มีข้อความ flash ค้างอยู่ต้อง render ใหม่เสมอ
+    if not html or '_flashes' not in session:
+        if request.if_none_match:
+            # If-None-Match เทียบแบบ weak (ETag ถูกแปลงเป็น weak เมื่อ response ถูกบีบอัด)
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            not_modified = (last_modified is not None and request.if_modified_since is not None
+                            and last_modified <= request.if_modified_since)
+        if not_modified:
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+
+    response = make_response(build())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,203 @@
+import json
+import random
+import sqlite3
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import balances
+import cart_store
+import inventory
+import order_queue
+import pickup_slots
+import rollups
+
+# จำนวนครั้งที่ลองใหม่เมื่อเจอ SQLITE_BUSY และเวลารอเริ่มต้น (วินาที)
+BUSY_RETRIES = 5
+BUSY_BACKOFF = 0.02
+
+# idempotency key ของ checkout เก็บไว้นานพอสำหรับการส่งซ้ำจากคิว offline
+CHECKOUT_KEY_TTL = timedelta(hours=24)
+
+OrderResult = namedtuple('OrderResult', ['order_ids', 'total', 'balance', 'balance_version'])
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class EmptyCart(CheckoutError):
+    pass
+
+
+class InvalidQuantity(CheckoutError):
+    def __init__(self, item_ids):
+        super().__init__(f'invalid quantity for items: {sorted(item_ids)}')
+        self.item_ids = item_ids
+
+
+class InsufficientBalance(CheckoutError):
+    pass
+
+
+class ItemUnavailable(CheckoutError):
+    def __init__(self, item_ids):
+        super().__init__(f'unavailable items: {sorted(item_ids)}')
+        self.item_ids = item_ids
+
+
+class OutOfStock(ItemUnavailable):
+    pass
+
+
+class SlotFull(CheckoutError):
+    def __init__(self, shop_id):
+        super().__init__(f'pickup slot full for shop {shop_id}')
+        self.shop_id = shop_id
+
+
+def _is_busy(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def place_order(conn, student_id, quantities, cart_id=None, idempotency_key=None, pickup_slot=None,
+                shop_id=None, retries=BUSY_RETRIES, backoff=BUSY_BACKOFF):
+    # quantities: {item_id: quantity}
+    # ถ้าระบุ cart_id จะล้างตะกร้าใน transaction เดียวกับการสั่งซื้อ
+    # ถ้าระบุ idempotency_key ที่เคยสั่งสำเร็จแล้ว จะคืนผลเดิมโดยไม่หักเงินซ้ำ
+    # (ตรวจก่อนเช็กตะกร้าว่าง เพราะคำสั่งแรกล้างตะกร้าไปแล้ว)
+    # pickup_slot (ตรวจด้วย pickup_slots.validate แล้ว) จองที่ในทุกร้านของคำสั่งซื้อ ร้านใดเต็มจะ SlotFull
+    # shop_id (kiosk ของร้าน) รับเฉพาะเมนูของร้านนั้น เมนูร้านอื่นถือว่า ItemUnavailable
+    if not quantities and idempotency_key is None:
+        raise EmptyCart()
+
+    attempt = 0
+    while True:
+        try:
+            return _place_order_once(conn, student_id, quantities, cart_id, idempotency_key, pickup_slot, shop_id)
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or attempt >= retries:
+                raise
+            # exponential backoff พร้อม jitter เพื่อไม่ให้ทุก worker ลองพร้อมกัน
+            time.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+            attempt += 1
+
+
+def _place_order_once(conn, student_id, quantities, cart_id, idempotency_key, pickup_slot, shop_id):
+    cursor = conn.cursor()
+    # จอง write lock ตั้งแต่ต้น ป้องกัน deadlock ตอนอัปเกรดจาก read เป็น write
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        if idempotency_key is not None:
+            previous = _replay(cursor, student_id, idempotency_key)
+            if previous is not None:
+                conn.commit()
+                return previous
+        if not quantities:
+            raise EmptyCart()
+        # จำนวนติดลบจะกลายเป็นการเติมเงิน ต้องเป็นจำนวนเต็มบวกเท่านั้น
+        invalid = [item_id for item_id, quantity in quantities.items()
+                   if type(quantity) is not int or quantity < 1]
+        if invalid:
+            raise InvalidQuantity(set(invalid))
+
+        # ราคาอ่านจาก menu_items เสมอ ไม่เชื่อราคาจากตะกร้า
+        item_ids = list(quantities)
+        placeholders = ','.join('?' * len(item_ids))
+        only_shop = '' if shop_id is None else ' AND shop_id = ?'
+        cursor.execute(f'''
+            SELECT item_id, shop_id, price, cost, stock
+            FROM menu_items
+            WHERE item_id IN ({placeholders}) AND available = 1{only_shop}
+        ''', item_ids + ([] if shop_id is None else [shop_id]))
+        rows = cursor.fetchall()
+
+        missing = set(item_ids) - {row[0] for row in rows}
+        if missing:
+            raise ItemUnavailable(missing)
+
+        # หักสต็อกเฉพาะเมนูที่นับสต็อก ถ้าไม่พอทั้ง transaction ถูก rollback
+        short = inventory.reserve(cursor, {item_id: quantities[item_id]
+                                           for item_id, _, _, _, stock in rows if stock is not None})
+        if short:
+            raise OutOfStock(set(short))
+
+        by_shop = {}
+        for item_id, item_shop, price, cost, _ in rows:
+            by_shop.setdefault(item_shop, []).append((item_id, quantities[item_id], price, cost or 0))
+        total = sum(quantities[item_id] * price for item_id, _, price, _, _ in rows)
+
+        if pickup_slot is not None:
+            for order_shop in by_shop:
+                if not pickup_slots.reserve(cursor, order_shop, pickup_slot):
+                    raise SlotFull(order_shop)
+
+        # หักเงินแบบมีเงื่อนไข: ถ้ายอดไม่พอจะไม่มีแถวถูกอัปเดต
+        cursor.execute('''
+            UPDATE students SET balance = balance - ?, balance_version = balance_version + 1
+            WHERE student_id = ? AND balance >= ?
+        ''', (total, student_id, total))
+        if cursor.rowcount != 1:
+            raise InsufficientBalance()
+
+        order_date = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        order_ids = []
+        for order_shop, lines in by_shop.items():
+            shop_total = sum(quantity * price for _, quantity, price, _ in lines)
+            cursor.execute('''
+                INSERT INTO orders (student_id, shop_id, order_date, total_amount, pickup_slot)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (student_id, order_shop, order_date, shop_total, pickup_slot))
+            order_id = cursor.lastrowid
+            order_ids.append(order_id)
+
+            cursor.executemany('''
+                INSERT INTO order_items (order_id, item_id, quantity, price)
+                VALUES (?, ?, ?, ?)
+            ''', [(order_id, item_id, quantity, price) for item_id, quantity, price, _ in lines])
+
+            rollups.record_order(cursor, order_shop, order_date[:10], lines)
+            order_queue.record_event(cursor, order_shop, order_id, 'pending')
+
+        rollups.record_spending(cursor, student_id, order_date[:10], len(order_ids), total)
+
+        if cart_id is not None:
+            cart_store.clear(cursor, cart_id)
+
+        cursor.execute('SELECT balance, balance_version FROM students WHERE student_id = ?', (student_id,))
+        balance, balance_version = cursor.fetchone()
+
+        if idempotency_key is not None:
+            _remember(cursor, student_id, idempotency_key, order_ids, total)
+
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    balances.cache.put(student_id, balance, balance_version)
+    return OrderResult(order_ids, total, balance, balance_version)
+
+
+def _replay(cursor, student_id, idempotency_key):
+    cursor.execute('''
+        SELECT order_ids, total FROM checkout_keys
+        WHERE student_id = ? AND idempotency_key = ?
+    ''', (student_id, idempotency_key))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    cursor.execute('SELECT balance, balance_version FROM students WHERE student_id = ?', (student_id,))
+    return OrderResult(json.loads(row[0]), row[1], *cursor.fetchone())
+
+
+def _remember(cursor, student_id, idempotency_key, order_ids, total):
+    now = datetime.now(timezone.utc)
+    # ลบ key ที่หมดอายุไปพร้อมกัน (ใช้ index ของ created_at)
+    cursor.execute('DELETE FROM checkout_keys WHERE created_at < ?',
+                   ((now - CHECKOUT_KEY_TTL).strftime('%Y-%m-%d %H:%M:%S'),))
+    cursor.execute('''
+        INSERT INTO checkout_keys (student_id, idempotency_key, order_ids, total, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (student_id, idempotency_key, json.dumps(order_ids), total, now.strftime('%Y-%m-%d %H:%M:%S')))
@@ -0,0 +1,163 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g
+
+# ค่า PRAGMA เริ่มต้นสำหรับทุก connection
+# WAL ให้ผู้อ่านหลายคนทำงานพร้อมกับผู้เขียนได้, synchronous=NORMAL ปลอดภัยเมื่อใช้ WAL
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,        # ประมาณ 16 MB ต่อ connection
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def connect(path, pragmas=None, timeout=5.0, factory=sqlite3.Connection):
+    # สร้าง connection ใหม่พร้อมตั้งค่า PRAGMA (ใช้ได้ทั้งในเว็บและสคริปต์)
+    conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False, factory=factory)
+    for name, value in (pragmas or DEFAULT_PRAGMAS).items():
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+class ConnectionPool:
+    def __init__(self, path, size=8, timeout=5.0, pragmas=None, factory=sqlite3.Connection):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = pragmas or DEFAULT_PRAGMAS
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._in_use = 0
+        self._borrows = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _check_fork(self):
+        # connection ของ SQLite ห้ามใช้ข้ามโปรเซส ถ้า gunicorn fork หลังสร้าง pool ให้เริ่มใหม่
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def acquire(self):
+        self._check_fork()
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    conn = connect(self.path, self.pragmas, self.timeout, self.factory)
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeout(f'no free connection after {self.timeout}s')
+
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1
+            self._borrows += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pid': self._pid,
+                'size': self.size,
+                'created': self._created,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                'borrows': self._borrows,
+                'timeouts': self._timeouts,
+                'wait_avg_ms': round(self._wait_total / self._borrows * 1000, 3) if self._borrows else 0.0,
+                'wait_max_ms': round(self._wait_max * 1000, 3),
+            }
+
+
+_pool_lock = threading.Lock()
+
+
+def init_app(app):
+    app.config.setdefault('DATABASE', os.environ.get('SCHOOL_POS_DB', 'school_pos.db'))
+    # ค่าเริ่มต้นเท่ากับจำนวน --threads ของ gunicorn ใน Procfile
+    app.config.setdefault('DB_POOL_SIZE', int(os.environ.get('DB_POOL_SIZE', 8)))
+    app.config.setdefault('DB_POOL_TIMEOUT', float(os.environ.get('DB_POOL_TIMEOUT', 5.0)))
+    app.config.setdefault('DB_PRAGMAS', dict(DEFAULT_PRAGMAS))
+    app.config.setdefault('DB_CONNECTION_FACTORY', sqlite3.Connection)
+    app.teardown_appcontext(_release_db)
+
+
+def get_pool(app=None):
+    app = app or current_app
+    pool = app.extensions.get('school_pos_db')
+    if pool is None:
+        with _pool_lock:
+            pool = app.extensions.get('school_pos_db')
+            if pool is None:
+                pool = ConnectionPool(app.config['DATABASE'],
+                                      size=app.config['DB_POOL_SIZE'],
+                                      timeout=app.config['DB_POOL_TIMEOUT'],
+                                      pragmas=app.config['DB_PRAGMAS'],
+                                      factory=app.config['DB_CONNECTION_FACTORY'])
+                app.extensions['school_pos_db'] = pool
+    return pool
+
+
+def get_db():
+    # ยืม connection หนึ่งตัวต่อ request แล้วคืนตอน teardown
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+def _release_db(exc=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().release(conn)
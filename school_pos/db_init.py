@@ -1,145 +1,140 @@
-from werkzeug.security import generate_password_hash
-import sqlite3
+import click
+from flask import current_app
+from flask.cli import AppGroup
 
-def init_db():
-    conn = sqlite3.connect('school_pos.db')
-    cursor = conn.cursor()
-    
-    # ตาราง students
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS students (
-            student_id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            password_hash TEXT NOT NULL,
-            balance REAL DEFAULT 0
-        )
-    ''')
-    
-    # ตาราง shops
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS shops (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    shop_name TEXT UNIQUE,
-    owner_name TEXT,
-    password_hash TEXT,
-    image_url TEXT
-    )
-    ''')
-    
-    # ตาราง admins (ครู/แอดมิน)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS admins (
-            admin_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            name TEXT NOT NULL
-        )
-    ''')
-    
-    # ตาราง menu_items
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS menu_items (
-        item_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        shop_id INTEGER,
-        name TEXT,
-         price REAL,
-        cost REAL,
-        available BOOLEAN,
-        image_url TEXT,
-        category TEXT,
-        UNIQUE(shop_id, name),
-        FOREIGN KEY (shop_id) REFERENCES shops(shop_id)
-        )
-    ''')
-    
-    # ตาราง orders
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS orders (
-            order_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            student_id TEXT,
-            shop_id INTEGER,
-            order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            total_amount REAL,
-            status TEXT DEFAULT 'pending',
-            FOREIGN KEY (student_id) REFERENCES students(student_id),
-            FOREIGN KEY (shop_id) REFERENCES shops(shop_id)
-        )
-    ''')
+import archive
+import db
+import migrations
+from passwords import hash_password
+
+# สร้าง schema และข้อมูลตัวอย่างเป็นขั้นตอนแยก (รันครั้งเดียวตอน deploy) ไม่ทำตอน worker เริ่ม
+#   flask db upgrade : รัน migration ที่ยังไม่ได้รัน ไม่ทำอะไรถ้า version ตรงแล้ว
+#                      แล้วเพิ่มคอลัมน์ใหม่ของ orders/order_items ในไฟล์ archive ของภาคเรียนที่ย้ายไปแล้ว
+#   flask db seed    : ใส่ข้อมูลตัวอย่าง ข้ามถ้ามีข้อมูลอยู่แล้ว (ไม่เสียเวลา hash รหัสผ่าน)
+
+db_cli = AppGroup('db', help='Create, upgrade and seed the database.')
+
+
+def init_db(path='school_pos.db'):
+    conn = db.connect(path)
     
-    # ตาราง order_items
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS order_items (
-            order_item_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            order_id INTEGER,
-            item_id INTEGER,
-            quantity INTEGER,
-            price REAL,
-            FOREIGN KEY (order_id) REFERENCES orders(order_id),
-            FOREIGN KEY (item_id) REFERENCES menu_items(item_id)
-        )
-    ''')
+    # สร้าง/อัปเกรด schema ตาม migrations.py
+    migrations.upgrade(conn)
     
     # ใส่ข้อมูลตัวอย่าง
+    seed(conn)
+    conn.close()
+
+
+def seed(conn, force=False):
+    # คืน True ถ้าใส่ข้อมูลตัวอย่าง, False ถ้ามีร้านค้าอยู่แล้ว
+    if not force and conn.execute('SELECT 1 FROM shops LIMIT 1').fetchone():
+        return False
+    cursor = conn.cursor()
     insert_sample_data(cursor)
-    
     conn.commit()
+    return True
+
+
+@db_cli.command('upgrade')
+def upgrade_command():
+    conn = db.connect(current_app.config['DATABASE'])
+    version = migrations.current_version(conn)
+    if version >= migrations.LATEST_VERSION:
+        print(f'schema is up to date (version {version})')
+    else:
+        applied = migrations.upgrade(conn)
+        print(f'upgraded schema {version} -> {migrations.current_version(conn)} '
+              f'(applied {", ".join(map(str, applied))})')
+    for term, result in archive.upgrade_archives(conn):
+        if isinstance(result, str):
+            print(f'warning: {result}')
+        elif result:
+            print(f'archive {term}: added {result} column(s)')
+    conn.close()
+
+
+@db_cli.command('seed')
+@click.option('--force', is_flag=True, help='insert sample rows even if shops already exist')
+def seed_command(force):
+    conn = db.connect(current_app.config['DATABASE'])
+    if migrations.current_version(conn) < migrations.LATEST_VERSION:
+        conn.close()
+        raise click.ClickException('schema is out of date, run flask db upgrade first')
+    if seed(conn, force):
+        print('inserted sample data')
+    else:
+        print('sample data already present, skipped (use --force to insert anyway)')
     conn.close()
 
+
 def insert_sample_data(cursor):
+    # ตัวอย่างนักเรียน
+    cursor.execute('''
+        INSERT OR IGNORE INTO students (student_id, name, password_hash, balance)
+        VALUES (?, ?, ?, ?)
+    ''', ('01514', 'สมชาย ใจดี', hash_password('student', 'password123'), 500.0))
+    
+    cursor.execute('''
+        INSERT OR IGNORE INTO students (student_id, name, password_hash, balance)
+        VALUES (?, ?, ?, ?)
+    ''', ('12346', 'สมหญิง สวยงาม', hash_password('student', 'password456'), 300.0))
+    
     # ตัวอย่างครู / แอดมิน
     admins = [
         ('teacher1', 'pass1234', 'ครูสมศรี')  # username, password, ชื่อ
     ]
-    
+
     for username, password, name in admins:
         cursor.execute('''
             INSERT OR IGNORE INTO admins (username, password_hash, name)
             VALUES (?, ?, ?)
-        ''', (username, generate_password_hash(password), name))
-    
-    # ตัวอย่างนักเรียน
-    students = [
-        ('01514', 'สมชาย ใจดี', '01112547', 500.0),
-        ('12346', 'สมหญิง สวยงาม', '02022010', 300.0)
+        ''', (username, hash_password('admin', password), name))
+        
+    # ตัวอย่างร้านค้า
+    shops_data = [
+        ('ร้านข้าวแม่สมปอง', 'แม่สมปอง', hash_password('shop', 'shop123'), '/static/images/rice_shop.jpg'),
+        ('ร้านก๋วยเตี๋ยวลุงสมชาย', 'ลุงสมชาย', hash_password('shop', 'shop456'), '/static/images/noodle_shop.jpg'),
+        ('ร้านน้ำผลไม้ป้าแก้ว', 'ป้าแก้ว', hash_password('shop', 'shop789'), '/static/images/drink_shop.jpg'),
+        ('ร้านขนมอรุณี', 'อรุณี', hash_password('shop', 'shop000'), '/static/images/snack_shop.jpg')
     ]
-    
-    for student_id, name, birthdate, balance in students:
+
+    for shop_name, owner_name, password_hash, image_url in shops_data:
         cursor.execute('''
-            INSERT OR IGNORE INTO students (student_id, name, password_hash, balance)
+            INSERT OR IGNORE INTO shops (shop_name, owner_name, password_hash, image_url)
             VALUES (?, ?, ?, ?)
-        ''', (student_id, name, generate_password_hash(birthdate), balance))
-    
-# ตัวอย่างร้านค้า
-shops_data = [
-    ('ร้านข้าวแม่สมปอง', 'แม่สมปอง', 'shop123', '/static/images/rice_shop.jpg'),
-    ('ร้านก๋วยเตี๋ยวลุงสมชาย', 'ลุงสมชาย', 'shop456', '/static/images/noodle_shop.jpg')
-]
-
-for shop_name, owner_name, password, image_url in shops_data:
-    cursor.execute('''
-        INSERT OR IGNORE INTO shops (shop_name, owner_name, password_hash, image_url)
-        VALUES (?, ?, ?, ?)
-    ''', (shop_name, owner_name, generate_password_hash(password), image_url))
+        ''', (shop_name, owner_name, password_hash, image_url))
     
     # ตัวอย่างเมนู
     menu_items = [
+        # ร้านข้าว (shop_id = 1)
         (1, 'ข้าวผัดหมู', 45.0, 25.0, True, '/static/images/fried_rice.jpg', 'ข้าว'),
         (1, 'ข้าวราดแกง', 40.0, 20.0, True, '/static/images/curry_rice.jpg', 'ข้าว'),
-        (2, 'ก๋วยเตี๋ยวหมูน้ำใส', 35.0, 18.0, True, '/static/images/clear_soup.jpg', 'ก๋วยเตี๋ยว')
+        (1, 'ข้าวมันไก่', 50.0, 30.0, True, '/static/images/chicken_rice.jpg', 'ข้าว'),
+        
+        # ร้านก๋วยเตี๋ยว (shop_id = 2)
+        (2, 'ก๋วยเตี๋ยวหมูน้ำใส', 35.0, 18.0, True, '/static/images/clear_soup.jpg', 'ก๋วยเตี๋ยว'),
+        (2, 'ก๋วยเตี๋ยวต้มยำ', 40.0, 20.0, True, '/static/images/tomyum_noodle.jpg', 'ก๋วยเตี๋ยว'),
+        (2, 'บะหมี่แห้ง', 38.0, 19.0, True, '/static/images/dry_noodle.jpg', 'ก๋วยเตี๋ยว'),
+        
+        # ร้านน้ำ (shop_id = 3)
+        (3, 'น้ำส้มคั้น', 25.0, 10.0, True, '/static/images/orange_juice.jpg', 'เครื่องดื่ม'),
+        (3, 'น้ำแตงโม', 20.0, 8.0, True, '/static/images/watermelon_juice.jpg', 'เครื่องดื่ม'),
+        (3, 'ชาเย็น', 15.0, 5.0, True, '/static/images/iced_tea.jpg', 'เครื่องดื่ม'),
+        
+        # ร้านขนม (shop_id = 4)
+        (4, 'ขนมปังปิ้ง', 25.0, 12.0, True, '/static/images/toast.jpg', 'ขนม'),
+        (4, 'โรตี', 30.0, 15.0, True, '/static/images/roti.jpg', 'ขนม'),
+        (4, 'ลูกชิ้นทอด', 20.0, 10.0, True, '/static/images/fried_meatball.jpg', 'ขนม')
     ]
-
-for shop_id, name, price, cost, available, image_url, category in menu_items:
-    cursor.execute('SELECT 1 FROM menu_items WHERE shop_id=? AND name=?', (shop_id, name))
-    exists = cursor.fetchone()
-    if not exists:
+    
+    for shop_id, name, price, cost, available, image_url, category in menu_items:
         cursor.execute('''
-            INSERT INTO menu_items (shop_id, name, price, cost, available, image_url, category)
+            INSERT OR IGNORE INTO menu_items (shop_id, name, price, cost, available, image_url, category)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         ''', (shop_id, name, price, cost, available, image_url, category))
 
 
-
-
 if __name__ == '__main__':
     init_db()
     print("Database initialized!")
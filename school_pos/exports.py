@@ -0,0 +1,292 @@
+import csv
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+import archive
+
+# งาน export รายงานที่รันใน worker process (worker.py) แทนการคำนวณใน request
+#  - web เพิ่มแถวใน export_jobs (status = queued) แล้ว poll ความคืบหน้า
+#  - worker ดึงแถวทีละ batch ด้วย fetchmany เขียนลงไฟล์ CSV ทีละ part ไม่โหลดผลทั้งหมดเข้าหน่วยความจำ
+#  - ดาวน์โหลดต่อ part ทุกไฟล์เป็น CSV เดียว (หัวตารางอยู่ใน part แรกเท่านั้น)
+#  - ช่วงวันที่ที่ทับภาคเรียนที่ย้ายไปแล้ว อ่านจากไฟล์ archive ก่อน (เก่ากว่า) แล้วต่อด้วยฐานข้อมูลหลัก
+
+BATCH_SIZE = 1000
+PART_ROWS = 100000
+STALE_AFTER = timedelta(minutes=5)
+RETENTION = timedelta(days=7)
+
+KINDS = {
+    # kind: (หัวตาราง, คอลัมน์, FROM, ORDER BY)
+    'sales': (
+        ('order_id', 'order_date', 'shop_id', 'item_id', 'item_name', 'quantity', 'price', 'line_total'),
+        'o.order_id, o.order_date, o.shop_id, oi.item_id, m.name, oi.quantity, oi.price, oi.quantity * oi.price',
+        '''{schema}.orders o
+        JOIN {schema}.order_items oi ON oi.order_id = o.order_id
+        LEFT JOIN menu_items m ON oi.item_id = m.item_id''',
+        'o.order_id, oi.order_item_id',
+    ),
+    'ledger': (
+        ('order_id', 'order_date', 'student_id', 'shop_id', 'total_amount', 'status'),
+        'o.order_id, o.order_date, o.student_id, o.shop_id, o.total_amount, o.status',
+        '{schema}.orders o',
+        'o.order_id',
+    ),
+}
+FORMATS = ('csv', 'xlsx')
+
+
+class ExportError(Exception):
+    pass
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def export_dir(db_path):
+    return os.environ.get('SCHOOL_POS_EXPORT_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(db_path)), 'exports')
+
+
+def available_formats():
+    return FORMATS if openpyxl is not None else ('csv',)
+
+
+def _where(job):
+    clauses = ['o.order_date >= ?', 'o.order_date < ?']
+    # date_to รวมทั้งวัน
+    params = [job['date_from'], (datetime.strptime(job['date_to'], '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')]
+    if job['shop_id'] is not None:
+        clauses.append('o.shop_id = ?')
+        params.append(job['shop_id'])
+    return ' AND '.join(clauses), params
+
+
+# ---------- ฝั่ง web ----------
+
+def submit(conn, requested_by, kind, fmt, date_from, date_to, shop_id=None):
+    if kind not in KINDS:
+        raise ExportError(f'unknown kind {kind!r}')
+    if fmt not in available_formats():
+        raise ExportError(f'format {fmt!r} is not available')
+    try:
+        start = datetime.strptime(date_from, '%Y-%m-%d')
+        end = datetime.strptime(date_to, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ExportError('dates must be YYYY-MM-DD')
+    if end < start:
+        raise ExportError('date_to is before date_from')
+
+    cursor = conn.execute('''
+        INSERT INTO export_jobs (kind, format, requested_by, shop_id, date_from, date_to, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, 'queued', ?)
+    ''', (kind, fmt, requested_by, shop_id, date_from, date_to, _now()))
+    conn.commit()
+    return cursor.lastrowid
+
+
+def get_job(conn, job_id):
+    cursor = conn.execute('SELECT * FROM export_jobs WHERE job_id = ?', (job_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([column[0] for column in cursor.description], row))
+
+
+def job_json(job):
+    progress = None
+    if job['total_rows']:
+        progress = round(min(job['rows_written'] / job['total_rows'], 1.0), 3)
+    elif job['status'] == 'done':
+        progress = 1.0
+    return {
+        'job_id': job['job_id'],
+        'kind': job['kind'],
+        'format': job['format'],
+        'date_from': job['date_from'],
+        'date_to': job['date_to'],
+        'status': job['status'],
+        'rows_written': job['rows_written'],
+        'total_rows': job['total_rows'],
+        'progress': progress,
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at'],
+    }
+
+
+def part_paths(directory, job):
+    return [os.path.join(directory, f'export_{job["job_id"]}_part{n}.{job["format"]}')
+            for n in range(1, (job['parts'] or 0) + 1)]
+
+
+def stream_parts(paths, chunk_size=64 * 1024):
+    for path in paths:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+def download_name(job):
+    return f'{job["kind"]}_{job["date_from"]}_{job["date_to"]}.{job["format"]}'
+
+
+# ---------- ฝั่ง worker ----------
+
+def claim_next(conn, pid):
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        # งานที่ worker ตัวอื่นถือไว้แต่ไม่ขยับนานเกินไป (worker ตาย) กลับเข้าคิว
+        stale = (datetime.now(timezone.utc) - STALE_AFTER).strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute('''
+            UPDATE export_jobs SET status = 'queued', worker_pid = NULL
+            WHERE status = 'running' AND updated_at < ?
+        ''', (stale,))
+        row = cursor.execute('''
+            SELECT job_id FROM export_jobs WHERE status = 'queued' ORDER BY job_id LIMIT 1
+        ''').fetchone()
+        if row is None:
+            conn.commit()
+            return None
+        now = _now()
+        cursor.execute('''
+            UPDATE export_jobs
+            SET status = 'running', worker_pid = ?, started_at = ?, updated_at = ?,
+                rows_written = 0, parts = 0, error = NULL
+            WHERE job_id = ?
+        ''', (pid, now, now, row[0]))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return get_job(conn, row[0])
+
+
+def _schemas(conn, job):
+    # เก่า -> ใหม่ ให้ผลเรียงตาม order_id ต่อเนื่องกันทุกแหล่ง
+    return list(archive.sources(conn, job['date_from'], job['date_to']))[::-1]
+
+
+def _rows(conn, job, schemas):
+    # generator: อ่านทีละ BATCH_SIZE แถว
+    _, columns, source, order_by = KINDS[job['kind']]
+    where, params = _where(job)
+    for schema in schemas:
+        cursor = conn.execute(f'SELECT {columns} FROM {source.format(schema=schema)} '
+                              f'WHERE {where} ORDER BY {order_by}', params)
+        while True:
+            batch = cursor.fetchmany(BATCH_SIZE)
+            if not batch:
+                break
+            yield from batch
+
+
+def _progress(conn, job_id, rows_written, parts):
+    conn.execute('UPDATE export_jobs SET rows_written = ?, parts = ?, updated_at = ? WHERE job_id = ?',
+                 (rows_written, parts, _now(), job_id))
+    conn.commit()
+
+
+def _write_csv(conn, job, directory, rows, header):
+    # แยกเป็น part ละ PART_ROWS แถว บันทึกความคืบหน้าทุก BATCH_SIZE แถว
+    written = 0
+    parts = 0
+    out = None
+    try:
+        for row in rows:
+            if written % PART_ROWS == 0:
+                if out is not None:
+                    out.close()
+                parts += 1
+                out = open(os.path.join(directory, f'export_{job["job_id"]}_part{parts}.csv'),
+                           'w', encoding='utf-8-sig' if parts == 1 else 'utf-8', newline='')
+                writer = csv.writer(out)
+                if parts == 1:
+                    writer.writerow(header)
+            writer.writerow(row)
+            written += 1
+            if written % BATCH_SIZE == 0:
+                _progress(conn, job['job_id'], written, parts)
+        if out is None:
+            # ไม่มีข้อมูลในช่วงนี้ ยังได้ไฟล์ที่มีแต่หัวตาราง
+            parts = 1
+            with open(os.path.join(directory, f'export_{job["job_id"]}_part1.csv'),
+                      'w', encoding='utf-8-sig', newline='') as empty:
+                csv.writer(empty).writerow(header)
+    finally:
+        if out is not None:
+            out.close()
+    return written, parts
+
+
+def _write_xlsx(conn, job, directory, rows, header):
+    # write_only workbook เขียนแถวออกไปเรื่อยๆ ไม่เก็บทั้งชีทไว้ในหน่วยความจำ
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(job['kind'])
+    sheet.append(header)
+    written = 0
+    for row in rows:
+        sheet.append(row)
+        written += 1
+        if written % BATCH_SIZE == 0:
+            _progress(conn, job['job_id'], written, 0)
+    workbook.save(os.path.join(directory, f'export_{job["job_id"]}_part1.xlsx'))
+    return written, 1
+
+
+def run_job(conn, job, directory):
+    os.makedirs(directory, exist_ok=True)
+    header, _, source, _ = KINDS[job['kind']]
+    where, params = _where(job)
+    schemas = _schemas(conn, job)
+    total = sum(conn.execute(f'SELECT COUNT(*) FROM {source.format(schema=schema)} WHERE {where}',
+                             params).fetchone()[0] for schema in schemas)
+    conn.execute('UPDATE export_jobs SET total_rows = ? WHERE job_id = ?', (total, job['job_id']))
+    conn.commit()
+
+    start = time.perf_counter()
+    try:
+        writer = _write_xlsx if job['format'] == 'xlsx' else _write_csv
+        written, parts = writer(conn, job, directory, _rows(conn, job, schemas), header)
+    except Exception as e:
+        conn.rollback()
+        conn.execute('''
+            UPDATE export_jobs SET status = 'failed', error = ?, finished_at = ?, updated_at = ?
+            WHERE job_id = ?
+        ''', (str(e)[:500], _now(), _now(), job['job_id']))
+        conn.commit()
+        raise
+    conn.execute('''
+        UPDATE export_jobs
+        SET status = 'done', rows_written = ?, parts = ?, finished_at = ?, updated_at = ?
+        WHERE job_id = ?
+    ''', (written, parts, _now(), _now(), job['job_id']))
+    conn.commit()
+    return written, time.perf_counter() - start
+
+
+def purge_old(conn, directory):
+    # ลบงานและไฟล์ที่เก่ากว่า RETENTION
+    cutoff = (datetime.now(timezone.utc) - RETENTION).strftime('%Y-%m-%d %H:%M:%S')
+    removed = 0
+    for job_id, fmt, parts in conn.execute('''
+        SELECT job_id, format, parts FROM export_jobs
+        WHERE status IN ('done', 'failed') AND created_at < ?
+    ''', (cutoff,)).fetchall():
+        for path in part_paths(directory, {'job_id': job_id, 'format': fmt, 'parts': parts}):
+            if os.path.exists(path):
+                os.remove(path)
+        conn.execute('DELETE FROM export_jobs WHERE job_id = ?', (job_id,))
+        removed += 1
+    conn.commit()
+    return removed
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+from db import get_db
+
+# Idempotency-Key สำหรับ route ที่เขียนข้อมูล (add_to_cart, checkout)
+#  - คำขอแรกจอง key (status = in_progress) แล้วเก็บ response ไว้เมื่อเสร็จ
+#  - คำขอซ้ำที่มาหลังจากนั้นได้ response เดิมโดยไม่รัน route ซ้ำ
+#  - คำขอซ้ำที่มาพร้อมกันจะรอผลของคำขอแรก (ใน worker เดียวกันรอผ่าน Event, ข้าม worker poll ตาราง)
+# key ผูกกับผู้ใช้ที่ล็อกอินอยู่ และหมดอายุตาม IDEMPOTENCY_TTL
+
+STORED_HEADERS = ('Content-Type', 'Location')
+MAX_KEY_LENGTH = 128
+EVICT_INTERVAL = 60.0
+POLL_INTERVAL = 0.05
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _scope():
+    user_type = session.get('user_type')
+    user_id = {
+        'student': session.get('student_id'),
+        'shop': session.get('shop_id'),
+        'admin': session.get('admin_id'),
+    }.get(user_type)
+    if user_id is None:
+        return None
+    return f'{user_type}:{user_id}'
+
+
+def _fingerprint():
+    digest = hashlib.sha1(f'{request.method} {request.path}\n'.encode('utf-8'))
+    digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = {}
+        self._last_evict = 0.0
+        self.replays = 0
+        self.waits = 0
+        self.conflicts = 0
+
+    def _evict(self, conn):
+        # ลบ key ที่หมดอายุ อย่างมากนาทีละครั้งต่อ worker
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_evict < EVICT_INTERVAL:
+                return
+            self._last_evict = now
+        conn.execute('DELETE FROM idempotency_keys WHERE expires_at < ?', (_timestamp(_now()),))
+        conn.commit()
+
+    def _claim(self, conn, scope, key, fingerprint, ttl, lock_timeout):
+        # คืน True ถ้าคำขอนี้ได้สิทธิ์รัน route
+        now = _now()
+        cursor = conn.execute('''
+            INSERT OR IGNORE INTO idempotency_keys
+                (scope, idempotency_key, fingerprint, status, created_at, expires_at)
+            VALUES (?, ?, ?, 'in_progress', ?, ?)
+        ''', (scope, key, fingerprint, _timestamp(now), _timestamp(now + ttl)))
+        if cursor.rowcount == 0:
+            # คำขอแรกค้าง (worker ตายระหว่างทำ) นานเกิน lock_timeout ให้คำขอนี้ทำแทน
+            cursor = conn.execute('''
+                UPDATE idempotency_keys SET created_at = ?
+                WHERE scope = ? AND idempotency_key = ? AND fingerprint = ?
+                  AND status = 'in_progress' AND created_at < ?
+            ''', (_timestamp(now), scope, key, fingerprint, _timestamp(now - lock_timeout)))
+        conn.commit()
+        return cursor.rowcount == 1
+
+    def _load(self, conn, scope, key):
+        return conn.execute('''
+            SELECT fingerprint, status, response_status, response_headers, response_body
+            FROM idempotency_keys
+            WHERE scope = ? AND idempotency_key = ?
+        ''', (scope, key)).fetchone()
+
+    def _store(self, conn, scope, key, response):
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        conn.execute('''
+            UPDATE idempotency_keys
+            SET status = 'done', response_status = ?, response_headers = ?, response_body = ?
+            WHERE scope = ? AND idempotency_key = ?
+        ''', (response.status_code, json.dumps(headers), response.get_data(), scope, key))
+        conn.commit()
+
+    def _release(self, conn, scope, key):
+        # route error: ปล่อย key ให้คำขอถัดไปลองใหม่ได้
+        conn.rollback()
+        conn.execute("DELETE FROM idempotency_keys WHERE scope = ? AND idempotency_key = ? AND status = 'in_progress'",
+                     (scope, key))
+        conn.commit()
+
+    def _replay(self, row):
+        _, _, status, headers, body = row
+        response = make_response(body, status)
+        for name, value in json.loads(headers).items():
+            response.headers[name] = value
+        response.headers['Idempotent-Replayed'] = 'true'
+        with self._lock:
+            self.replays += 1
+        return response
+
+    def _busy(self):
+        with self._lock:
+            self.conflicts += 1
+        response = make_response({'success': False, 'message': 'คำขอเดิมยังทำงานอยู่ กรุณาลองใหม่'}, 409)
+        response.headers['Retry-After'] = '1'
+        return response
+
+    def handle(self, view, args, kwargs):
+        # อ่าน body (และ cache ไว้) ก่อน request.form จะ parse
+        fingerprint = _fingerprint()
+        key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+        scope = _scope()
+        if not key or scope is None:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return make_response({'success': False, 'message': 'Idempotency-Key ยาวเกินไป'}, 400)
+
+        config = current_app.config
+        conn = get_db()
+        self._evict(conn)
+        event_key = (scope, key)
+
+        if self._claim(conn, scope, key, fingerprint, config['IDEMPOTENCY_TTL'], config['IDEMPOTENCY_LOCK_TIMEOUT']):
+            event = threading.Event()
+            with self._lock:
+                self._events[event_key] = event
+            try:
+                response = make_response(view(*args, **kwargs))
+                if response.is_streamed:
+                    self._release(conn, scope, key)
+                else:
+                    self._store(conn, scope, key, response)
+                return response
+            except BaseException:
+                self._release(conn, scope, key)
+                raise
+            finally:
+                with self._lock:
+                    self._events.pop(event_key, None)
+                event.set()
+
+        # key นี้มีคำขออื่นจองไว้แล้ว: รอผลแทนการรัน route ซ้ำ
+        with self._lock:
+            self.waits += 1
+        deadline = time.monotonic() + config['IDEMPOTENCY_WAIT']
+        while True:
+            row = self._load(conn, scope, key)
+            if row is None:
+                # คำขอแรกล้มเหลวและปล่อย key แล้ว
+                return self.handle(view, args, kwargs)
+            if row[0] != fingerprint:
+                return make_response({'success': False,
+                                      'message': 'Idempotency-Key นี้ถูกใช้กับคำขออื่นแล้ว'}, 422)
+            if row[1] == 'done':
+                return self._replay(row)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return self._busy()
+            with self._lock:
+                event = self._events.get(event_key)
+            if event is not None:
+                event.wait(min(remaining, 1.0))
+            else:
+                time.sleep(min(remaining, POLL_INTERVAL))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._events),
+                'replays': self.replays,
+                'waits': self.waits,
+                'conflicts': self.conflicts,
+            }
+
+
+def init_app(app):
+    app.config.setdefault('IDEMPOTENCY_TTL', timedelta(hours=24))
+    app.config.setdefault('IDEMPOTENCY_WAIT', 10.0)
+    app.config.setdefault('IDEMPOTENCY_LOCK_TIMEOUT', timedelta(seconds=30))
+    app.extensions['idempotency'] = IdempotencyStore()
+
+
+def idempotent(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return current_app.extensions['idempotency'].handle(view, args, kwargs)
+    return wrapper
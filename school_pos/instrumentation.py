@@ -0,0 +1,272 @@
+import hmac
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+
+from flask import Response, current_app, g, has_app_context, jsonify, request, session
+
+# วัดเวลาต่อ request และเวลาของ SQL ทุก statement ที่ route รัน
+#  - header Server-Timing (ดูได้ใน DevTools ของ browser)
+#  - log ของ request ที่ช้ากว่า SLOW_REQUEST_MS เป็น JSON หนึ่งบรรทัด
+#  - /metrics รูปแบบ Prometheus รวมทุก gunicorn worker ผ่านไฟล์ใน METRICS_DIR
+#    เปิดให้ admin ที่ login อยู่ หรือ scraper ที่ส่ง Authorization: Bearer <METRICS_TOKEN>
+# เวลา SQL นับเฉพาะ execute (รวม step แรก) ไม่รวมการ fetch แถวที่เหลือ
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_INTERVAL = 1.0
+
+slow_log = logging.getLogger('school_pos.slow_requests')
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def redact(sql):
+    # ค่าจริงส่งเป็น parameter (?) อยู่แล้ว แต่ตัดตัวเลข/ข้อความที่ฝังใน SQL ออกด้วยเผื่อไว้
+    return _literals.sub('?', ' '.join(sql.split()))
+
+
+def _record(sql, seconds):
+    if not has_app_context():
+        return
+    timing = g.get('_timing')
+    if timing is None:
+        return
+    timing['sql_count'] += 1
+    timing['sql_time'] += seconds
+    if seconds > timing['slowest_time']:
+        timing['slowest_time'] = seconds
+        timing['slowest_sql'] = sql
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record(sql, time.perf_counter() - start)
+
+
+class _InstrumentedMixin:
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+_wrapped = {}
+
+
+def instrumented(factory):
+    # ครอบ connection factory เดิม (subclass ของ sqlite3.Connection) ให้จับเวลา SQL ด้วย
+    if issubclass(factory, _InstrumentedMixin):
+        return factory
+    if factory not in _wrapped:
+        _wrapped[factory] = type('Instrumented' + factory.__name__, (_InstrumentedMixin, factory), {})
+    return _wrapped[factory]
+
+
+InstrumentedConnection = instrumented(sqlite3.Connection)
+
+
+class Metrics:
+    # ตัวนับของ worker นี้ เขียนลงไฟล์ <pid>.json ให้ worker อื่นอ่านไปรวมได้
+    # ไฟล์ของ worker ที่ตายไปแล้วยังถูกนับต่อ ตัวนับจึงไม่ลดลงเมื่อ gunicorn สลับ worker
+    # (ล้างไดเรกทอรีนี้ตอน deploy ใหม่)
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._pid = None
+        self._last_flush = 0.0
+
+    def _ensure_pid(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self.requests = {}
+            self.durations = {}
+            self.sql = {}
+            self._last_flush = 0.0
+
+    def observe(self, endpoint, method, status, seconds, sql_count, sql_time):
+        with self._lock:
+            self._ensure_pid()
+            key = f'{endpoint}|{method}|{status}'
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            histogram = self.durations.setdefault(endpoint, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+            totals = self.sql.setdefault(endpoint, [0, 0.0])
+            totals[0] += sql_count
+            totals[1] += sql_time
+
+            if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+                self._flush()
+
+    def _flush(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{self._pid}.json')
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'requests': self.requests, 'durations': self.durations, 'sql': self.sql}, f)
+        os.replace(tmp, path)
+        self._last_flush = time.monotonic()
+
+    def collect(self):
+        with self._lock:
+            self._ensure_pid()
+            self._flush()
+
+        requests = {}
+        durations = {}
+        sql = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for key, count in data['requests'].items():
+                requests[key] = requests.get(key, 0) + count
+            for endpoint, histogram in data['durations'].items():
+                total = durations.setdefault(endpoint, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+                total['sum'] += histogram['sum']
+                total['count'] += histogram['count']
+            for endpoint, (count, seconds) in data['sql'].items():
+                total = sql.setdefault(endpoint, [0, 0.0])
+                total[0] += count
+                total[1] += seconds
+        return requests, durations, sql
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def render_metrics(requests, durations, sql):
+    lines = [
+        '# HELP school_pos_requests_total HTTP requests by endpoint, method and status.',
+        '# TYPE school_pos_requests_total counter',
+    ]
+    for key, count in sorted(requests.items()):
+        endpoint, method, status = key.split('|')
+        lines.append(f'school_pos_requests_total{{endpoint="{_label(endpoint)}",method="{method}",'
+                     f'status="{status}"}} {count}')
+
+    lines += [
+        '# HELP school_pos_request_duration_seconds Request wall time by endpoint.',
+        '# TYPE school_pos_request_duration_seconds histogram',
+    ]
+    for endpoint, histogram in sorted(durations.items()):
+        label = _label(endpoint)
+        for bound, count in zip(BUCKETS, histogram['buckets']):
+            lines.append(f'school_pos_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {count}')
+        lines.append(f'school_pos_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} '
+                     f'{histogram["count"]}')
+        lines.append(f'school_pos_request_duration_seconds_sum{{endpoint="{label}"}} {histogram["sum"]:.6f}')
+        lines.append(f'school_pos_request_duration_seconds_count{{endpoint="{label}"}} {histogram["count"]}')
+
+    lines += [
+        '# HELP school_pos_sql_statements_total SQL statements executed by endpoint.',
+        '# TYPE school_pos_sql_statements_total counter',
+    ]
+    for endpoint, (count, _) in sorted(sql.items()):
+        lines.append(f'school_pos_sql_statements_total{{endpoint="{_label(endpoint)}"}} {count}')
+    lines += [
+        '# HELP school_pos_sql_seconds_total Time spent executing SQL by endpoint.',
+        '# TYPE school_pos_sql_seconds_total counter',
+    ]
+    for endpoint, (_, seconds) in sorted(sql.items()):
+        lines.append(f'school_pos_sql_seconds_total{{endpoint="{_label(endpoint)}"}} {seconds:.6f}')
+    return '\n'.join(lines) + '\n'
+
+
+def _start_timing():
+    g._timing = {
+        'start': time.perf_counter(),
+        'sql_count': 0,
+        'sql_time': 0.0,
+        'slowest_time': 0.0,
+        'slowest_sql': None,
+    }
+
+
+def _finish_timing(response):
+    timing = g.pop('_timing', None)
+    if timing is None:
+        return response
+    elapsed = time.perf_counter() - timing['start']
+    endpoint = request.endpoint or 'unmatched'
+
+    response.headers.add('Server-Timing',
+                         f'app;dur={elapsed * 1000:.1f}, '
+                         f'db;dur={timing["sql_time"] * 1000:.1f};desc="{timing["sql_count"]} queries"')
+
+    current_app.extensions['metrics'].observe(endpoint, request.method, response.status_code, elapsed,
+                                              timing['sql_count'], timing['sql_time'])
+
+    if elapsed * 1000 >= current_app.config['SLOW_REQUEST_MS']:
+        slow_log.warning(json.dumps({
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'ms': round(elapsed * 1000, 1),
+            'sql_count': timing['sql_count'],
+            'sql_ms': round(timing['sql_time'] * 1000, 1),
+            'slowest_sql': redact(timing['slowest_sql']) if timing['slowest_sql'] else None,
+            'slowest_sql_ms': round(timing['slowest_time'] * 1000, 1),
+        }, ensure_ascii=False))
+    return response
+
+
+def _metrics_allowed():
+    if session.get('user_type') == 'admin':
+        return True
+    token = current_app.config['METRICS_TOKEN']
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+
+def metrics_view():
+    if not _metrics_allowed():
+        return jsonify({'error': 'forbidden'}), 403
+    requests, durations, sql = current_app.extensions['metrics'].collect()
+    return Response(render_metrics(requests, durations, sql), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    app.config.setdefault('SLOW_REQUEST_MS', float(os.environ.get('SLOW_REQUEST_MS', 500)))
+    app.config.setdefault('METRICS_DIR', os.environ.get(
+        'SCHOOL_POS_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'school_pos_metrics')))
+    app.config.setdefault('METRICS_TOKEN', os.environ.get('SCHOOL_POS_METRICS_TOKEN'))
+    # db.init_app ตั้งค่าเริ่มต้นไว้แล้ว ครอบ factory ที่ตั้งไว้แทนการเขียนทับ
+    app.config['DB_CONNECTION_FACTORY'] = instrumented(
+        app.config.get('DB_CONNECTION_FACTORY', sqlite3.Connection))
+    app.extensions['metrics'] = Metrics(app.config['METRICS_DIR'])
+    app.before_request(_start_timing)
+    app.after_request(_finish_timing)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
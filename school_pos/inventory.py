@@ -0,0 +1,91 @@
+import catalog
+
+# สต็อกรายเมนู (ไม่บังคับ)
+#  - stock = NULL คือไม่นับสต็อก ขายได้ตราบที่ available = 1 (แบบเดิม)
+#  - checkout หักสต็อกใน transaction เดียวกับการหักเงิน ขายเกินสต็อกไม่ได้
+#  - สต็อกเหลือ 0 จะถูกตั้ง available = 0, sold_out = 1 และ bump version เฉพาะร้านนั้น
+#    เติมสต็อกแล้วเปิดขายคืนเฉพาะเมนูที่ sold_out = 1 เมนูที่ร้านปิดเอง (available = 0, sold_out = 0) ยังปิดอยู่
+#    การหักสต็อกปกติไม่ bump version หน้าเมนูของนักเรียนจึงยังได้ cache/304 เหมือนเดิม
+#  - prep_quantity คือจำนวนที่เตรียมต่อวัน reset_daily ตั้ง stock กลับเป็นค่านี้
+
+
+def reserve(cursor, stocked):
+    # stocked: {item_id: quantity} เฉพาะเมนูที่นับสต็อก
+    # คืน item_id ที่สต็อกไม่พอ (ผู้เรียกต้อง rollback) ถ้าว่างคือหักครบแล้ว
+    short = []
+    for item_id, quantity in stocked.items():
+        cursor.execute('''
+            UPDATE menu_items
+            SET stock = stock - ?,
+                available = CASE WHEN stock - ? > 0 THEN available ELSE 0 END,
+                sold_out = CASE WHEN stock - ? > 0 THEN sold_out ELSE 1 END
+            WHERE item_id = ? AND stock >= ?
+        ''', (quantity, quantity, quantity, item_id, quantity))
+        if cursor.rowcount != 1:
+            short.append(item_id)
+    if short or not stocked:
+        return short
+
+    placeholders = ','.join('?' * len(stocked))
+    cursor.execute(f'''
+        SELECT DISTINCT shop_id FROM menu_items
+        WHERE item_id IN ({placeholders}) AND stock = 0
+    ''', list(stocked))
+    for (shop_id,) in cursor.fetchall():
+        catalog.bump_version(cursor.connection, shop_id)
+    return short
+
+
+def set_stock(conn, shop_id, item_id, stock, prep_quantity):
+    # stock = None เลิกนับสต็อก, ตั้งสต็อกเป็น 0 จะปิดการขาย (sold_out)
+    # ตั้งสต็อกใหม่เปิดขายคืนเฉพาะเมนูที่ sold_out เมนูที่ร้านปิดขายเองต้องเปิดเองที่หน้าจัดการเมนู
+    cursor = conn.execute('''
+        UPDATE menu_items
+        SET stock = ?, prep_quantity = ?,
+            available = CASE WHEN ? = 0 THEN 0 ELSE available OR sold_out END,
+            sold_out = CASE WHEN ? = 0 THEN available OR sold_out ELSE 0 END
+        WHERE item_id = ? AND shop_id = ?
+    ''', (stock, prep_quantity, stock, stock, item_id, shop_id))
+    if cursor.rowcount:
+        catalog.bump_version(conn, shop_id)
+    conn.commit()
+    return cursor.rowcount > 0
+
+
+def reset_daily(conn, shop_id=None):
+    # เริ่มวันใหม่: stock = prep_quantity ของทุกเมนูที่ตั้งจำนวนเตรียมไว้ (ทุกร้าน หรือร้านเดียว)
+    where = 'prep_quantity IS NOT NULL'
+    params = []
+    if shop_id is not None:
+        where += ' AND shop_id = ?'
+        params.append(shop_id)
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        shops = [row[0] for row in cursor.execute(
+            f'SELECT DISTINCT shop_id FROM menu_items WHERE {where}', params).fetchall()]
+        cursor.execute(f'''
+            UPDATE menu_items
+            SET stock = prep_quantity,
+                available = CASE WHEN prep_quantity > 0 THEN available OR sold_out ELSE 0 END,
+                sold_out = CASE WHEN prep_quantity > 0 THEN 0 ELSE available OR sold_out END
+            WHERE {where}
+        ''', params)
+        items = cursor.rowcount
+        for shop in shops:
+            catalog.bump_version(conn, shop)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return items
+
+
+def stock_levels(conn, shop_id):
+    # ทุกเมนูของร้าน (รวมที่ปิดขาย) สำหรับหน้าจัดการสต็อก ไม่ผ่าน cache เพราะสต็อกเปลี่ยนทุก checkout
+    return conn.execute('''
+        SELECT item_id, name, available, stock, prep_quantity
+        FROM menu_items
+        WHERE shop_id = ?
+        ORDER BY name
+    ''', (shop_id,)).fetchall()
@@ -0,0 +1,68 @@
+import hashlib
+import secrets
+from datetime import datetime, timezone
+
+# kiosk หน้าร้าน: สแกนบัตร/QR ของนักเรียนแล้วตัดเงินในคำขอเดียว (POST /api/v1/kiosk/checkout)
+#  - token บนบัตรสุ่มยาวพอ (TOKEN_BYTES) เก็บแค่ SHA-256 ไม่ต้องใช้ hash รหัสผ่านที่ช้า
+#    การตรวจบัตรจึงเป็นแค่การอ่าน primary key หนึ่งครั้ง
+#  - นักเรียนหนึ่งคนมีบัตรที่ใช้ได้ใบเดียว ออกบัตรใหม่แล้วบัตรเก่าใช้ไม่ได้ทันที
+#  - การตัดเงินและสร้างคำสั่งซื้อใช้ checkout.place_order (transaction เดียว) จำกัดเมนูเฉพาะร้านของ kiosk
+
+TOKEN_BYTES = 16
+MAX_LINES = 50
+MAX_QUANTITY = 99
+
+
+class KioskError(Exception):
+    pass
+
+
+def _hash(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def issue_card(conn, student_id):
+    # คืน token (แสดงครั้งเดียว ใช้พิมพ์บัตร/QR) หรือ None ถ้าไม่มีนักเรียนคนนี้
+    if conn.execute('SELECT 1 FROM students WHERE student_id = ?', (student_id,)).fetchone() is None:
+        return None
+    token = secrets.token_urlsafe(TOKEN_BYTES)
+    conn.execute('DELETE FROM student_cards WHERE student_id = ?', (student_id,))
+    conn.execute('INSERT INTO student_cards (token_hash, student_id, issued_at) VALUES (?, ?, ?)',
+                 (_hash(token), student_id, datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')))
+    conn.commit()
+    return token
+
+
+def revoke_card(conn, student_id):
+    cursor = conn.execute('DELETE FROM student_cards WHERE student_id = ?', (student_id,))
+    conn.commit()
+    return cursor.rowcount > 0
+
+
+def lookup(conn, token):
+    # คืน (student_id, name) หรือ None
+    if not isinstance(token, str) or not token or len(token) > 128:
+        return None
+    return conn.execute('''
+        SELECT s.student_id, s.name FROM student_cards c
+        JOIN students s ON s.student_id = c.student_id
+        WHERE c.token_hash = ?
+    ''', (_hash(token),)).fetchone()
+
+
+def parse_items(items):
+    # [{'item_id': 1, 'quantity': 2}, ...] หรือ [[1, 2], ...] -> {item_id: quantity}
+    if not isinstance(items, list) or not items or len(items) > MAX_LINES:
+        raise KioskError(f'items must be a list of 1-{MAX_LINES} lines')
+    quantities = {}
+    for line in items:
+        if isinstance(line, dict):
+            item_id, quantity = line.get('item_id'), line.get('quantity', 1)
+        elif isinstance(line, list) and len(line) == 2:
+            item_id, quantity = line
+        else:
+            raise KioskError('each item must be {"item_id", "quantity"} or [item_id, quantity]')
+        if type(item_id) is not int or type(quantity) is not int or not 1 <= quantity <= MAX_QUANTITY:
+            raise KioskError(f'item_id must be an integer and quantity 1-{MAX_QUANTITY}')
+        quantities[item_id] = quantities.get(item_id, 0) + quantity
+    return quantities
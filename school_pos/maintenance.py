@@ -0,0 +1,150 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+import archive
+import db
+import pickup_slots
+
+# งานดูแลฐานข้อมูลหลักให้เล็กและสถิติ query planner เป็นปัจจุบัน เรียกจาก worker.py ทุกรอบที่ว่าง
+#  - maintenance_runs เก็บเวลาที่รันล่าสุด การ claim เป็น UPDATE แบบมีเงื่อนไข
+#    worker หลายตัว (หรือรีสตาร์ท) จึงไม่รันงานเดียวกันซ้ำในรอบเดียวกัน
+#  - งานที่ล็อกฐานข้อมูลนาน (archive, VACUUM) รันเฉพาะช่วง QUIET_HOURS ตามเวลาท้องถิ่นของโรงเรียน
+
+QUIET_HOURS = (1, 5)
+# VACUUM เมื่อหน้าว่างในไฟล์มากกว่าสัดส่วนนี้ (หลังย้ายภาคเรียนออกไป)
+VACUUM_FREE_RATIO = 0.1
+
+maintenance_cli = AppGroup('maintenance', help='Run database maintenance tasks.')
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def optimize(conn):
+    conn.execute('PRAGMA optimize')
+    return 'ok'
+
+
+def analyze(conn):
+    conn.execute('ANALYZE')
+    conn.commit()
+    return 'ok'
+
+
+def archive_terms(conn):
+    results = archive.archive_due(conn)
+    return ', '.join(f'{r["term"]}: {r["orders"]} orders' for r in results) or 'nothing due'
+
+
+def free_ratio(conn):
+    pages = conn.execute('PRAGMA page_count').fetchone()[0]
+    free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return free / pages if pages else 0.0
+
+
+def vacuum(conn, force=False):
+    ratio = free_ratio(conn)
+    if ratio < VACUUM_FREE_RATIO and not force:
+        return f'skipped ({ratio:.1%} free)'
+    start = time.perf_counter()
+    before = conn.execute('PRAGMA page_count').fetchone()[0]
+    conn.execute('VACUUM')
+    # VACUUM ใน WAL mode เขียนผ่าน WAL ตัดไฟล์ WAL ทิ้งด้วย
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    after = conn.execute('PRAGMA page_count').fetchone()[0]
+    return f'{before} -> {after} pages in {time.perf_counter() - start:.1f}s'
+
+
+TASKS = {
+    # task: (ฟังก์ชัน, รอบ, ต้องอยู่ใน QUIET_HOURS)
+    'optimize': (optimize, timedelta(hours=1), False),
+    'analyze': (analyze, timedelta(days=1), True),
+    'archive': (archive_terms, timedelta(days=1), True),
+    'vacuum': (vacuum, timedelta(days=1), True),
+}
+ORDER = ('archive', 'vacuum', 'analyze', 'optimize')
+
+
+def quiet(now=None):
+    hour = (now or pickup_slots.local_now()).hour
+    return QUIET_HOURS[0] <= hour < QUIET_HOURS[1]
+
+
+def _claim(conn, task, interval):
+    now = _now()
+    cutoff = (now - interval).strftime('%Y-%m-%d %H:%M:%S')
+    cursor = conn.execute('''
+        INSERT INTO maintenance_runs (task, last_run) VALUES (?, ?)
+        ON CONFLICT(task) DO UPDATE SET last_run = excluded.last_run
+        WHERE last_run <= ?
+    ''', (task, now.strftime('%Y-%m-%d %H:%M:%S'), cutoff))
+    conn.commit()
+    return cursor.rowcount == 1
+
+
+def _record(conn, task, result):
+    conn.execute('UPDATE maintenance_runs SET result = ? WHERE task = ?', (str(result)[:500], task))
+    conn.commit()
+
+
+def run_due(conn, local_now=None):
+    # คืน [(task, ผลลัพธ์)] ของงานที่ถึงรอบและได้ claim
+    done = []
+    is_quiet = quiet(local_now)
+    for task in ORDER:
+        function, interval, needs_quiet = TASKS[task]
+        if needs_quiet and not is_quiet:
+            continue
+        if not _claim(conn, task, interval):
+            continue
+        try:
+            result = function(conn)
+        except Exception as e:
+            conn.rollback()
+            _record(conn, task, f'failed: {e}')
+            raise
+        _record(conn, task, result)
+        done.append((task, result))
+    return done
+
+
+def status(conn):
+    return conn.execute('SELECT task, last_run, result FROM maintenance_runs ORDER BY task').fetchall()
+
+
+@maintenance_cli.command('run')
+@click.argument('tasks', nargs=-1)
+def run_command(tasks):
+    # ระบุชื่องาน = รันทันทีไม่สนรอบ/ช่วงเวลา ไม่ระบุ = รันงานที่ถึงรอบแบบเดียวกับ worker
+    conn = db.connect(current_app.config['DATABASE'])
+    try:
+        if tasks:
+            unknown = [task for task in tasks if task not in TASKS]
+            if unknown:
+                raise click.ClickException(f'unknown task(s): {", ".join(unknown)} (choose from {", ".join(TASKS)})')
+            for task in tasks:
+                result = vacuum(conn, force=True) if task == 'vacuum' else TASKS[task][0](conn)
+                _claim(conn, task, timedelta(0))
+                _record(conn, task, result)
+                print(f'{task}: {result}')
+        else:
+            for task, result in run_due(conn):
+                print(f'{task}: {result}')
+    except archive.ArchiveError as e:
+        raise click.ClickException(str(e))
+    finally:
+        conn.close()
+
+
+@maintenance_cli.command('status')
+def status_command():
+    conn = db.connect(current_app.config['DATABASE'])
+    print(f'free pages: {free_ratio(conn):.1%}')
+    for task, last_run, result in status(conn):
+        print(f'{task:<10} {last_run}  {result}')
+    conn.close()
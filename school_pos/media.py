@@ -0,0 +1,230 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+import catalog
+
+log = logging.getLogger('school_pos.media')
+
+# รูปร้านค้า / เมนูที่อัปโหลด
+#  - ไฟล์ต้นฉบับเก็บทันทีตอนอัปโหลด ใช้เป็น image_url ไปก่อน (status = pending)
+#  - worker.py ย่อเป็นหลายขนาด (WIDTHS) ทั้ง WebP และ JPEG แล้วเก็บ srcset ไว้ในตาราง images
+#  - ทุกไฟล์ตั้งชื่อตาม hash ของเนื้อหา เสิร์ฟที่ /media/ ด้วย Cache-Control แบบ immutable
+#    service worker จึง precache ตามชื่อไฟล์ได้เลย ไฟล์ใหม่ = ชื่อใหม่
+# ถ้าไม่ได้ติดตั้ง Pillow จะใช้ไฟล์ต้นฉบับอย่างเดียว (ไม่มี srcset)
+
+WIDTHS = (160, 320, 640)
+# ขนาดที่ service worker precache (รูปในหน้าเมนูแสดงกว้าง 100px, จอ 2x-3x)
+PRECACHE_WIDTH = 320
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+JPEG_QUALITY = 80
+WEBP_QUALITY = 75
+CACHE_SECONDS = 365 * 24 * 3600
+
+# magic bytes -> นามสกุล
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+)
+
+
+class MediaError(Exception):
+    pass
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def media_dir(db_path):
+    return os.environ.get('SCHOOL_POS_MEDIA_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(db_path)), 'media')
+
+
+def url_for_file(name):
+    return f'/media/{name}'
+
+
+def _hashed_name(data, suffix):
+    return f'{hashlib.sha256(data).hexdigest()[:16]}.{suffix}'
+
+
+def _write(directory, name, data):
+    # ชื่อไฟล์มาจาก hash ของเนื้อหา ถ้ามีอยู่แล้วก็คือไฟล์เดียวกัน
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+
+def _sniff(data):
+    for signature, extension in SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+# ---------- ฝั่ง web ----------
+
+def save_upload(conn, directory, upload):
+    # upload: werkzeug FileStorage คืน (image_id, url ของต้นฉบับ) ไม่ commit เอง
+    data = upload.stream.read(MAX_UPLOAD_BYTES + 1)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise MediaError('image is larger than 5 MB')
+    extension = _sniff(data)
+    if extension is None:
+        raise MediaError('image must be JPEG, PNG or WebP')
+
+    os.makedirs(directory, exist_ok=True)
+    name = _hashed_name(data, extension)
+    _write(directory, name, data)
+    src = url_for_file(name)
+    cursor = conn.execute('''
+        INSERT INTO images (original, status, src, created_at)
+        VALUES (?, 'pending', ?, ?)
+    ''', (name, src, _now()))
+    return cursor.lastrowid, src
+
+
+def attach(conn, table, row_id, image_id, src):
+    # ผูกรูปกับร้าน/เมนู แล้ว bump version ของ catalog ที่แสดงรูปนี้ (ผู้เรียก commit)
+    if table == 'shops':
+        conn.execute('UPDATE shops SET image_id = ?, image_url = ? WHERE shop_id = ?', (image_id, src, row_id))
+        catalog.bump_version(conn, catalog.SHOP_LIST)
+        catalog.bump_version(conn, row_id)
+    else:
+        cursor = conn.execute('UPDATE menu_items SET image_id = ?, image_url = ? WHERE item_id = ?',
+                              (image_id, src, row_id))
+        if cursor.rowcount:
+            shop_id = conn.execute('SELECT shop_id FROM menu_items WHERE item_id = ?', (row_id,)).fetchone()[0]
+            catalog.bump_version(conn, shop_id)
+
+
+def precache_urls(conn):
+    # รูปขนาด PRECACHE_WIDTH ของร้านและเมนูที่ขายอยู่ สำหรับ service worker
+    rows = conn.execute('''
+        SELECT i.thumbnail FROM images i
+        WHERE i.thumbnail IS NOT NULL AND (
+            i.image_id IN (SELECT image_id FROM shops WHERE image_id IS NOT NULL)
+            OR i.image_id IN (SELECT image_id FROM menu_items WHERE image_id IS NOT NULL AND available = 1))
+        ORDER BY i.image_id
+    ''').fetchall()
+    return [row[0] for row in rows]
+
+
+# ---------- ฝั่ง worker ----------
+
+def _encode(image, width, fmt):
+    resized = image
+    if image.width > width:
+        resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+    out = io.BytesIO()
+    if fmt == 'webp':
+        resized.save(out, 'WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        resized.convert('RGB').save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue(), resized.width
+
+
+def _variants(directory, original):
+    # คืน [{'url', 'width', 'format'}] ขนาดที่ไม่ใหญ่กว่าต้นฉบับ (ไม่ขยายรูป)
+    with open(os.path.join(directory, original), 'rb') as f:
+        image = Image.open(f)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    widths = sorted({min(width, image.width) for width in WIDTHS})
+    variants = []
+    for fmt, suffix in (('webp', 'webp'), ('jpeg', 'jpg')):
+        for width in widths:
+            data, actual = _encode(image, width, fmt)
+            name = _hashed_name(data, f'{actual}w.{suffix}')
+            _write(directory, name, data)
+            variants.append({'url': url_for_file(name), 'width': actual, 'format': fmt})
+    return variants, image.width, image.height
+
+
+def _srcset(variants, fmt):
+    return ', '.join(f'{v["url"]} {v["width"]}w' for v in variants if v['format'] == fmt) or None
+
+
+def _pick(variants, fmt, width):
+    candidates = [v for v in variants if v['format'] == fmt]
+    if not candidates:
+        return None
+    fitting = [v for v in candidates if v['width'] <= width]
+    return (fitting[-1] if fitting else candidates[0])['url']
+
+
+def process(conn, directory, image_id, original):
+    if Image is None:
+        variants, width, height = [], None, None
+        src = thumbnail = url_for_file(original)
+    else:
+        variants, width, height = _variants(directory, original)
+        src = _pick(variants, 'jpeg', max(WIDTHS))
+        thumbnail = _pick(variants, 'webp', PRECACHE_WIDTH)
+
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('''
+            UPDATE images
+            SET status = 'done', width = ?, height = ?, variants = ?, srcset_webp = ?, srcset_jpeg = ?,
+                src = ?, thumbnail = ?, processed_at = ?
+            WHERE image_id = ?
+        ''', (width, height, json.dumps(variants), _srcset(variants, 'webp'), _srcset(variants, 'jpeg'),
+              src, thumbnail, _now(), image_id))
+        # หน้าเมนูที่ cache ไว้ต้องได้ srcset ใหม่
+        shops = [row[0] for row in cursor.execute('SELECT shop_id FROM shops WHERE image_id = ?', (image_id,))]
+        item_shops = [row[0] for row in cursor.execute(
+            'SELECT DISTINCT shop_id FROM menu_items WHERE image_id = ?', (image_id,))]
+        cursor.execute('UPDATE shops SET image_url = ? WHERE image_id = ?', (src, image_id))
+        cursor.execute('UPDATE menu_items SET image_url = ? WHERE image_id = ?', (src, image_id))
+        if shops:
+            catalog.bump_version(conn, catalog.SHOP_LIST)
+        for shop_id in set(shops + item_shops):
+            catalog.bump_version(conn, shop_id)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return len(variants)
+
+
+def process_pending(conn, directory, limit=10):
+    # คืนจำนวนรูปที่ทำแล้ว รูปที่เสีย (เปิด/ย่อไม่ได้) จะถูกตั้ง status = failed ไม่วนทำซ้ำ แล้วทำรูปถัดไปต่อ
+    # error ของฐานข้อมูล (เช่น database is locked) เป็นเรื่องชั่วคราว รูปยังเป็น pending แล้วโยนต่อให้ worker รอรอบหน้า
+    done = 0
+    for image_id, original in conn.execute('''
+        SELECT image_id, original FROM images WHERE status = 'pending' ORDER BY image_id LIMIT ?
+    ''', (limit,)).fetchall():
+        try:
+            process(conn, directory, image_id, original)
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        except Exception as e:
+            conn.rollback()
+            log.warning('image %d failed: %s', image_id, e, exc_info=True)
+            conn.execute("UPDATE images SET status = 'failed', error = ?, processed_at = ? WHERE image_id = ?",
+                         (str(e)[:500], _now(), image_id))
+            conn.commit()
+            continue
+        done += 1
+    return done
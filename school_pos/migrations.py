@@ -0,0 +1,564 @@
+import os
+import re
+import tempfile
+
+import db
+
+# schema หลักของระบบ (ชื่อคอลัมน์ตรงกับที่ทุก route ใช้)
+# เพิ่ม migration ใหม่ต่อท้าย MIGRATIONS เสมอ ห้ามแก้ migration ที่ออกไปแล้ว
+# เลข version เก็บใน PRAGMA user_version
+
+
+def _columns(cursor, table):
+    return [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+
+
+def _migrate_legacy_tables(cursor):
+    # ฐานข้อมูลที่สร้างจาก init_db รุ่นเก่าใน app.py ใช้ชื่อคอลัมน์ไม่ตรงกับ query
+    if 'id' in _columns(cursor, 'shops'):
+        cursor.execute('ALTER TABLE shops RENAME COLUMN id TO shop_id')
+
+    if 'user_id' in _columns(cursor, 'orders'):
+        cursor.execute('ALTER TABLE orders RENAME TO legacy_orders')
+        _create_orders(cursor)
+        cursor.execute('''
+            INSERT INTO orders (order_id, student_id, shop_id, order_date, total_amount, status)
+            SELECT id, user_id, shop_id, created_at, total_price, IFNULL(order_status, 'pending')
+            FROM legacy_orders
+        ''')
+        cursor.execute('DROP TABLE legacy_orders')
+
+    if 'menu_id' in _columns(cursor, 'order_items'):
+        cursor.execute('ALTER TABLE order_items RENAME TO legacy_order_items')
+        _create_order_items(cursor)
+        cursor.execute('''
+            INSERT INTO order_items (order_item_id, order_id, item_id, quantity, price)
+            SELECT oi.id, oi.order_id, oi.menu_id, oi.quantity, m.price
+            FROM legacy_order_items oi
+            LEFT JOIN menu_items m ON oi.menu_id = m.item_id
+        ''')
+        cursor.execute('DROP TABLE legacy_order_items')
+
+
+def _create_orders(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id TEXT,
+            shop_id INTEGER,
+            order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            total_amount REAL,
+            status TEXT DEFAULT 'pending',
+            FOREIGN KEY (student_id) REFERENCES students(student_id),
+            FOREIGN KEY (shop_id) REFERENCES shops(shop_id)
+        )
+    ''')
+
+
+def _create_order_items(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS order_items (
+            order_item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER,
+            item_id INTEGER,
+            quantity INTEGER,
+            price REAL,
+            FOREIGN KEY (order_id) REFERENCES orders(order_id),
+            FOREIGN KEY (item_id) REFERENCES menu_items(item_id)
+        )
+    ''')
+
+
+def _base_schema(cursor):
+    # ตาราง students
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS students (
+            student_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            password_hash TEXT NOT NULL,
+            balance REAL DEFAULT 0
+        )
+    ''')
+
+    # ตาราง admins (ครู/แอดมิน)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS admins (
+            admin_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            name TEXT NOT NULL
+        )
+    ''')
+
+    # ตาราง shops
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS shops (
+            shop_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            shop_name TEXT UNIQUE,
+            owner_name TEXT,
+            password_hash TEXT,
+            image_url TEXT
+        )
+    ''')
+
+    # ตาราง menu_items
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS menu_items (
+            item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            shop_id INTEGER,
+            name TEXT,
+            price REAL,
+            cost REAL,
+            available BOOLEAN,
+            image_url TEXT,
+            category TEXT,
+            UNIQUE(shop_id, name),
+            FOREIGN KEY (shop_id) REFERENCES shops(shop_id)
+        )
+    ''')
+
+    # ตาราง orders / order_items
+    _create_orders(cursor)
+    _create_order_items(cursor)
+    _migrate_legacy_tables(cursor)
+
+    # ตาราง catalog_versions (version ของเมนูแต่ละร้าน ใช้ล้าง cache ทุก worker)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_versions (
+            shop_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP
+        )
+    ''')
+
+    # ตารางสรุปยอดขายรายวัน (ต่อร้าน ต่อเมนู ต่อวัน)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_item_sales (
+            shop_id INTEGER NOT NULL,
+            sale_date TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            cost REAL NOT NULL DEFAULT 0,
+            profit REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (shop_id, sale_date, item_id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_shop_sales (
+            shop_id INTEGER NOT NULL,
+            sale_date TEXT NOT NULL,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (shop_id, sale_date)
+        )
+    ''')
+
+
+def _hot_query_indexes(cursor):
+    # index สำหรับ query ที่ถูกเรียกบ่อย
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_shop_date ON orders(shop_id, order_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_items_item ON order_items(item_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_menu_items_shop_available ON menu_items(shop_id, available)')
+
+
+def _cart_store(cursor):
+    # ตะกร้าสินค้าฝั่งเซิร์ฟเวอร์ นักเรียนหนึ่งคนต่อหนึ่งตะกร้า
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS carts (
+            cart_id TEXT PRIMARY KEY,
+            student_id TEXT NOT NULL UNIQUE,
+            updated_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cart_items (
+            cart_id TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (cart_id, item_id)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _student_directory(cursor):
+    # เรียงตามยอดเงินแบบ keyset
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_students_balance ON students(balance, student_id)')
+
+    # ค้นหาชื่อภาษาไทย: ภาษาไทยไม่เว้นวรรคระหว่างคำ จึงใช้ trigram tokenizer (ค้นหาแบบ substring)
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS students_fts
+        USING fts5(name, content='students', content_rowid='rowid', tokenize='trigram')
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS students_fts_insert AFTER INSERT ON students BEGIN
+            INSERT INTO students_fts(rowid, name) VALUES (new.rowid, new.name);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS students_fts_delete AFTER DELETE ON students BEGIN
+            INSERT INTO students_fts(students_fts, rowid, name) VALUES ('delete', old.rowid, old.name);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS students_fts_update AFTER UPDATE OF name ON students BEGIN
+            INSERT INTO students_fts(students_fts, rowid, name) VALUES ('delete', old.rowid, old.name);
+            INSERT INTO students_fts(rowid, name) VALUES (new.rowid, new.name);
+        END
+    ''')
+    cursor.execute("INSERT INTO students_fts(students_fts) VALUES ('rebuild')")
+
+
+def _order_queue(cursor):
+    # ตารางแจ้งเตือนสำหรับคิวคำสั่งซื้อของร้าน (event_id เพิ่มขึ้นเรื่อยๆ ใช้เป็น Last-Event-ID)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS order_events (
+            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            shop_id INTEGER NOT NULL,
+            order_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            created_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_events_shop ON order_events(shop_id, event_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_shop_status ON orders(shop_id, status)')
+
+
+def _checkout_keys(cursor):
+    # idempotency key ของ checkout (กันการหักเงินซ้ำเมื่อ client ส่งคำสั่งซื้อเดิมซ้ำ)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS checkout_keys (
+            student_id TEXT NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            order_ids TEXT NOT NULL,
+            total REAL NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (student_id, idempotency_key)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_checkout_keys_created ON checkout_keys(created_at)')
+
+
+def _idempotency_keys(cursor):
+    # response ที่เก็บไว้ตาม Idempotency-Key (ดู idempotency.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            scope TEXT NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            status TEXT NOT NULL,
+            response_status INTEGER,
+            response_headers TEXT,
+            response_body BLOB,
+            created_at TIMESTAMP NOT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (scope, idempotency_key)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(expires_at)')
+
+
+def _student_orders_index(cursor):
+    # ประวัติการสั่งซื้อของนักเรียน (keyset ตาม order_id)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_student ON orders(student_id, order_id)')
+
+
+def _export_jobs(cursor):
+    # งาน export รายงานที่ worker.py ดึงไปทำ (ดู exports.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            format TEXT NOT NULL,
+            requested_by TEXT NOT NULL,
+            shop_id INTEGER,
+            date_from TEXT NOT NULL,
+            date_to TEXT NOT NULL,
+            status TEXT NOT NULL,
+            total_rows INTEGER,
+            rows_written INTEGER NOT NULL DEFAULT 0,
+            parts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            worker_pid INTEGER,
+            created_at TIMESTAMP NOT NULL,
+            started_at TIMESTAMP,
+            updated_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_export_jobs_status ON export_jobs(status, job_id)')
+    # export ของแอดมินกรองแค่ช่วงวันที่ (ไม่มี shop_id)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_date ON orders(order_date)')
+
+
+def _student_spending(cursor):
+    # ประวัติการสั่งซื้อกรองตามช่วงวันที่ของนักเรียนแต่ละคน
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_student_date ON orders(student_id, order_date)')
+
+    # ยอดใช้จ่ายรายวันของนักเรียน อัปเดตใน transaction เดียวกับ checkout (ดู rollups.record_spending)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS student_daily_spending (
+            student_id TEXT NOT NULL,
+            spend_date TEXT NOT NULL,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            amount REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (student_id, spend_date)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO student_daily_spending (student_id, spend_date, order_count, amount)
+        SELECT student_id, date(order_date), COUNT(*), SUM(total_amount)
+        FROM orders
+        GROUP BY student_id, date(order_date)
+    ''')
+
+
+def _balance_version(cursor):
+    # เพิ่มทุกครั้งที่ยอดเงินเปลี่ยน (checkout, แก้ไขโดยแอดมิน, นำเข้า) ใช้ตรวจ cache ของ balances.py
+    if 'balance_version' not in _columns(cursor, 'students'):
+        cursor.execute('ALTER TABLE students ADD COLUMN balance_version INTEGER NOT NULL DEFAULT 0')
+
+
+def _inventory(cursor):
+    # stock = NULL คือไม่นับสต็อก (ดู inventory.py)
+    columns = _columns(cursor, 'menu_items')
+    if 'stock' not in columns:
+        cursor.execute('ALTER TABLE menu_items ADD COLUMN stock INTEGER')
+    if 'prep_quantity' not in columns:
+        cursor.execute('ALTER TABLE menu_items ADD COLUMN prep_quantity INTEGER')
+
+
+def _pickup_slots(cursor):
+    # สั่งล่วงหน้าตามเวลารับ (ดู pickup_slots.py)
+    if 'slot_capacity' not in _columns(cursor, 'shops'):
+        cursor.execute('ALTER TABLE shops ADD COLUMN slot_capacity INTEGER')
+    if 'pickup_slot' not in _columns(cursor, 'orders'):
+        cursor.execute('ALTER TABLE orders ADD COLUMN pickup_slot TEXT')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pickup_slot_counts (
+            shop_id INTEGER NOT NULL,
+            slot TEXT NOT NULL,
+            booked INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (shop_id, slot)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _images(cursor):
+    # รูปที่อัปโหลดและขนาดย่อ (ดู media.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS images (
+            image_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            original TEXT NOT NULL,
+            status TEXT NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            variants TEXT,
+            srcset_webp TEXT,
+            srcset_jpeg TEXT,
+            src TEXT NOT NULL,
+            thumbnail TEXT,
+            error TEXT,
+            created_at TIMESTAMP NOT NULL,
+            processed_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_images_status ON images(status, image_id)')
+    for table in ('shops', 'menu_items'):
+        if 'image_id' not in _columns(cursor, table):
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN image_id INTEGER')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_image ON {table}(image_id)')
+
+
+def _archives(cursor):
+    # ภาคเรียนที่ปิดแล้วย้าย orders/order_items ไปไฟล์แยก (ดู archive.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS terms (
+            term_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            archive_file TEXT,
+            archived_at TIMESTAMP,
+            order_count INTEGER,
+            item_count INTEGER,
+            revenue REAL
+        )
+    ''')
+    # งานดูแลฐานข้อมูลตามรอบ (ดู maintenance.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            task TEXT PRIMARY KEY,
+            last_run TIMESTAMP NOT NULL,
+            result TEXT
+        )
+    ''')
+
+
+def _student_cards(cursor):
+    # บัตร/QR ของนักเรียนสำหรับ kiosk เก็บแค่ SHA-256 ของ token (ดู kiosk.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS student_cards (
+            token_hash TEXT PRIMARY KEY,
+            student_id TEXT NOT NULL UNIQUE,
+            issued_at TIMESTAMP NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def _sold_out(cursor):
+    # sold_out = 1 คือถูกปิดขายอัตโนมัติเพราะสต็อกหมด (ไม่ใช่ร้านปิดเอง) เติมสต็อกแล้วเปิดขายคืนได้
+    if 'sold_out' not in _columns(cursor, 'menu_items'):
+        cursor.execute('ALTER TABLE menu_items ADD COLUMN sold_out INTEGER NOT NULL DEFAULT 0')
+    # ก่อนมีคอลัมน์นี้ เมนูที่สต็อก 0 และปิดอยู่ถูกปิดโดย checkout/set_stock
+    cursor.execute('UPDATE menu_items SET sold_out = 1 WHERE stock = 0 AND available = 0')
+
+
+def _import_jobs(cursor):
+    # นำเข้านักเรียนจากหน้าแอดมินรันใน worker.py (ดู bulk_import.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            requested_by TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            method TEXT NOT NULL,
+            status TEXT NOT NULL,
+            rows INTEGER NOT NULL DEFAULT 0,
+            inserted INTEGER NOT NULL DEFAULT 0,
+            updated INTEGER NOT NULL DEFAULT 0,
+            errors TEXT,
+            error TEXT,
+            worker_pid INTEGER,
+            created_at TIMESTAMP NOT NULL,
+            started_at TIMESTAMP,
+            updated_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON import_jobs(status, job_id)')
+
+
+MIGRATIONS = [
+    (1, _base_schema),
+    (2, _hot_query_indexes),
+    (3, _cart_store),
+    (4, _student_directory),
+    (5, _order_queue),
+    (6, _checkout_keys),
+    (7, _idempotency_keys),
+    (8, _student_orders_index),
+    (9, _export_jobs),
+    (10, _student_spending),
+    (11, _balance_version),
+    (12, _inventory),
+    (13, _pickup_slots),
+    (14, _images),
+    (15, _archives),
+    (16, _student_cards),
+    (17, _sold_out),
+    (18, _import_jobs),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def upgrade(conn, target=LATEST_VERSION):
+    # รัน migration ที่ยังไม่ได้รัน ทีละตัว ตัวละหนึ่ง transaction
+    applied = []
+    version = current_version(conn)
+    for number, migration in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append(number)
+    return applied
+
+
+# ---------- ตรวจ query plan ----------
+
+PLAN_CHECKED_TABLES = ('orders', 'order_items')
+_SQL_KEYWORDS = {'where', 'join', 'on', 'group', 'order', 'limit', 'set', 'values',
+                 'left', 'inner', 'union', 'as', 'using'}
+
+
+def _aliases(sql, table):
+    names = {table}
+    for alias in re.findall(rf'\b{table}\s+(?:AS\s+)?(\w+)', sql, re.IGNORECASE):
+        if alias.lower() not in _SQL_KEYWORDS:
+            names.add(alias)
+    return names
+
+
+def full_scans(conn, sql, tables=PLAN_CHECKED_TABLES):
+    # คืนรายการขั้นตอนใน query plan ที่ scan ทั้งตาราง orders/order_items
+    names = set()
+    for table in tables:
+        if re.search(rf'\b{table}\b', sql, re.IGNORECASE):
+            names |= _aliases(sql, table)
+    if not names:
+        return []
+    pattern = re.compile(r'^SCAN (%s)\b' % '|'.join(re.escape(name) for name in names))
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}') if pattern.match(row[3])]
+
+
+def _planned(sql):
+    # INSERT ... SELECT (เช่นย้ายตะกร้าเข้า order_items) อ่านตารางได้เหมือน SELECT จึงต้องตรวจด้วย
+    if re.match(r'\s*(SELECT|UPDATE|DELETE)\b', sql, re.IGNORECASE):
+        return True
+    return bool(re.match(r'\s*INSERT\b', sql, re.IGNORECASE) and re.search(r'\bSELECT\b', sql, re.IGNORECASE))
+
+
+def check_query_plans(app, requests):
+    # รัน requests [(session, method, url, kwargs), ...] ผ่าน test client กับฐานข้อมูลชั่วคราว
+    # เก็บทุก statement ที่ route รัน แล้วตรวจ EXPLAIN QUERY PLAN
+    from db_init import insert_sample_data
+
+    statements = []
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = db.connect(os.path.join(tmp, 'plans.db'))
+        upgrade(conn)
+        insert_sample_data(conn.cursor())
+        conn.commit()
+
+        saved_pool = app.extensions.get('school_pos_db')
+        pool = db.ConnectionPool(os.path.join(tmp, 'plans.db'), size=1)
+        with pool.connection() as traced:
+            traced.set_trace_callback(statements.append)
+        app.extensions['school_pos_db'] = pool
+        try:
+            client = app.test_client()
+            for session_data, method, url, kwargs in requests:
+                with client.session_transaction() as sess:
+                    sess.clear()
+                    sess.update(session_data)
+                client.open(url, method=method, **kwargs)
+        finally:
+            if saved_pool is None:
+                app.extensions.pop('school_pos_db', None)
+            else:
+                app.extensions['school_pos_db'] = saved_pool
+
+        problems = []
+        seen = set()
+        for sql in statements:
+            if sql in seen or not _planned(sql):
+                continue
+            seen.add(sql)
+            for detail in full_scans(conn, sql):
+                problems.append((' '.join(sql.split()), detail))
+        conn.close()
+    return problems
@@ -0,0 +1,48 @@
+import hashlib
+import os
+
+from flask import current_app, make_response, request, session
+
+import assets
+
+# service worker ต้องเสิร์ฟจาก / เพื่อให้ scope ครอบทุกหน้า (ไฟล์ใน /static/ ได้ scope แค่ /static/)
+# รายการ precache มาจาก assets (URL ที่มี hash หลัง flask assets build)
+# CACHE_VERSION คำนวณจาก sw.js และ URL/เนื้อหาไฟล์ที่ precache ทุก deploy ที่แก้ไฟล์เหล่านี้จึงได้ cache ชุดใหม่
+
+SERVICE_WORKER = 'sw.js'
+# service worker ใส่ header นี้ตอนส่งคำขอที่ค้างในคิว ค่าเป็น student_id ของคนที่สั่งตอน offline
+QUEUED_FOR_HEADER = 'X-Queued-For'
+
+_versions = {}
+
+
+def cache_version(static_folder, urls):
+    key = (static_folder, tuple(urls))
+    if key not in _versions:
+        digest = hashlib.sha1()
+        for name in (SERVICE_WORKER,) + assets.ASSETS:
+            with open(os.path.join(static_folder, name), 'rb') as f:
+                digest.update(f.read())
+        digest.update('\n'.join(urls).encode('utf-8'))
+        _versions[key] = digest.hexdigest()[:12]
+    return _versions[key]
+
+
+def service_worker_response():
+    static_folder = current_app.static_folder
+    urls = assets.precache_urls()
+    with open(os.path.join(static_folder, SERVICE_WORKER), encoding='utf-8') as f:
+        script = f.read()
+    script = script.replace('__CACHE_VERSION__', cache_version(static_folder, urls))
+    script = script.replace('/* __PRECACHE_STATIC__ */', ' '.join(f"'{url}'," for url in urls))
+
+    response = make_response(script)
+    response.mimetype = 'application/javascript'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def queued_for_other_student():
+    # เครื่องที่ใช้ร่วมกัน: คิวที่ค้างจากนักเรียนคนก่อนต้องไม่ถูกตัดเงินจาก session ของคนที่ล็อกอินอยู่ตอนนี้
+    queued_for = request.headers.get(QUEUED_FOR_HEADER)
+    return queued_for is not None and queued_for != session.get('student_id')
@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import archive
+
+# ประวัติการสั่งซื้อของนักเรียน แบ่งหน้าแบบ keyset ตาม order_id (ใหม่ -> เก่า)
+# order_id เพิ่มตามเวลาสั่ง เรียงตาม order_id จึงเท่ากับเรียงตาม order_date
+# กรองช่วงวันที่ (date_from, date_to รวมทั้งวัน) ใช้ index (student_id, order_date)
+# คำสั่งซื้อของภาคเรียนที่ย้ายไป archive แล้ว อ่านต่อจากไฟล์ archive เมื่อหน้านั้นยังไม่เต็มเท่านั้น
+# ไฟล์ archive ที่หาย/เสียถือว่าไม่มีคำสั่งซื้อ (log ไว้) หน้าประวัติยังแสดงคำสั่งซื้อปัจจุบันได้
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def list_orders(conn, student_id, before=None, limit=PAGE_SIZE, date_from=None, date_to=None):
+    # คืน (orders, order_id สำหรับขอหน้าถัดไปหรือ None)
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    params = [student_id]
+    where = 'o.student_id = ?'
+    if before is not None:
+        where += ' AND o.order_id < ?'
+        params.append(int(before))
+    if date_from is not None:
+        date_from = _day(date_from)
+        where += ' AND o.order_date >= ?'
+        params.append(date_from)
+    if date_to is not None:
+        date_to = _day(date_to)
+        where += " AND o.order_date < date(?, '+1 day')"
+        params.append(date_to)
+
+    rows = []
+    for schema in archive.sources(conn, date_from, date_to, skip_missing=True):
+        found = conn.execute(f'''
+            SELECT o.order_id, o.shop_id, s.shop_name, o.order_date, o.total_amount, o.status, o.pickup_slot
+            FROM {schema}.orders o
+            LEFT JOIN shops s ON o.shop_id = s.shop_id
+            WHERE {where}
+            ORDER BY o.order_id DESC
+            LIMIT ?
+        ''', params + [limit + 1 - len(rows)]).fetchall()
+        rows.extend((schema,) + row for row in found)
+        if len(rows) > limit:
+            break
+
+    next_before = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_before = rows[-1][1]
+
+    orders = {}
+    by_schema = {}
+    for schema, order_id, shop_id, shop_name, order_date, total, status, pickup_slot in rows:
+        orders[order_id] = {
+            'order_id': order_id,
+            'shop_id': shop_id,
+            'shop_name': shop_name,
+            'order_date': order_date,
+            'total': total,
+            'status': status,
+            'pickup_slot': pickup_slot,
+            'archived': schema != 'main',
+            'items': [],
+        }
+        by_schema.setdefault(schema, []).append(order_id)
+    for schema, order_ids in by_schema.items():
+        placeholders = ','.join('?' * len(order_ids))
+        for order_id, item_id, name, quantity, price in conn.execute(f'''
+            SELECT oi.order_id, oi.item_id, m.name, oi.quantity, oi.price
+            FROM {schema}.order_items oi
+            LEFT JOIN menu_items m ON oi.item_id = m.item_id
+            WHERE oi.order_id IN ({placeholders})
+            ORDER BY oi.order_item_id
+        ''', order_ids):
+            orders[order_id]['items'].append({'item_id': item_id, 'name': name,
+                                              'quantity': quantity, 'price': price})
+    return list(orders.values()), next_before
+
+
+def _day(value):
+    # ValueError ถ้าไม่ใช่ YYYY-MM-DD
+    return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
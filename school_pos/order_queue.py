@@ -0,0 +1,154 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+# คิวคำสั่งซื้อของร้านแบบ real-time (Server-Sent Events)
+# ทุกการเปลี่ยนสถานะเขียนลง order_events ใน transaction เดียวกับการเปลี่ยนข้อมูล
+# แต่ละ stream poll หา event_id ที่ใหม่กว่าที่ส่งไปแล้ว จึงใช้ได้ข้าม gunicorn worker โดยใช้แค่ SQLite
+
+STATUSES = ('pending', 'preparing', 'ready', 'completed')
+NEXT_STATUS = {
+    'pending': 'preparing',
+    'preparing': 'ready',
+    'ready': 'completed',
+}
+
+POLL_INTERVAL = 1.0
+HEARTBEAT_INTERVAL = 15.0
+# stream หนึ่งเส้นถือ thread ของ gthread worker ไว้ตลอดอายุ จึงปิดทุก 30 วินาทีให้ thread กลับไปรับ request อื่น
+# browser ต่อใหม่เองหลัง RETRY_MS พร้อม Last-Event-ID ไม่มี event หาย (ดูการคำนวณจำนวน thread ใน Procfile)
+STREAM_LIFETIME = 30.0
+RETRY_MS = 2000
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def record_event(cursor, shop_id, order_id, status):
+    # เรียกภายใน transaction ของผู้เรียก (ไม่ commit)
+    cursor.execute('''
+        INSERT INTO order_events (shop_id, order_id, status, created_at)
+        VALUES (?, ?, ?, ?)
+    ''', (shop_id, order_id, status, _now()))
+
+
+def advance(conn, shop_id, order_id, status):
+    # เลื่อนสถานะได้ทีละขั้นตาม NEXT_STATUS เท่านั้น
+    previous = [current for current, following in NEXT_STATUS.items() if following == status]
+    if not previous:
+        raise InvalidTransition(status)
+
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('''
+            UPDATE orders SET status = ?
+            WHERE order_id = ? AND shop_id = ? AND status = ?
+        ''', (status, order_id, shop_id, previous[0]))
+        if cursor.rowcount != 1:
+            raise InvalidTransition(status)
+        record_event(cursor, shop_id, order_id, status)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def _orders(conn, where, params):
+    rows = conn.execute(f'''
+        SELECT o.order_id, o.student_id, s.name, o.order_date, o.total_amount, o.status, o.pickup_slot
+        FROM orders o
+        LEFT JOIN students s ON o.student_id = s.student_id
+        WHERE {where}
+        ORDER BY o.order_id
+    ''', params).fetchall()
+    orders = {}
+    for order_id, student_id, name, order_date, total, status, pickup_slot in rows:
+        orders[order_id] = {
+            'order_id': order_id,
+            'student_id': student_id,
+            'student_name': name,
+            'order_date': order_date,
+            'total': total,
+            'status': status,
+            'pickup_slot': pickup_slot,
+            'items': [],
+        }
+    if orders:
+        placeholders = ','.join('?' * len(orders))
+        for order_id, name, quantity in conn.execute(f'''
+            SELECT oi.order_id, m.name, oi.quantity
+            FROM order_items oi
+            JOIN menu_items m ON oi.item_id = m.item_id
+            WHERE oi.order_id IN ({placeholders})
+            ORDER BY oi.order_item_id
+        ''', list(orders)):
+            orders[order_id]['items'].append({'name': name, 'quantity': quantity})
+    return orders
+
+
+def last_event_id(conn, shop_id):
+    return conn.execute('SELECT IFNULL(MAX(event_id), 0) FROM order_events WHERE shop_id = ?',
+                        (shop_id,)).fetchone()[0]
+
+
+def open_orders(conn, shop_id):
+    # คำสั่งซื้อที่ยังไม่เสร็จของร้าน พร้อม event_id ล่าสุดสำหรับเริ่ม stream
+    last_id = last_event_id(conn, shop_id)
+    orders = _orders(conn, "o.shop_id = ? AND o.status IN ('pending', 'preparing', 'ready')", (shop_id,))
+    return list(orders.values()), last_id
+
+
+def events_since(conn, shop_id, last_id, limit=100):
+    events = conn.execute('''
+        SELECT event_id, order_id, status
+        FROM order_events
+        WHERE shop_id = ? AND event_id > ?
+        ORDER BY event_id
+        LIMIT ?
+    ''', (shop_id, last_id, limit)).fetchall()
+    if not events:
+        return []
+    order_ids = sorted({order_id for _, order_id, _ in events})
+    placeholders = ','.join('?' * len(order_ids))
+    orders = _orders(conn, f'o.order_id IN ({placeholders})', order_ids)
+    # ส่งสถานะตาม event ไม่ใช่สถานะปัจจุบัน เพื่อให้ลำดับบนหน้าจอถูกต้อง
+    return [(event_id, dict(orders[order_id], status=status))
+            for event_id, order_id, status in events if order_id in orders]
+
+
+def _format(event_id, order):
+    return f'id: {event_id}\nevent: order\ndata: {json.dumps(order, ensure_ascii=False)}\n\n'
+
+
+def stream(pool, shop_id, last_id, poll_interval=POLL_INTERVAL,
+           heartbeat=HEARTBEAT_INTERVAL, lifetime=STREAM_LIFETIME):
+    # ยืม connection จาก pool เฉพาะตอน poll ไม่ถือไว้ตลอดอายุ stream
+    yield f'retry: {RETRY_MS}\n\n'
+    started = last_sent = time.monotonic()
+    while time.monotonic() - started < lifetime:
+        with pool.connection() as conn:
+            events = events_since(conn, shop_id, last_id)
+        for event_id, order in events:
+            last_id = event_id
+            yield _format(event_id, order)
+        now = time.monotonic()
+        if events:
+            last_sent = now
+        elif now - last_sent >= heartbeat:
+            last_sent = now
+            yield ': ping\n\n'
+        time.sleep(poll_interval)
+
+
+def prune(conn, days=1):
+    # event เก่าไม่จำเป็นสำหรับการต่อ stream ใหม่ ลบทิ้งเพื่อไม่ให้ตารางโตไม่หยุด
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    cursor = conn.execute('DELETE FROM order_events WHERE created_at < ?', (cutoff,))
+    conn.commit()
+    return cursor.rowcount
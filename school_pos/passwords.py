@@ -0,0 +1,122 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# นโยบาย hash รหัสผ่านแยกตามประเภทผู้ใช้ (รูปแบบ method ของ werkzeug)
+# นักเรียนล็อกอินพร้อมกันจำนวนมากช่วงพัก จึงใช้ scrypt ที่ cost ต่ำกว่า
+# ปรับได้ด้วย app.config['PASSWORD_POLICIES']
+DEFAULT_POLICIES = {
+    'student': 'scrypt:16384:8:1',
+    'shop': 'scrypt:32768:8:1',
+    'admin': 'scrypt:32768:8:1',
+}
+
+
+class LoginBusy(Exception):
+    pass
+
+
+def policy(role):
+    policies = DEFAULT_POLICIES
+    if has_app_context():
+        policies = current_app.config.get('PASSWORD_POLICIES', DEFAULT_POLICIES)
+    return policies.get(role, DEFAULT_POLICIES[role])
+
+
+def hash_password(role, password):
+    return generate_password_hash(password, policy(role))
+
+
+_method_prefixes = {}
+
+
+def _method_prefix(method):
+    # werkzeug เติมค่าเริ่มต้นให้ method สั้นๆ (เช่น 'scrypt' -> 'scrypt:32768:8:1')
+    # จึงหา prefix จริงจาก hash ตัวอย่างครั้งเดียวต่อ method
+    if method not in _method_prefixes:
+        _method_prefixes[method] = generate_password_hash('', method).split('$', 1)[0]
+    return _method_prefixes[method]
+
+
+def needs_rehash(role, stored_hash):
+    return stored_hash.split('$', 1)[0] != _method_prefix(policy(role))
+
+
+class PasswordVerifier:
+    # ตรวจรหัสผ่านใน thread pool ขนาดจำกัด (hashlib ปล่อย GIL ระหว่างคำนวณ)
+    # ถ้างานค้างเกิน max_pending จะตอบ LoginBusy ทันทีแทนที่จะให้ทุก thread ติดอยู่กับการ hash
+    def __init__(self, workers, max_pending, timeout):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._slots = None
+        self.rejected = 0
+
+    def _ensure_executor(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='password-verify')
+                    self._slots = threading.BoundedSemaphore(self.max_pending)
+                    self._pid = os.getpid()
+
+    def _run(self, function, *args):
+        self._ensure_executor()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise LoginBusy()
+        future = self._executor.submit(function, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise LoginBusy()
+
+    def verify(self, stored_hash, password):
+        return self._run(check_password_hash, stored_hash, password)
+
+    def hash(self, method, password):
+        return self._run(generate_password_hash, password, method)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'rejected': self.rejected,
+        }
+
+
+def init_app(app):
+    app.config.setdefault('PASSWORD_POLICIES', dict(DEFAULT_POLICIES))
+    app.config.setdefault('PASSWORD_VERIFY_WORKERS', os.cpu_count() or 1)
+    app.config.setdefault('PASSWORD_VERIFY_QUEUE', 32)
+    app.config.setdefault('PASSWORD_VERIFY_TIMEOUT', 10.0)
+    app.extensions['password_verifier'] = PasswordVerifier(app.config['PASSWORD_VERIFY_WORKERS'],
+                                                           app.config['PASSWORD_VERIFY_QUEUE'],
+                                                           app.config['PASSWORD_VERIFY_TIMEOUT'])
+
+
+def verifier():
+    return current_app.extensions['password_verifier']
+
+
+def check_login(role, stored_hash, password):
+    # คืน (ผ่านหรือไม่, hash ใหม่ถ้าควร rehash ตามนโยบายปัจจุบัน)
+    if not verifier().verify(stored_hash, password):
+        return False, None
+    if not needs_rehash(role, stored_hash):
+        return True, None
+    # rehash ก็เป็นงาน hash ที่ช้าเท่ากัน ใช้ pool เดียวกับการตรวจ ถ้า pool เต็มให้ล็อกอินผ่านไปก่อน
+    # แล้วค่อย rehash ในการล็อกอินครั้งถัดไป
+    try:
+        return True, verifier().hash(policy(role), password)
+    except LoginBusy:
+        return True, None
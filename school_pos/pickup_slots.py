@@ -0,0 +1,100 @@
+import os
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+# สั่งล่วงหน้าและเลือกเวลารับ (pickup slot) เพื่อกระจายคำสั่งซื้อออกจากช่วงพักกลางวัน
+#  - slot คือช่วงละ SLOT_MINUTES นาที ระหว่าง FIRST_SLOT ถึง LAST_SLOT ตามเวลาท้องถิ่นของโรงเรียน
+#    เก็บเป็นข้อความ 'YYYY-MM-DD HH:MM' (เวลาท้องถิ่น) ใน orders.pickup_slot
+#  - shops.slot_capacity คือจำนวนคำสั่งซื้อสูงสุดต่อ slot (NULL = ไม่จำกัด)
+#  - pickup_slot_counts นับจำนวนที่จองแล้ว อัปเดตแบบมีเงื่อนไขใน transaction ของ checkout
+#    หน้าแสดง slot ว่างจึงอ่านแค่ตารางนี้ ไม่ต้องนับจาก orders
+
+SLOT_MINUTES = 10
+FIRST_SLOT = '10:00'
+LAST_SLOT = '12:50'
+# ต้องสั่งก่อนเวลารับอย่างน้อยเท่านี้ ให้ร้านมีเวลาเตรียม
+LEAD_TIME = timedelta(minutes=15)
+DAYS_AHEAD = 1
+TIMEZONE = ZoneInfo(os.environ.get('SCHOOL_POS_TIMEZONE', 'Asia/Bangkok'))
+
+SLOT_FORMAT = '%Y-%m-%d %H:%M'
+
+
+class InvalidSlot(Exception):
+    pass
+
+
+def local_now():
+    return datetime.now(timezone.utc).astimezone(TIMEZONE).replace(tzinfo=None)
+
+
+def _day_slots(day):
+    start = datetime.combine(day, datetime.strptime(FIRST_SLOT, '%H:%M').time())
+    end = datetime.combine(day, datetime.strptime(LAST_SLOT, '%H:%M').time())
+    slots = []
+    while start <= end:
+        slots.append(start)
+        start += timedelta(minutes=SLOT_MINUTES)
+    return slots
+
+
+def upcoming(now=None):
+    # slot ที่ยังจองได้ วันนี้และอีก DAYS_AHEAD วัน
+    now = now or local_now()
+    return [slot.strftime(SLOT_FORMAT)
+            for offset in range(DAYS_AHEAD + 1)
+            for slot in _day_slots(now.date() + timedelta(days=offset))
+            if slot >= now + LEAD_TIME]
+
+
+def validate(slot, now=None):
+    # คืน slot ในรูปแบบมาตรฐาน หรือ InvalidSlot
+    try:
+        value = datetime.strptime(slot, SLOT_FORMAT).strftime(SLOT_FORMAT)
+    except (TypeError, ValueError):
+        raise InvalidSlot('invalid pickup slot')
+    if value not in upcoming(now):
+        raise InvalidSlot('pickup slot is not available')
+    return value
+
+
+def reserve(cursor, shop_id, slot):
+    # เรียกภายใน transaction ของ checkout: จอง 1 คำสั่งซื้อใน slot ถ้ายังไม่เต็ม
+    # ทั้ง insert และ update มีเงื่อนไขเรื่อง capacity ไม่มีแถวถูกเขียนแปลว่าเต็ม
+    cursor.execute('''
+        INSERT INTO pickup_slot_counts (shop_id, slot, booked)
+        SELECT shop_id, ?, 1 FROM shops
+        WHERE shop_id = ? AND (slot_capacity IS NULL OR slot_capacity > 0)
+        ON CONFLICT(shop_id, slot) DO UPDATE SET booked = booked + 1
+        WHERE booked < IFNULL((SELECT slot_capacity FROM shops WHERE shop_id = excluded.shop_id), booked + 1)
+    ''', (slot, shop_id))
+    return cursor.rowcount == 1
+
+
+def availability(conn, shop_id, now=None):
+    # [{'slot', 'capacity', 'booked', 'remaining'}] ของ slot ที่ยังจองได้ (remaining = None คือไม่จำกัด)
+    slots = upcoming(now)
+    if not slots:
+        return []
+    row = conn.execute('SELECT slot_capacity FROM shops WHERE shop_id = ?', (shop_id,)).fetchone()
+    if row is None:
+        return None
+    capacity = row[0]
+    booked = dict(conn.execute('''
+        SELECT slot, booked FROM pickup_slot_counts
+        WHERE shop_id = ? AND slot >= ? AND slot <= ?
+    ''', (shop_id, slots[0], slots[-1])))
+    return [{
+        'slot': slot,
+        'capacity': capacity,
+        'booked': booked.get(slot, 0),
+        'remaining': None if capacity is None else max(capacity - booked.get(slot, 0), 0),
+    } for slot in slots]
+
+
+def prune(conn, days=7):
+    # ลบตัวนับของ slot ที่ผ่านไปแล้ว
+    cutoff = (local_now() - timedelta(days=days)).strftime(SLOT_FORMAT)
+    cursor = conn.execute('DELETE FROM pickup_slot_counts WHERE slot < ?', (cutoff,))
+    conn.commit()
+    return cursor.rowcount
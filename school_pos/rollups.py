@@ -0,0 +1,141 @@
+# ตารางสรุปยอดขายรายวัน อัปเดตใน transaction เดียวกับ checkout
+# sales_report และ shop_dashboard อ่านจากตารางนี้แทนการ scan orders ทั้งหมด
+
+
+def record_order(cursor, shop_id, sale_date, lines):
+    # lines: [(item_id, quantity, price, cost), ...] ของคำสั่งซื้อหนึ่งร้าน
+    cursor.executemany('''
+        INSERT INTO daily_item_sales (shop_id, sale_date, item_id, quantity, revenue, cost, profit)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(shop_id, sale_date, item_id) DO UPDATE SET
+            quantity = quantity + excluded.quantity,
+            revenue = revenue + excluded.revenue,
+            cost = cost + excluded.cost,
+            profit = profit + excluded.profit
+    ''', [(shop_id, sale_date, item_id, quantity, quantity * price, quantity * cost,
+           quantity * (price - cost)) for item_id, quantity, price, cost in lines])
+
+    cursor.execute('''
+        INSERT INTO daily_shop_sales (shop_id, sale_date, order_count, revenue)
+        VALUES (?, ?, 1, ?)
+        ON CONFLICT(shop_id, sale_date) DO UPDATE SET
+            order_count = order_count + 1,
+            revenue = revenue + excluded.revenue
+    ''', (shop_id, sale_date, sum(quantity * price for _, quantity, price, _ in lines)))
+
+
+def record_spending(cursor, student_id, spend_date, order_count, amount):
+    # ยอดใช้จ่ายของนักเรียน หนึ่ง checkout อาจได้หลายคำสั่งซื้อ (แยกตามร้าน)
+    cursor.execute('''
+        INSERT INTO student_daily_spending (student_id, spend_date, order_count, amount)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(student_id, spend_date) DO UPDATE SET
+            order_count = order_count + excluded.order_count,
+            amount = amount + excluded.amount
+    ''', (student_id, spend_date, order_count, amount))
+
+
+def rebuild(conn):
+    # สร้างตารางสรุปใหม่ทั้งหมดจาก orders (ใช้ backfill ครั้งแรก หรือเมื่อสงสัยว่าข้อมูลไม่ตรง)
+    # ต้นทุนของคำสั่งซื้อเก่าใช้ต้นทุนปัจจุบันใน menu_items เพราะไม่ได้เก็บไว้ตอนขาย
+    # วันที่อยู่ในภาคเรียนที่ย้ายไป archive แล้วไม่แตะ (ตรวจกับ orders แล้วตอนย้าย และไม่มี orders ในฐานข้อมูลหลัก)
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        for table, column in (('daily_item_sales', 'sale_date'), ('daily_shop_sales', 'sale_date'),
+                              ('student_daily_spending', 'spend_date')):
+            cursor.execute(f'''
+                DELETE FROM {table}
+                WHERE NOT EXISTS (SELECT 1 FROM terms t
+                                  WHERE t.archived_at IS NOT NULL AND {column} BETWEEN t.start_date AND t.end_date)
+            ''')
+        cursor.execute('''
+            INSERT INTO daily_item_sales (shop_id, sale_date, item_id, quantity, revenue, cost, profit)
+            SELECT o.shop_id, date(o.order_date), oi.item_id,
+                   SUM(oi.quantity),
+                   SUM(oi.quantity * oi.price),
+                   SUM(oi.quantity * IFNULL(m.cost, 0)),
+                   SUM(oi.quantity * (oi.price - IFNULL(m.cost, 0)))
+            FROM order_items oi
+            JOIN orders o ON oi.order_id = o.order_id
+            LEFT JOIN menu_items m ON oi.item_id = m.item_id
+            GROUP BY o.shop_id, date(o.order_date), oi.item_id
+        ''')
+        cursor.execute('''
+            INSERT INTO daily_shop_sales (shop_id, sale_date, order_count, revenue)
+            SELECT shop_id, date(order_date), COUNT(*), SUM(total_amount)
+            FROM orders
+            GROUP BY shop_id, date(order_date)
+        ''')
+        cursor.execute('''
+            INSERT INTO student_daily_spending (student_id, spend_date, order_count, amount)
+            SELECT student_id, date(order_date), COUNT(*), SUM(total_amount)
+            FROM orders
+            GROUP BY student_id, date(order_date)
+        ''')
+        cursor.execute('SELECT COUNT(*) FROM daily_item_sales')
+        rows = cursor.fetchone()[0]
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return rows
+
+
+def menu_sales(conn, shop_id):
+    # รายงานการขายรายเมนู
+    return conn.execute('''
+        SELECT m.name, SUM(d.quantity) as total_sold,
+               SUM(d.revenue) as revenue,
+               SUM(d.cost) as total_cost,
+               SUM(d.profit) as profit
+        FROM daily_item_sales d
+        JOIN menu_items m ON d.item_id = m.item_id
+        WHERE d.shop_id = ?
+        GROUP BY d.item_id, m.name
+        ORDER BY total_sold DESC
+    ''', (shop_id,)).fetchall()
+
+
+def daily_sales(conn, shop_id, days=7):
+    # รายงานการขายรายวันย้อนหลัง n วัน
+    return conn.execute('''
+        SELECT sale_date, order_count, revenue
+        FROM daily_shop_sales
+        WHERE shop_id = ? AND sale_date >= date('now', ?)
+        ORDER BY sale_date DESC
+    ''', (shop_id, f'-{days} days')).fetchall()
+
+
+def today_stats(conn, shop_id):
+    row = conn.execute('''
+        SELECT order_count, revenue
+        FROM daily_shop_sales
+        WHERE shop_id = ? AND sale_date = date('now')
+    ''', (shop_id,)).fetchone()
+    return row or (0, 0)
+
+
+SPENDING_PERIODS = {
+    # period: (วันแรกของช่วงจาก spend_date, จำนวนช่วงย้อนหลังที่แสดงเป็นค่าเริ่มต้น)
+    'week': ("date(spend_date, '-6 days', 'weekday 1')", 8),
+    'month': ("strftime('%Y-%m-01', spend_date)", 6),
+}
+
+
+def student_spending(conn, student_id, period='week', periods=None):
+    # สรุปยอดใช้จ่ายรายสัปดาห์ (เริ่มวันจันทร์) / รายเดือน จากตารางสรุปรายวัน
+    # คืน [(วันแรกของช่วง, จำนวนคำสั่งซื้อ, ยอดเงิน), ...] ใหม่ -> เก่า
+    if period not in SPENDING_PERIODS:
+        raise ValueError(f'unknown period {period!r}')
+    start, default_periods = SPENDING_PERIODS[period]
+    periods = max(1, min(int(periods or default_periods), 52))
+    cutoff = (f"date('now', '-{7 * (periods - 1) + 6} days')" if period == 'week'
+              else f"date('now', 'start of month', '-{periods - 1} months')")
+    return conn.execute(f'''
+        SELECT {start} AS period_start, SUM(order_count), SUM(amount)
+        FROM student_daily_spending
+        WHERE student_id = ? AND spend_date >= {cutoff}
+        GROUP BY period_start
+        ORDER BY period_start DESC
+    ''', (student_id,)).fetchall()
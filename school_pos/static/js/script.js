@@ -111,6 +111,9 @@ async function handleAddToCart(event) {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Idempotency-Key': crypto.randomUUID(),
+                // service worker ใช้ผูกคำขอที่เข้าคิวกับนักเรียนคนนี้
+                'X-Student-Id': document.body.dataset.studentId || '',
             },
             body: JSON.stringify({
                 item_id: itemId,
@@ -123,7 +126,12 @@ async function handleAddToCart(event) {
 
         const result = await response.json();
 
-        if (result.success) {
+        if (result.queued) {
+            // offline: service worker เก็บไว้ส่งภายหลัง
+            showNotification(result.message, 'warning');
+            btn.textContent = originalText;
+            btn.disabled = false;
+        } else if (result.success) {
             // Update cart count
             updateCartCount(result.cart_count);
             
@@ -159,6 +167,7 @@ async function handleAvailabilityToggle(event) {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Idempotency-Key': crypto.randomUUID(),
             },
             body: JSON.stringify({
                 item_id: itemId,
@@ -282,16 +291,23 @@ function updateCartCount(count) {
     }
 }
 
-function loadCartFromSession() {
-    // This would be implemented to sync with server session
-    // For now, we'll use localStorage as backup
-    const savedCart = localStorage.getItem('cart');
-    if (savedCart) {
-        cart = JSON.parse(savedCart);
-        updateCartCount(cart.length);
+async function loadCartFromSession() {
+    // ตะกร้าเก็บฝั่งเซิร์ฟเวอร์ ดึงผ่าน JSON API แทน localStorage
+    try {
+        const response = await fetch('/api/cart');
+        if (!response.ok) return;
+        applyCart(await response.json());
+    } catch (error) {
+        console.error('Error loading cart:', error);
     }
 }
 
+function applyCart(data) {
+    cart = data.items;
+    updateCartDisplay();
+    updateCartCount(data.cart_count);
+}
+
 function showNotification(message, type = 'info') {
     // Create notification element
     const notification = document.createElement('div');
@@ -370,30 +386,36 @@ function openCart() {
     window.location.href = '/cart';
 }
 
-function updateItemQuantity(itemId, quantity) {
+async function updateItemQuantity(itemId, quantity) {
     if (quantity <= 0) {
         removeFromCart(itemId);
         return;
     }
     
-    // Update cart item quantity
-    cart.forEach(item => {
-        if (item.item_id === itemId) {
-            item.quantity = quantity;
-        }
-    });
-    
-    // Update display
-    updateCartDisplay();
-    localStorage.setItem('cart', JSON.stringify(cart));
+    try {
+        const response = await fetch(`/api/cart/items/${itemId}`, {
+            method: 'PUT',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ quantity: quantity })
+        });
+        applyCart(await response.json());
+    } catch (error) {
+        console.error('Error updating cart:', error);
+        showNotification('เกิดข้อผิดพลาด กรุณาลองใหม่', 'error');
+    }
 }
 
-function removeFromCart(itemId) {
-    cart = cart.filter(item => item.item_id !== itemId);
-    updateCartDisplay();
-    updateCartCount(cart.length);
-    localStorage.setItem('cart', JSON.stringify(cart));
-    showNotification('ลบสินค้าออกจากตะกร้าแล้ว', 'info');
+async function removeFromCart(itemId) {
+    try {
+        const response = await fetch(`/api/cart/items/${itemId}`, { method: 'DELETE' });
+        applyCart(await response.json());
+        showNotification('ลบสินค้าออกจากตะกร้าแล้ว', 'info');
+    } catch (error) {
+        console.error('Error removing from cart:', error);
+        showNotification('เกิดข้อผิดพลาด กรุณาลองใหม่', 'error');
+    }
 }
 
 function updateCartDisplay() {
@@ -416,10 +438,10 @@ function updateCartDisplay() {
                     <p>฿${item.price}</p>
                 </div>
                 <div class="cart-item-controls">
-                    <button class="quantity-btn" onclick="updateItemQuantity('${item.item_id}', ${item.quantity - 1})">-</button>
+                    <button class="quantity-btn" onclick="updateItemQuantity(${item.item_id}, ${item.quantity - 1})">-</button>
                     <span class="quantity">${item.quantity}</span>
-                    <button class="quantity-btn" onclick="updateItemQuantity('${item.item_id}', ${item.quantity + 1})">+</button>
-                    <button class="remove-btn" onclick="removeFromCart('${item.item_id}')">&times;</button>
+                    <button class="quantity-btn" onclick="updateItemQuantity(${item.item_id}, ${item.quantity + 1})">+</button>
+                    <button class="remove-btn" onclick="removeFromCart(${item.item_id})">&times;</button>
                 </div>
                 <div class="cart-item-total">฿${itemTotal}</div>
             `;
@@ -477,13 +499,4 @@ window.addEventListener('offline', function() {
     showNotification('ไม่มีการเชื่อมต่ออินเทอร์เน็ต', 'warning');
 });
 
-// PWA support
-if ('serviceWorker' in navigator) {
-    navigator.serviceWorker.register('/static/sw.js')
-        .then(function(registration) {
-            console.log('SW registered: ', registration);
-        })
-        .catch(function(registrationError) {
-            console.log('SW registration failed: ', registrationError);
-        });
-}
\ No newline at end of file
+// PWA support: service worker ลงทะเบียนใน base.html
\ No newline at end of file
@@ -1,30 +1,344 @@
-const CACHE_NAME = 'school-pos-v1';
-const urlsToCache = [
+// เสิร์ฟผ่าน /sw.js (offline.py แทนค่า CACHE_VERSION และรายการไฟล์ static ที่ build แล้วให้)
+const CACHE_VERSION = '__CACHE_VERSION__';
+const PRECACHE = 'school-pos-precache-' + CACHE_VERSION;
+const RUNTIME = 'school-pos-runtime';
+// รูปใน /media/ ชื่อไฟล์เป็น hash ของเนื้อหา เก็บข้ามเวอร์ชันได้ (ไม่ต้องล้างเมื่อ deploy)
+const MEDIA = 'school-pos-media';
+const PRECACHE_URLS = [
     '/',
-    '/static/css/style.css',
-    '/static/js/script.js',
-    '/static/images/',
     '/student_login',
-    '/shop_login'
+    '/shop_login',
+    /* __PRECACHE_STATIC__ */
 ];
+// style.css ที่ build แล้ว (ชื่อมี hash) อยู่ใน precache ใช้กับหน้าที่สร้างเองตอน offline
+const STYLESHEET = PRECACHE_URLS.find(function(url) {
+    return url.endsWith('.css');
+}) || '/static/style.css';
+
+// คำขอที่เก็บเข้าคิวเมื่อส่งไม่ได้ แล้วส่งซ้ำพร้อม Idempotency-Key เดิม
+// ทุกรายการในคิวผูกกับนักเรียนที่สั่ง ส่งซ้ำพร้อม X-Queued-For ให้เซิร์ฟเวอร์ปฏิเสธถ้าตอนนั้นเป็น session ของคนอื่น
+const QUEUED_PATHS = ['/add_to_cart', '/checkout'];
+const SYNC_TAG = 'school-pos-queue';
+const DB_NAME = 'school-pos';
+const STORE = 'queued-requests';
 
 self.addEventListener('install', function(event) {
     event.waitUntil(
-        caches.open(CACHE_NAME)
+        caches.open(PRECACHE)
             .then(function(cache) {
-                return cache.addAll(urlsToCache);
+                return cache.addAll(PRECACHE_URLS);
+            })
+            .then(function() {
+                // เมนูทุกร้าน (ได้เฉพาะเมื่อนักเรียนล็อกอินอยู่ จึงไม่ให้ install ล้มถ้าโหลดไม่ได้)
+                return caches.open(RUNTIME).then(function(cache) {
+                    return cache.add('/menu.json').catch(function() {});
+                });
+            })
+            .then(function() {
+                return precacheMedia().catch(function() {});
+            })
+            .then(function() {
+                return self.skipWaiting();
             })
     );
 });
 
-self.addEventListener('fetch', function(event) {
-    event.respondWith(
-        caches.match(event.request)
-            .then(function(response) {
-                if (response) {
-                    return response;
-                }
-                return fetch(event.request);
+self.addEventListener('activate', function(event) {
+    event.waitUntil(
+        caches.keys()
+            .then(function(names) {
+                return Promise.all(names.filter(function(name) {
+                    return name.startsWith('school-pos-') && name !== PRECACHE && name !== RUNTIME && name !== MEDIA;
+                }).map(function(name) {
+                    return caches.delete(name);
+                }));
+            })
+            .then(function() {
+                return self.clients.claim();
+            })
+            .then(function() {
+                return replayQueue().catch(function() {});
             })
     );
-});
\ No newline at end of file
+});
+
+self.addEventListener('fetch', function(event) {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+
+    if (request.method === 'POST' && QUEUED_PATHS.includes(url.pathname)) {
+        event.respondWith(sendOrQueue(request));
+        return;
+    }
+    if (request.method !== 'GET') {
+        return;
+    }
+
+    if (url.pathname === '/logout') {
+        // ข้อมูลใน runtime cache และคิวที่ยังไม่ได้ส่งเป็นของผู้ใช้คนนี้ ล้างก่อนคนถัดไปใช้เครื่อง
+        event.respondWith(Promise.all([caches.delete(RUNTIME), clearQueue().catch(function() {})]).then(function() {
+            return fetch(request);
+        }));
+        return;
+    }
+    if (url.pathname === '/menu.json' || /^\/shop\/\d+$/.test(url.pathname)) {
+        event.respondWith(staleWhileRevalidate(event));
+        return;
+    }
+    if (url.pathname.startsWith('/media/') && url.pathname !== '/media/manifest.json') {
+        event.respondWith(mediaFirst(request));
+        return;
+    }
+    if (url.pathname.startsWith('/static/')) {
+        event.respondWith(cacheFirst(request));
+        return;
+    }
+    if (request.mode === 'navigate') {
+        event.respondWith(networkFirst(request));
+    }
+});
+
+self.addEventListener('sync', function(event) {
+    if (event.tag === SYNC_TAG) {
+        event.waitUntil(replayQueue());
+    }
+});
+
+// browser ที่ไม่มี Background Sync: หน้าเว็บส่งข้อความมาเมื่อกลับมาออนไลน์
+self.addEventListener('message', function(event) {
+    if (event.data === 'replay-queue') {
+        event.waitUntil(replayQueue());
+    }
+});
+
+// ---------- กลยุทธ์ cache ----------
+
+function cacheable(response) {
+    // ไม่เก็บหน้าที่ถูก redirect (เช่น session หมดแล้วเด้งไปหน้า login)
+    return response.ok && !response.redirected && response.type === 'basic';
+}
+
+function staleWhileRevalidate(event) {
+    const request = event.request;
+    return caches.open(RUNTIME).then(function(cache) {
+        return cache.match(request).then(function(cached) {
+            const network = fetch(request).then(function(response) {
+                if (cacheable(response)) {
+                    return cache.put(request, response.clone()).then(function() {
+                        return response;
+                    });
+                }
+                return response;
+            });
+            if (cached) {
+                event.waitUntil(network.catch(function() {}));
+                return cached;
+            }
+            return network;
+        });
+    });
+}
+
+function cacheFirst(request) {
+    return caches.match(request).then(function(cached) {
+        return cached || fetch(request);
+    });
+}
+
+function mediaFirst(request) {
+    return caches.open(MEDIA).then(function(cache) {
+        return cache.match(request).then(function(cached) {
+            if (cached) {
+                return cached;
+            }
+            return fetch(request).then(function(response) {
+                if (cacheable(response)) {
+                    return cache.put(request, response.clone()).then(function() {
+                        return response;
+                    });
+                }
+                return response;
+            });
+        });
+    });
+}
+
+function precacheMedia() {
+    // โหลดเฉพาะรูปที่ยังไม่มี ชื่อไฟล์ใหม่ = รูปใหม่ รูปเดิมไม่ต้องโหลดซ้ำ
+    return fetch('/media/manifest.json').then(function(response) {
+        return response.json();
+    }).then(function(manifest) {
+        return caches.open(MEDIA).then(function(cache) {
+            return cache.keys().then(function(requests) {
+                const cached = new Set(requests.map(function(request) {
+                    return new URL(request.url).pathname;
+                }));
+                const missing = manifest.images.filter(function(path) {
+                    return !cached.has(path);
+                });
+                return Promise.all(missing.map(function(path) {
+                    return cache.add(path).catch(function() {});
+                }));
+            });
+        });
+    });
+}
+
+function networkFirst(request) {
+    return fetch(request).catch(function() {
+        return caches.match(request).then(function(cached) {
+            return cached || caches.match('/');
+        });
+    });
+}
+
+// ---------- คิวคำขอที่ส่งไม่สำเร็จ ----------
+
+function openQueue() {
+    return new Promise(function(resolve, reject) {
+        const open = indexedDB.open(DB_NAME, 1);
+        open.onupgradeneeded = function() {
+            open.result.createObjectStore(STORE, { keyPath: 'id', autoIncrement: true });
+        };
+        open.onsuccess = function() {
+            resolve(open.result);
+        };
+        open.onerror = function() {
+            reject(open.error);
+        };
+    });
+}
+
+function queueTransaction(mode, work) {
+    return openQueue().then(function(db) {
+        return new Promise(function(resolve, reject) {
+            const tx = db.transaction(STORE, mode);
+            const result = work(tx.objectStore(STORE));
+            tx.oncomplete = function() {
+                resolve(result.result);
+            };
+            tx.onerror = function() {
+                reject(tx.error);
+            };
+        });
+    });
+}
+
+function clearQueue() {
+    return queueTransaction('readwrite', function(store) {
+        return store.clear();
+    });
+}
+
+function formField(request, body, name) {
+    const contentType = request.headers.get('Content-Type') || '';
+    if (contentType.startsWith('application/x-www-form-urlencoded')) {
+        return new URLSearchParams(body).get(name);
+    }
+    return null;
+}
+
+function idempotencyKey(request, body) {
+    return request.headers.get('Idempotency-Key') || formField(request, body, 'idempotency_key') ||
+        self.crypto.randomUUID();
+}
+
+function studentId(request, body) {
+    return request.headers.get('X-Student-Id') || formField(request, body, 'student_id');
+}
+
+function sendOrQueue(request) {
+    const copy = request.clone();
+    return fetch(request).catch(function(error) {
+        return copy.text().then(function(body) {
+            const student = studentId(copy, body);
+            if (!student) {
+                // ไม่รู้ว่าเป็นของใคร ไม่เก็บเข้าคิว (ส่งซ้ำภายหลังอาจไปตัดเงินคนอื่น)
+                throw error;
+            }
+            const entry = {
+                url: copy.url,
+                body: body,
+                studentId: student,
+                headers: {
+                    'Content-Type': copy.headers.get('Content-Type') || '',
+                    'Idempotency-Key': idempotencyKey(copy, body),
+                    'X-Queued-For': student
+                },
+                queuedAt: Date.now()
+            };
+            return queueTransaction('readwrite', function(store) {
+                return store.add(entry);
+            }).then(function() {
+                if (self.registration.sync) {
+                    return self.registration.sync.register(SYNC_TAG).catch(function() {});
+                }
+            }).then(function() {
+                return queuedResponse(copy);
+            });
+        });
+    });
+}
+
+function queuedResponse(request) {
+    const message = 'ไม่มีการเชื่อมต่อ ระบบบันทึกรายการไว้แล้ว และจะส่งให้อัตโนมัติเมื่อกลับมาออนไลน์';
+    if (request.mode === 'navigate') {
+        return new Response(
+            '<!DOCTYPE html><html lang="th"><head><meta charset="UTF-8"><title>School POS</title>' +
+            '<link rel="stylesheet" href="' + STYLESHEET + '"></head><body><main>' +
+            '<p>' + message + '</p><a href="/student_dashboard">กลับหน้าหลัก</a></main></body></html>',
+            { status: 202, headers: { 'Content-Type': 'text/html; charset=utf-8' } }
+        );
+    }
+    return new Response(JSON.stringify({ success: false, queued: true, message: message }), {
+        status: 202,
+        headers: { 'Content-Type': 'application/json' }
+    });
+}
+
+function replayQueue() {
+    return queueTransaction('readonly', function(store) {
+        return store.getAll();
+    }).then(function(entries) {
+        // ส่งตามลำดับ (add_to_cart ต้องถึงก่อน checkout)
+        let chain = Promise.resolve(0);
+        entries.forEach(function(entry) {
+            chain = chain.then(function(sent) {
+                const remove = function(count) {
+                    return queueTransaction('readwrite', function(store) {
+                        return store.delete(entry.id);
+                    }).then(function() {
+                        return count;
+                    });
+                };
+                if (!entry.studentId) {
+                    // รายการจากเวอร์ชันก่อนที่ไม่ได้ผูกกับนักเรียน ทิ้งโดยไม่ส่ง
+                    return remove(sent);
+                }
+                return fetch(entry.url, {
+                    method: 'POST',
+                    headers: entry.headers,
+                    body: entry.body,
+                    credentials: 'same-origin'
+                }).then(function(response) {
+                    // ได้คำตอบแล้ว (แม้จะเป็น error) การส่งซ้ำอีกไม่ช่วย ลบออกจากคิว
+                    // 409 = ตอนนี้เป็น session ของนักเรียนคนอื่น รายการนี้ไม่ถูกส่ง
+                    return remove(response.status === 409 ? sent : sent + 1);
+                });
+            });
+        });
+        return chain;
+    }).then(function(sent) {
+        if (!sent) {
+            return;
+        }
+        return self.clients.matchAll().then(function(clients) {
+            clients.forEach(function(client) {
+                client.postMessage({ type: 'queue-replayed', count: sent });
+            });
+        });
+    });
+}
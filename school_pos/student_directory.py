@@ -0,0 +1,74 @@
+import base64
+import json
+
+# รายชื่อนักเรียนสำหรับหน้าแอดมิน แบ่งหน้าแบบ keyset (ไม่ใช้ OFFSET)
+# ค้นหาด้วยรหัสนักเรียน (prefix) หรือชื่อภาษาไทย (FTS5 trigram)
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# sort -> (ORDER BY, เงื่อนไขหน้าถัดไป)
+SORTS = {
+    'id': ('student_id', 'student_id > ?'),
+    'balance': ('balance, student_id', '(balance, student_id) > (?, ?)'),
+    '-balance': ('balance DESC, student_id DESC', '(balance, student_id) < (?, ?)'),
+}
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _search_clause(q):
+    if q.isdigit():
+        # prefix ของรหัสนักเรียน ใช้ช่วงของ primary key แทน LIKE
+        upper = q[:-1] + chr(ord(q[-1]) + 1)
+        return 'student_id >= ? AND student_id < ?', [q, upper]
+    if len(q) >= 3:
+        return 'rowid IN (SELECT rowid FROM students_fts WHERE students_fts MATCH ?)', [_fts_phrase(q)]
+    # trigram ต้องมีอย่างน้อย 3 ตัวอักษร คำค้นสั้นกว่านั้นใช้ LIKE
+    return "name LIKE ? ESCAPE '\\'", ['%' + q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%']
+
+
+def list_students(conn, q='', sort='id', after=None, limit=PAGE_SIZE):
+    # คืน (students, cursor ของหน้าถัดไปหรือ None)
+    if sort not in SORTS:
+        raise ValueError(f'unknown sort {sort!r}')
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    order_by, after_clause = SORTS[sort]
+
+    clauses = []
+    params = []
+    q = (q or '').strip()
+    if q:
+        clause, values = _search_clause(q)
+        clauses.append(clause)
+        params += values
+    if after:
+        clauses.append(after_clause)
+        params += decode_cursor(after)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    rows = conn.execute(f'''
+        SELECT student_id, name, balance
+        FROM students
+        {where}
+        ORDER BY {order_by}
+        LIMIT ?
+    ''', params + [limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last[0]] if sort == 'id' else [last[2], last[0]])
+    return rows, next_cursor
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# โมดูลของแอปอยู่ระดับบนสุดของ school_pos (แบบเดียวกับ bench/)
+#   python -m pytest tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,43 @@
+import sqlite3
+
+import pytest
+
+import app
+import migrations
+
+# query ที่รันทุกคำขอช่วงพักกลางวัน ต้องใช้ index จาก migration ไม่ scan ทั้งตาราง
+HOT_QUERIES = [
+    ('idx_orders_shop_date',
+     "SELECT COUNT(*), SUM(total_amount) FROM orders WHERE shop_id = 1 AND order_date >= '2024-01-01'"),
+    ('idx_order_items_order', 'SELECT item_id, quantity FROM order_items WHERE order_id = 1'),
+    ('idx_order_items_item', 'SELECT SUM(quantity) FROM order_items WHERE item_id = 1'),
+    ('idx_orders_student',
+     "SELECT order_id FROM orders WHERE student_id = 's1' AND order_id < 10 ORDER BY order_id DESC LIMIT 20"),
+    ('idx_orders_student_date',
+     "SELECT SUM(total_amount) FROM orders WHERE student_id = 's1' "
+     "AND order_date >= '2024-01-01' AND order_date < '2024-02-01'"),
+    ('idx_orders_shop_status', "SELECT order_id FROM orders WHERE shop_id = 1 AND status = 'pending'"),
+    ('idx_order_events_shop', 'SELECT event_id FROM order_events WHERE shop_id = 1 AND event_id > 5'),
+    ('idx_menu_items_shop_available', 'SELECT item_id FROM menu_items WHERE shop_id = 1 AND available = 1'),
+]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    migrations.upgrade(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('index, sql', HOT_QUERIES, ids=[index for index, _ in HOT_QUERIES])
+def test_hot_query_uses_index(conn, index, sql):
+    plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+    assert any(index in step for step in plan), plan
+    assert migrations.full_scans(conn, sql) == []
+
+
+def test_routes_do_not_scan_orders(tmp_path):
+    # ทุก statement ที่ route หลักรันจริง (รวม INSERT ... SELECT) กับฐานข้อมูลใหม่จาก migration + ข้อมูลตัวอย่าง
+    application = app.create_app({'DATABASE': str(tmp_path / 'app.db')})
+    assert migrations.check_query_plans(application, app.PLAN_REQUESTS) == []
@@ -0,0 +1,95 @@
+# worker process สำหรับงานเบื้องหลัง (export รายงาน, นำเข้านักเรียน, ย่อรูปที่อัปโหลด, ดูแลฐานข้อมูล) รันคู่กับ web ใน Procfile
+#   python worker.py
+import argparse
+import logging
+import os
+import sys
+import time
+
+import bulk_import
+import db
+import exports
+import maintenance
+import media
+import migrations
+
+log = logging.getLogger('school_pos.worker')
+
+
+def run(db_path, poll_interval=1.0, once=False):
+    conn = db.connect(db_path)
+    # migration รันครั้งเดียวจาก release (flask db upgrade) worker ไม่แก้ schema เอง
+    if migrations.current_version(conn) < migrations.LATEST_VERSION:
+        conn.close()
+        sys.exit('schema is out of date, run flask db upgrade first')
+    directory = exports.export_dir(db_path)
+    imports = bulk_import.import_dir(db_path)
+    images = media.media_dir(db_path)
+    last_purge = 0.0
+    last_maintenance = 0.0
+    log.info('export worker %s watching %s', os.getpid(), db_path)
+
+    while True:
+        try:
+            resized = media.process_pending(conn, images)
+        except Exception:
+            # ส่วนใหญ่เป็น error ชั่วคราวของฐานข้อมูล ให้ไปรอ poll_interval ตามปกติแทนการวนซ้ำทันที
+            log.exception('image processing failed')
+            resized = 0
+        if resized:
+            log.info('processed %d images', resized)
+
+        import_job = bulk_import.claim_next(conn, imports, os.getpid())
+        if import_job is not None:
+            log.info('import job %d', import_job['job_id'])
+            try:
+                report = bulk_import.run_job(conn, import_job, imports)
+            except Exception:
+                log.exception('import job %d failed', import_job['job_id'])
+                continue
+            log.info('import job %d done: %d rows, %d inserted, %d updated, %d errors in %.1fs',
+                     import_job['job_id'], report['rows'], report['inserted'], report['updated'],
+                     len(report['errors']), report['seconds'])
+            continue
+
+        job = exports.claim_next(conn, os.getpid())
+        if job is None:
+            if resized:
+                continue
+            if once:
+                break
+            if time.monotonic() - last_purge > 3600:
+                removed = exports.purge_old(conn, directory) + bulk_import.purge_old(conn)
+                if removed:
+                    log.info('purged %d old export/import jobs', removed)
+                last_purge = time.monotonic()
+            if time.monotonic() - last_maintenance > 60:
+                try:
+                    for task, result in maintenance.run_due(conn):
+                        log.info('maintenance %s: %s', task, result)
+                except Exception:
+                    log.exception('maintenance failed')
+                last_maintenance = time.monotonic()
+            time.sleep(poll_interval)
+            continue
+
+        log.info('export job %d: %s %s %s..%s', job['job_id'], job['kind'], job['format'],
+                 job['date_from'], job['date_to'])
+        try:
+            rows, seconds = exports.run_job(conn, job, directory)
+        except Exception:
+            log.exception('export job %d failed', job['job_id'])
+            continue
+        log.info('export job %d done: %d rows in %.1fs', job['job_id'], rows, seconds)
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='background export worker')
+    parser.add_argument('--db', default=os.environ.get('SCHOOL_POS_DB', 'school_pos.db'))
+    parser.add_argument('--poll', type=float, default=1.0, help='seconds between checks when idle')
+    parser.add_argument('--once', action='store_true', help='exit when the queue is empty')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    run(args.db, args.poll, args.once)